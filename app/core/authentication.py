@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework import authentication, exceptions
+
+from core import metrics
+
+
+def snapshot(instance):
+    """
+    Return an immutable copy of the row behind a model instance
+    """
+    fields = instance._meta.concrete_fields
+    return (
+        instance._state.db,
+        tuple(field.attname for field in fields),
+        tuple(getattr(instance, field.attname) for field in fields),
+    )
+
+
+class TokenCache:
+    """
+    Thread safe, size bounded LRU cache of token key to user rows.
+
+    Entries expire after ``ttl`` seconds, which also bounds how long a
+    change made through another process can go unnoticed.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def set(self, key, user, token):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (
+                expires, user.pk, snapshot(user), snapshot(token)
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if entry[1] == user_id
+            ]
+            for key in keys:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._entries)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": size,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+token_cache = TokenCache(
+    maxsize=getattr(settings, "TOKEN_CACHE_MAXSIZE", 10000),
+    ttl=getattr(settings, "TOKEN_CACHE_TTL", 60)
+)
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """
+    Token authentication that keeps recently seen tokens in process,
+    skipping the token and user query for repeated requests.
+
+    Fresh user and token instances are built from the cached rows on
+    every request, so nothing is shared between threads.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            try:
+                user, token = super().authenticate_credentials(key)
+            except exceptions.AuthenticationFailed:
+                metrics.TOKEN_AUTHENTICATIONS.inc(outcome="failed")
+                raise
+            token_cache.set(key, user, token)
+            metrics.TOKEN_AUTHENTICATIONS.inc(outcome="database")
+            return user, token
+
+        metrics.TOKEN_AUTHENTICATIONS.inc(outcome="cached")
+
+        user_row, token_row = cached
+        user = get_user_model().from_db(*user_row)
+        token = self.get_model().from_db(*token_row)
+        token.user = user
+        return user, token
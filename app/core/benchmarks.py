@@ -0,0 +1,427 @@
+import asyncio
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer,
+    WSGIRequestHandler,
+    WSGIServer
+)
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from core import changes
+from core import models
+from core import versions
+from core.counters import refresh_recipe_counts
+from core.search import update_search_vector
+
+
+EMAIL = "benchmark-{}@localmachine.com"
+PASSWORD = "benchmark-password"
+BATCH_SIZE = 1000
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+
+def seed(users=20, recipes=200, tags=30, ingredients=50, links=3,
+         batch_size=BATCH_SIZE):
+    """
+    Bulk insert benchmark users, each with their tags, ingredients and
+    recipes linked to ``links`` random tags and ingredients. Users seeded
+    by an earlier run are kept as they are. Returns the number of users
+    created.
+    """
+    User = get_user_model()
+    emails = [EMAIL.format(number) for number in range(users)]
+    existing = set(
+        User.objects.filter(email__in=emails).values_list("email", flat=True)
+    )
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(email=email, name=email.split("@")[0], password=password)
+            for email in emails if email not in existing
+        ],
+        batch_size=batch_size
+    )
+    # bulk_create only sets primary keys on some backends
+    user_ids = list(
+        User.objects.filter(email__in=set(emails) - existing)
+        .order_by("id").values_list("id", flat=True)
+    )
+    if not user_ids:
+        return 0
+
+    models.CollectionVersion.objects.bulk_create(
+        [
+            models.CollectionVersion(user_id=user_id, collection=collection)
+            for user_id in user_ids
+            for collection in versions.COLLECTIONS + (versions.CHANGES,)
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True
+    )
+    Token.objects.bulk_create(
+        [Token(user_id=user_id, key=Token.generate_key())
+         for user_id in user_ids],
+        batch_size=batch_size
+    )
+
+    rng = random.Random(0)
+    related = {}
+    for model, count in ((models.Tag, tags), (models.Ingredient, ingredients)):
+        label = model._meta.verbose_name.title()
+        model.objects.bulk_create(
+            [
+                model(user_id=user_id, name=f"{label} {number}")
+                for user_id in user_ids
+                for number in range(count)
+            ],
+            batch_size=batch_size
+        )
+        related[model] = ids_by_user(model, user_ids)
+
+    models.Recipe.objects.bulk_create(
+        [
+            models.Recipe(
+                user_id=user_id,
+                title=f"Recipe {number}",
+                time_minutes=rng.randint(5, 120),
+                price=rng.randint(100, 5000) / 100
+            )
+            for user_id in user_ids
+            for number in range(recipes)
+        ],
+        batch_size=batch_size
+    )
+    recipe_ids = ids_by_user(models.Recipe, user_ids)
+
+    for model, (through, column) in (
+        (models.Tag, (models.Recipe.tags.through, "tag_id")),
+        (models.Ingredient,
+         (models.Recipe.ingredients.through, "ingredient_id")),
+    ):
+        through.objects.bulk_create(
+            [
+                through(recipe_id=recipe_id, **{column: pk})
+                for user_id in user_ids
+                for recipe_id in recipe_ids[user_id]
+                for pk in rng.sample(
+                    related[model][user_id],
+                    min(links, len(related[model][user_id]))
+                )
+            ],
+            batch_size=batch_size
+        )
+        refresh_recipe_counts(model, [
+            pk for pks in related[model].values() for pk in pks
+        ])
+
+    update_search_vector(models.Recipe.objects.filter(user_id__in=user_ids))
+    for user_id in user_ids:
+        changes.record(user_id, {
+            "tags": related[models.Tag][user_id],
+            "ingredients": related[models.Ingredient][user_id],
+            "recipes": recipe_ids[user_id],
+        })
+    return len(user_ids)
+
+
+def ids_by_user(model, user_ids):
+    ids = {user_id: [] for user_id in user_ids}
+    for pk, user_id in model.objects.filter(
+        user_id__in=user_ids
+    ).order_by("id").values_list("id", "user_id"):
+        ids[user_id].append(pk)
+    return ids
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted values
+    """
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class QueryCountingApplication:
+    """
+    WSGI application reporting the number of queries of every request in
+    the X-Query-Count header. Each request is handled in its own thread,
+    with that thread's connection.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers = headers + [(QUERY_COUNT_HEADER, str(queries))]
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(count):
+            return self.application(environ, counting_start_response)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Headers and body are written separately, with Nagle enabled every
+    # keep-alive response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    WSGI server handling connections in a fixed pool of threads, like the
+    threaded workers of a production WSGI server
+    """
+
+    def __init__(self, *args, threads=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+        self.pending = set()
+
+    def process_request(self, request, client_address):
+        future = self.executor.submit(
+            self.process_request_thread, request, client_address
+        )
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        # Executor.shutdown() only cancels queued work from Python 3.9
+        for future in list(self.pending):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+
+class LocalServer:
+    """
+    Serve the project in background threads on a free local port, a
+    thread per connection or a pool of ``threads``
+    """
+
+    def __init__(self, threads=None):
+        self.threads = threads
+
+    def __enter__(self):
+        if self.threads:
+            self.server = PooledWSGIServer(
+                ("127.0.0.1", 0),
+                QuietRequestHandler,
+                allow_reuse_address=False,
+                threads=self.threads
+            )
+        else:
+            self.server = ThreadedWSGIServer(
+                ("127.0.0.1", 0),
+                QuietRequestHandler,
+                allow_reuse_address=False
+            )
+        self.server.set_app(QueryCountingApplication(
+            get_wsgi_application()
+        ))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return "http://%s:%s" % self.server.server_address[:2]
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class LocalASGIServer:
+    """
+    Serve recipe_backend.asgi with uvicorn in a background thread on a
+    free local port
+    """
+
+    def __enter__(self):
+        import uvicorn
+        from recipe_backend.asgi import application
+
+        self.server = uvicorn.Server(uvicorn.Config(
+            application,
+            host="127.0.0.1",
+            port=0,
+            lifespan="off",
+            access_log=False,
+            log_level="warning"
+        ))
+        self.thread = threading.Thread(target=self.server.run)
+        self.thread.daemon = True
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The ASGI server did not start")
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def multipart_body(field, file_name, content):
+    """
+    Return the content type and body of a multipart form with one file
+    """
+    boundary = "benchmark-boundary"
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{file_name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+async def slow_request(base_url, path, headers, body, duration, pieces=10,
+                       timeout=60):
+    """
+    POST body in pieces spread over duration seconds, as a client on a
+    slow network would. Returns (status, seconds), status is 0 when the
+    request failed.
+    """
+    url = urlsplit(base_url)
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(url.hostname, url.port)
+        head = "".join(
+            f"{name}: {value}\r\n" for name, value in dict(headers, **{
+                "Host": url.netloc,
+                "Content-Length": len(body),
+                "Connection": "close",
+            }).items()
+        )
+        writer.write(
+            f"POST {url.path.rstrip('/')}{path} HTTP/1.1\r\n{head}\r\n"
+            .encode()
+        )
+        size = -(-len(body) // pieces)
+        for offset in range(0, len(body), size):
+            await asyncio.sleep(duration / pieces)
+            writer.write(body[offset:offset + size])
+            await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        status = int(status_line.split()[1])
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        status = 0
+    return status, time.perf_counter() - started
+
+
+class Client:
+    """
+    HTTP client, one per benchmark thread. Connections are kept alive
+    unless ``keep_alive`` is False.
+    """
+
+    def __init__(self, base_url, keep_alive=True):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port
+        self.prefix = url.path.rstrip("/")
+        self.keep_alive = keep_alive
+        self.connection = None
+
+    def request(self, method, path, body=None, token=None):
+        """
+        Send a request, returns (status, seconds, queries). Queries are
+        None when the server does not report them.
+        """
+        headers = {"Accept": "application/json"}
+        if not self.keep_alive:
+            headers["Connection"] = "close"
+        if token:
+            headers["Authorization"] = f"Token {token}"
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        started = time.perf_counter()
+        try:
+            response = self.send(method, path, body, headers)
+        except (http.client.HTTPException, ConnectionError):
+            self.close()
+            started = time.perf_counter()
+            response = self.send(method, path, body, headers)
+        response.read()
+        elapsed = time.perf_counter() - started
+        if (not self.keep_alive
+                or response.getheader("Connection", "").lower() == "close"):
+            self.close()
+        queries = response.getheader(QUERY_COUNT_HEADER)
+        return (
+            response.status,
+            elapsed,
+            int(queries) if queries is not None else None,
+        )
+
+    def send(self, method, path, body, headers):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=60
+            )
+            self.connection.connect()
+            self.connection.sock.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+            )
+        self.connection.request(method, self.prefix + path, body, headers)
+        return self.connection.getresponse()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def summarize(samples, elapsed):
+    """
+    Latency percentiles in milliseconds, throughput and queries of a list
+    of (status, seconds, queries) samples
+    """
+    latencies = sorted(seconds * 1000 for _status, seconds, _q in samples)
+    queries = [count for _s, _l, count in samples if count is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, *rest in samples if status >= 400),
+        "requests_per_second": len(samples) / elapsed if elapsed else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "queries_per_request": (
+            sum(queries) / len(queries) if queries else None
+        ),
+    }
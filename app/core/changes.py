@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import models
+from core import versions
+
+
+BATCH_SIZE = 1000
+# Collection name of every model in the change log
+COLLECTIONS = {
+    models.Recipe: "recipes",
+    models.Tag: "tags",
+    models.Ingredient: "ingredients",
+}
+
+
+def record(user_id, updated=None, deleted=None, using="default"):
+    """
+    Append the objects of a user that were written or deleted to the
+    change log. ``updated`` and ``deleted`` map a collection name to ids.
+
+    The user's change version row is updated first and stays locked until
+    the surrounding transaction commits, so the entries of one user
+    become visible in id order and a sync cursor never skips an entry
+    committed late.
+    """
+    entries = [
+        models.Change(
+            user_id=user_id,
+            collection=collection,
+            object_id=pk,
+            deleted=is_deleted
+        )
+        for is_deleted, changed in ((False, updated), (True, deleted))
+        for collection, pks in (changed or {}).items()
+        for pk in pks
+    ]
+    if not entries:
+        return
+    with transaction.atomic(using=using):
+        models.CollectionVersion.objects.using(using).filter(
+            user_id=user_id,
+            collection=versions.CHANGES
+        ).update(version=F("version") + 1, updated_at=timezone.now())
+        models.Change.objects.using(using).bulk_create(
+            entries,
+            batch_size=BATCH_SIZE
+        )
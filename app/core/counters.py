@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from core import changes
+from core import models
+from core import versions
+
+
+# Through table and column of every model carrying a recipe_count
+RELATIONS = {
+    models.Tag: (models.Recipe.tags.through, "tag_id"),
+    models.Ingredient: (models.Recipe.ingredients.through, "ingredient_id"),
+}
+
+
+def add_recipes(queryset, delta):
+    """
+    Shift the recipe_count of queryset by delta without reading it
+    """
+    if delta > 0:
+        return queryset.update(
+            recipe_count=F("recipe_count") + delta,
+            updated_at=Now()
+        )
+    return queryset.update(
+        recipe_count=Greatest(F("recipe_count") + delta, Value(0)),
+        updated_at=Now()
+    )
+
+
+def counted_recipes(model):
+    """
+    Expression counting the recipes linked to each row of model
+    """
+    through, column = RELATIONS[model]
+    return Coalesce(
+        Subquery(
+            through.objects.filter(**{column: OuterRef("pk")})
+            .order_by()
+            .values(column)
+            .annotate(count=Count("*"))
+            .values("count")
+        ),
+        Value(0)
+    )
+
+
+def refresh_recipe_counts(model, pks):
+    """
+    Recount the recipes of the given rows, used after bulk writes that
+    skip the m2m signals
+    """
+    if not pks:
+        return 0
+    return model.objects.filter(pk__in=pks).update(
+        recipe_count=counted_recipes(model),
+        updated_at=Now()
+    )
+
+
+def reconcile_recipe_counts(model):
+    """
+    Fix every row of model whose recipe_count drifted, returns the number
+    of rows corrected
+    """
+    drifted = defaultdict(list)
+    for pk, user_id in (
+        model.objects.annotate(actual=counted_recipes(model))
+        .exclude(recipe_count=F("actual"))
+        .values_list("pk", "user_id")
+    ):
+        drifted[user_id].append(pk)
+    corrected = refresh_recipe_counts(
+        model,
+        [pk for pks in drifted.values() for pk in pks]
+    )
+    collection = changes.COLLECTIONS[model]
+    if drifted:
+        versions.bump(list(drifted), collection)
+    for user_id, pks in drifted.items():
+        changes.record(user_id, {collection: pks})
+    return corrected
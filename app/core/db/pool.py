@@ -0,0 +1,217 @@
+"""
+In-process pool of database connections, shared by the threads of a
+process and used by the core.db.postgresql backend when its OPTIONS hold
+a "pool" dict.
+
+Django keeps one connection per thread, which only helps servers reusing
+their threads. With a pool, closing a connection at the end of a request
+hands it back for the next request, whatever thread serves it, and the
+number of connections a process opens is bounded by max_size.
+"""
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+from core.metrics import (
+    DB_POOL_CONNECTIONS,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT
+)
+
+
+class PoolTimeout(OperationalError):
+    """
+    No connection was released within the timeout of a full pool
+    """
+
+
+class ConnectionPool:
+    """
+    Connections opened on demand up to max_size, reused last released
+    first so that surplus ones stay idle and are closed after max_idle
+    seconds. Connections are also closed max_lifetime seconds after they
+    were opened.
+    """
+
+    def __init__(self, name="default", max_size=10, timeout=10.0,
+                 max_lifetime=3600.0, max_idle=600.0):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.condition = threading.Condition()
+        # (connection, opened at, released at) by release time
+        self.idle = []
+        # id(connection): (connection, opened at)
+        self.in_use = {}
+        self.opening = 0
+        self.closed = False
+
+    def acquire(self, connect, check=None):
+        """
+        Return an idle connection or one opened by calling connect, and
+        whether it was reused. Reused connections failing check are
+        closed and replaced.
+        """
+        started = time.monotonic()
+        while True:
+            connection, stale = self.take(started)
+            for expired in stale:
+                self.discard(expired)
+            if connection is None:
+                return self.open(connect, started), False
+            if check is None or check(connection):
+                DB_POOL_WAIT.observe(
+                    time.monotonic() - started, database=self.name
+                )
+                return connection, True
+            self.release(connection, reusable=False)
+
+    def take(self, started):
+        """
+        Take the last released connection that has not expired, None if
+        there is none but room for a new one
+        """
+        deadline = started + self.timeout
+        stale = []
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                while self.idle:
+                    connection, opened_at, released_at = self.idle.pop()
+                    if self.expired(opened_at, released_at, now):
+                        stale.append(connection)
+                        continue
+                    self.in_use[id(connection)] = (connection, opened_at)
+                    self.update_gauges()
+                    return connection, stale
+                if len(self.in_use) + self.opening < self.max_size:
+                    self.opening += 1
+                    self.update_gauges()
+                    return None, stale
+                if now >= deadline:
+                    DB_POOL_TIMEOUTS.inc(database=self.name)
+                    raise PoolTimeout(
+                        f"No connection of the {self.name} pool was "
+                        f"released within {self.timeout}s, all "
+                        f"{self.max_size} are in use."
+                    )
+                self.condition.wait(deadline - now)
+
+    def open(self, connect, started):
+        try:
+            connection = connect()
+        except BaseException:
+            with self.condition:
+                self.opening -= 1
+                self.condition.notify()
+                self.update_gauges()
+            raise
+        with self.condition:
+            self.opening -= 1
+            self.in_use[id(connection)] = (connection, time.monotonic())
+            self.update_gauges()
+        DB_POOL_WAIT.observe(time.monotonic() - started, database=self.name)
+        return connection
+
+    def release(self, connection, reusable=True):
+        """
+        Hand back an acquired connection, closing it unless reusable
+        """
+        with self.condition:
+            _connection, opened_at = self.in_use.pop(id(connection))
+            now = time.monotonic()
+            reusable = (
+                reusable and not self.closed
+                and now - opened_at < self.max_lifetime
+            )
+            if reusable:
+                self.idle.append((connection, opened_at, now))
+            self.condition.notify()
+            self.update_gauges()
+        if not reusable:
+            self.discard(connection)
+
+    def expired(self, opened_at, released_at, now):
+        return (
+            now - opened_at >= self.max_lifetime
+            or now - released_at >= self.max_idle
+        )
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            # Closing a broken connection may fail, it is gone either way
+            pass
+
+    def close(self):
+        """
+        Close the idle connections, the ones in use are closed once
+        released
+        """
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.update_gauges()
+        for connection, _opened_at, _released_at in idle:
+            self.discard(connection)
+
+    def update_gauges(self):
+        DB_POOL_CONNECTIONS.set(
+            len(self.idle), database=self.name, state="idle"
+        )
+        DB_POOL_CONNECTIONS.set(
+            len(self.in_use) + self.opening,
+            database=self.name,
+            state="in_use"
+        )
+
+
+# (alias, connection parameters): pool
+pools = {}
+pools_lock = threading.Lock()
+# Pools of the parent process, see after_fork()
+inherited = []
+
+
+def get_pool(alias, params, **options):
+    """
+    Return the pool of connections to alias opened with params, creating
+    it with options
+    """
+    key = (alias, repr(sorted(params.items())))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = ConnectionPool(alias, **options)
+        return pool
+
+
+def close_pools(alias=None):
+    """
+    Close the pools of alias, of every alias by default
+    """
+    with pools_lock:
+        keys = [key for key in pools if alias is None or key[0] == alias]
+        closing = [pools.pop(key) for key in keys]
+    for pool in closing:
+        pool.close()
+
+
+def after_fork():
+    """
+    A forked worker shares the sockets of its parent's connections,
+    closing them would end the parent's sessions. Keep them referenced,
+    never used, and open connections of its own.
+    """
+    global pools_lock
+    pools_lock = threading.Lock()
+    inherited.extend(pools.values())
+    pools.clear()
+
+
+os.register_at_fork(after_in_child=after_fork)
@@ -0,0 +1,144 @@
+"""
+PostgreSQL backend adding to Django's:
+
+- CONN_HEALTH_CHECKS as in Django 4.1: a persistent connection is checked
+  before the first query of a request, and replaced when the database
+  closed it meanwhile, rather than failing that query.
+- A connection pool shared by the threads of the process, enabled by a
+  "pool" dict of ConnectionPool arguments in OPTIONS, or True for the
+  defaults. Connections are handed back to the pool when Django closes
+  them, so it takes CONN_MAX_AGE = 0.
+"""
+import functools
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import (
+    DatabaseCreation as BaseDatabaseCreation
+)
+from psycopg2 import extensions
+
+from core.db.pool import close_pools, get_pool
+from core.metrics import DB_CONNECTIONS_OPENED, DB_HEALTH_CHECKS
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        # Pooled connections to the template database would stay open
+        self.connection.close()
+        close_pools(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    health_check_enabled = False
+    health_check_done = False
+    pool = None
+
+    def __init__(self, settings_dict, alias="default"):
+        pool = settings_dict["OPTIONS"].get("pool")
+        if pool and settings_dict.get("CONN_MAX_AGE"):
+            raise ImproperlyConfigured(
+                f"Database {alias} has a connection pool, set its "
+                f"CONN_MAX_AGE to 0."
+            )
+        super().__init__(settings_dict, alias)
+        self.pool_options = {} if pool is True else dict(pool or {})
+        self.pooled = bool(pool)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        if not self.pooled:
+            return self.open_connection(conn_params)
+        self.pool = get_pool(self.alias, conn_params, **self.pool_options)
+        connection, reused = self.pool.acquire(
+            functools.partial(self.open_connection, conn_params),
+            self.check_connection if self.health_check_enabled else None
+        )
+        if reused:
+            # Set by the parent method on connections it opens
+            self.isolation_level = self.settings_dict["OPTIONS"].get(
+                "isolation_level", connection.isolation_level
+            )
+        return connection
+
+    def open_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        DB_CONNECTIONS_OPENED.inc(database=self.alias)
+        return connection
+
+    def check_connection(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except base.Database.Error:
+            usable = False
+        else:
+            usable = True
+        DB_HEALTH_CHECKS.inc(
+            database=self.alias, outcome="ok" if usable else "failed"
+        )
+        return usable
+
+    def connect(self):
+        self.health_check_enabled = self.settings_dict.get(
+            "CONN_HEALTH_CHECKS", False
+        )
+        super().connect()
+        # Pooled connections were checked when acquired
+        self.health_check_done = True
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.check_connection(self.connection):
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def close_if_unusable_or_obsolete(self):
+        # Called as requests start and finish, check once per request
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        pool.release(self.connection, self.reusable())
+
+    def reusable(self):
+        """
+        Whether the connection can be handed to another request, rolling
+        back a transaction left open
+        """
+        if self.in_atomic_block or self.connection.closed:
+            return False
+        status = self.connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            self.connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    Argon2 with its costs read from settings. Hashes made with other costs
+    still verify and are rehashed on the next successful login.
+    """
+    time_cost = getattr(settings, "ARGON2_TIME_COST", 2)
+    memory_cost = getattr(settings, "ARGON2_MEMORY_COST", 19456)
+    parallelism = getattr(settings, "ARGON2_PARALLELISM", 1)
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """
+    bcrypt with its number of rounds read from settings
+    """
+    rounds = getattr(settings, "BCRYPT_ROUNDS", 12)
@@ -0,0 +1,310 @@
+import csv
+import io
+import json
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core import changes
+from core import models
+from core import versions
+from core.counters import add_recipes
+from core.search import update_search_vector
+
+
+BATCH_SIZE = 1000
+# Separates tag and ingredient names inside a CSV cell
+LIST_SEPARATOR = "|"
+RECIPE_FIELDS = ["title", "time_minutes", "price", "link"]
+RELATIONS = [
+    ("tags", models.Tag, models.Recipe.tags.through, "tag_id"),
+    (
+        "ingredients",
+        models.Ingredient,
+        models.Recipe.ingredients.through,
+        "ingredient_id"
+    ),
+]
+
+
+class InvalidRow(ValueError):
+    """
+    Raised for an input row that can not be imported
+    """
+
+
+def detect_format(path):
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def read_rows(source, file_format):
+    """
+    Yield (line number, raw row) from an open NDJSON or CSV file, one
+    line at a time
+    """
+    if file_format == "csv":
+        yield from enumerate(csv.DictReader(source), start=2)
+    else:
+        for number, line in enumerate(source, start=1):
+            if line.strip():
+                yield number, line
+
+
+def split_names(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    if not isinstance(value, list):
+        raise InvalidRow("tags and ingredients must be lists of names")
+    names = []
+    for name in value:
+        name = str(name).strip()[:255]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def parse_row(raw, default_user=None):
+    """
+    Validate a raw NDJSON line or CSV row into the values of a recipe
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError as exc:
+            raise InvalidRow(f"invalid JSON: {exc}")
+        if not isinstance(raw, dict):
+            raise InvalidRow("expected a JSON object")
+
+    row = {"user": raw.get("user") or default_user}
+    if not row["user"]:
+        raise InvalidRow("no user given")
+    if not isinstance(row["user"], str):
+        raise InvalidRow("user must be an email address")
+    for name in RECIPE_FIELDS:
+        field = models.Recipe._meta.get_field(name)
+        value = raw.get(name)
+        if value is None and field.blank:
+            value = ""
+        try:
+            row[name] = field.clean(value, None)
+        except ValidationError as exc:
+            raise InvalidRow(f"{name}: {' '.join(exc.messages)}")
+    for name, *_ in RELATIONS:
+        row[name] = split_names(raw.get(name))
+    return row
+
+
+class RecipeImporter:
+    """
+    Write parsed recipe rows in batches.
+
+    Tag and ingredient names are upserted per user through an in-memory
+    name to id map, loaded once per user, so a batch costs a fixed number
+    of queries. Recipes and through rows are written with ``bulk_create``
+    or, on PostgreSQL with ``use_copy``, with ``COPY``.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, use_copy=False,
+                 using="default", on_flush=None):
+        self.batch_size = batch_size
+        self.using = using
+        self.connection = connections[using]
+        self.use_copy = use_copy and self.connection.vendor == "postgresql"
+        self.on_flush = on_flush
+        self.users = {}
+        self.names = {model: {} for _name, model, *rest in RELATIONS}
+        self.loaded_users = set()
+        self.pending = []
+        self.imported = 0
+
+    def add(self, row):
+        """
+        Queue a parsed row, writing the batch once it is full
+        """
+        row = dict(row, user=self.get_user_id(row["user"]))
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def get_user_id(self, email):
+        if email not in self.users:
+            self.users[email] = get_user_model().objects.using(
+                self.using
+            ).filter(email=email).values_list("id", flat=True).first()
+        if self.users[email] is None:
+            raise InvalidRow(f"unknown user {email}")
+        return self.users[email]
+
+    def flush(self):
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        with transaction.atomic(using=self.using):
+            self.load_names({row["user"] for row in rows})
+            for name, model, *rest in RELATIONS:
+                self.upsert_names(model, {
+                    (row["user"], value) for row in rows for value in row[name]
+                })
+            recipe_ids = self.create_recipes(rows)
+            self.create_relations(rows, recipe_ids)
+            update_search_vector(
+                models.Recipe.objects.using(self.using).filter(
+                    pk__in=recipe_ids
+                )
+            )
+            versions.bump({row["user"] for row in rows})
+            self.record_changes(rows, recipe_ids)
+        self.imported += len(rows)
+        if self.on_flush:
+            self.on_flush(len(rows))
+
+    def record_changes(self, rows, recipe_ids):
+        """
+        Log the recipes created per user, with the tags and ingredients
+        they link to, bulk writes skip the signals doing it
+        """
+        changed = defaultdict(lambda: defaultdict(set))
+        for recipe_id, row in zip(recipe_ids, rows):
+            changed[row["user"]]["recipes"].add(recipe_id)
+            for name, model, *rest in RELATIONS:
+                changed[row["user"]][name].update(
+                    self.names[model][(row["user"], value)]
+                    for value in row[name]
+                )
+        for user_id, updated in changed.items():
+            changes.record(user_id, updated, using=self.using)
+
+    def load_names(self, user_ids):
+        for user_id in user_ids - self.loaded_users:
+            for model, names in self.names.items():
+                names.update(
+                    ((user_id, name), pk)
+                    for pk, name in model.objects.using(self.using).filter(
+                        user_id=user_id
+                    ).values_list("id", "name")
+                )
+            self.loaded_users.add(user_id)
+
+    def upsert_names(self, model, keys):
+        """
+        Create the names missing for their user and map them to ids
+        """
+        names = self.names[model]
+        missing = keys - names.keys()
+        if not missing:
+            return
+        # Names created meanwhile by the API are picked up below
+        model.objects.using(self.using).bulk_create(
+            [model(user_id=user_id, name=name) for user_id, name in missing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        created = model.objects.using(self.using).filter(
+            user_id__in={user_id for user_id, _name in missing},
+            name__in={name for _user_id, name in missing}
+        ).values_list("id", "user_id", "name")
+        for pk, user_id, name in created:
+            names.setdefault((user_id, name), pk)
+
+    def create_recipes(self, rows):
+        """
+        Insert the recipes of rows, returns their ids in row order
+        """
+        if self.use_copy:
+            ids = self.reserve_ids(models.Recipe, len(rows))
+            now = timezone.now()
+            self.copy(
+                models.Recipe,
+                ["id", "user", "updated_at"] + RECIPE_FIELDS,
+                [
+                    [pk, row["user"], now.isoformat()]
+                    + [row[name] for name in RECIPE_FIELDS]
+                    for pk, row in zip(ids, rows)
+                ]
+            )
+            return ids
+
+        recipes = [
+            models.Recipe(
+                user_id=row["user"],
+                **{name: row[name] for name in RECIPE_FIELDS}
+            )
+            for row in rows
+        ]
+        if self.connection.features.can_return_rows_from_bulk_insert:
+            models.Recipe.objects.using(self.using).bulk_create(
+                recipes,
+                batch_size=self.batch_size
+            )
+        else:
+            # Primary keys are only set by bulk_create on backends that can
+            # return inserted rows
+            for recipe in recipes:
+                recipe.save(using=self.using)
+        return [recipe.pk for recipe in recipes]
+
+    def create_relations(self, rows, recipe_ids):
+        for name, model, through, column in RELATIONS:
+            names = self.names[model]
+            links = [
+                (recipe_id, names[(row["user"], value)])
+                for recipe_id, row in zip(recipe_ids, rows)
+                for value in row[name]
+            ]
+            if not links:
+                continue
+            # Rows gaining the same number of recipes share one UPDATE
+            deltas = defaultdict(list)
+            for pk, delta in Counter(pk for _id, pk in links).items():
+                deltas[delta].append(pk)
+            if self.use_copy:
+                self.copy(through, ["recipe_id", column], links)
+            else:
+                through.objects.using(self.using).bulk_create(
+                    [
+                        through(recipe_id=recipe_id, **{column: pk})
+                        for recipe_id, pk in links
+                    ],
+                    batch_size=self.batch_size
+                )
+            for delta, pks in deltas.items():
+                add_recipes(model.objects.using(self.using).filter(
+                    pk__in=pks
+                ), delta)
+
+    def reserve_ids(self, model, count):
+        """
+        Take count values from the primary key sequence of model
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+                "FROM generate_series(1, %s)",
+                [model._meta.db_table, model._meta.pk.column, count]
+            )
+            return [pk for pk, in cursor.fetchall()]
+
+    def copy(self, model, fields, rows):
+        """
+        Load rows into the table of model with COPY FROM STDIN
+        """
+        quote_name = self.connection.ops.quote_name
+        columns = ", ".join(
+            quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        buffer = io.StringIO()
+        # Strings are quoted so an empty link is not read as NULL
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote_name(model._meta.db_table)} ({columns}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
@@ -0,0 +1,272 @@
+import contextlib
+import itertools
+import json
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import benchmarks
+from core import models
+
+
+def recipes(user):
+    return f"{reverse('recipe:recipe-list')}?page_size=50"
+
+
+def recipes_by_tag(user):
+    return (
+        f"{reverse('recipe:recipe-list')}?page_size=50"
+        f"&tags={random.choice(user['tags'])}"
+    )
+
+
+def recipes_search(user):
+    return f"{reverse('recipe:recipe-list')}?page_size=50&search=recipe"
+
+
+def tags(user):
+    return reverse("recipe:tag-list")
+
+
+def tags_assigned(user):
+    return f"{reverse('recipe:tag-list')}?assigned_only=1"
+
+
+def ingredients(user):
+    return reverse("recipe:ingredient-list")
+
+
+def profile(user):
+    return reverse("user:profile")
+
+
+def token(user):
+    return reverse("user:token")
+
+
+def token_body(user):
+    return {"email": user["email"], "password": benchmarks.PASSWORD}
+
+
+def create_tag(user):
+    return reverse("recipe:tag-list")
+
+
+def create_tag_body(user):
+    return {"name": f"Benchmark {uuid.uuid4().hex}"}
+
+
+# name: (method, path, body, authenticated)
+SCENARIOS = {
+    "recipes": ("GET", recipes, None, True),
+    "recipes_by_tag": ("GET", recipes_by_tag, None, True),
+    "recipes_search": ("GET", recipes_search, None, True),
+    "tags": ("GET", tags, None, True),
+    "tags_assigned": ("GET", tags_assigned, None, True),
+    "ingredients": ("GET", ingredients, None, True),
+    "profile": ("GET", profile, None, True),
+    "token": ("POST", token, token_body, False),
+    "create_tag": ("POST", create_tag, create_tag_body, True),
+}
+
+
+class Command(BaseCommand):
+    """
+    Django command seeding benchmark data and measuring latency,
+    throughput and queries per request of the recipe and user APIs
+    """
+    help = "Load test the recipe and user APIs over HTTP"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server, a local server is started "
+                 "in this process by default"
+        )
+        parser.add_argument("--seed", action="store_true",
+                            help="Insert the benchmark dataset first")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--recipes", type=int, default=200,
+                            help="Recipes per seeded user")
+        parser.add_argument("--tags", type=int, default=30,
+                            help="Tags per seeded user")
+        parser.add_argument("--ingredients", type=int, default=50,
+                            help="Ingredients per seeded user")
+        parser.add_argument("--links", type=int, default=3,
+                            help="Tags and ingredients per seeded recipe")
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(SCENARIOS),
+            help="Comma separated scenarios to run"
+        )
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--warmup", type=int, default=10,
+                            help="Requests per scenario before measuring")
+        parser.add_argument("--output", help="Write the results as JSON")
+        parser.add_argument("--compare",
+                            help="JSON results of an earlier run to compare")
+
+    def handle(self, *args, **options):
+        names = options["scenarios"].split(",")
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f"Unknown scenarios: {', '.join(sorted(unknown))}"
+            )
+        if options["seed"]:
+            started = time.perf_counter()
+            created = benchmarks.seed(
+                users=options["users"],
+                recipes=options["recipes"],
+                tags=options["tags"],
+                ingredients=options["ingredients"],
+                links=options["links"]
+            )
+            self.stdout.write(
+                f"Seeded {created} users in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+        users = self.load_users(options["users"])
+
+        with self.server(options["url"]) as base_url:
+            self.stdout.write(
+                f"{'scenario':<16}{'requests':>9}{'req/s':>10}{'p50 ms':>9}"
+                f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}"
+            )
+            results = {}
+            for name in names:
+                results[name] = self.run_scenario(
+                    base_url, users, SCENARIOS[name], options
+                )
+                self.report(name, results[name])
+
+        report = {
+            "commit": self.get_commit(),
+            "created_at": timezone.now().isoformat(),
+            "database": connections["default"].vendor,
+            "options": {
+                key: options[key] for key in (
+                    "url", "users", "recipes", "requests", "concurrency"
+                )
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                self.compare(json.load(baseline), report)
+
+    def load_users(self, count):
+        emails = [benchmarks.EMAIL.format(number) for number in range(count)]
+        users = [
+            {"email": email, "token": key, "tags": []}
+            for email, key in get_user_model().objects.filter(
+                email__in=emails
+            ).values_list("email", "auth_token__key")
+        ]
+        if not users:
+            raise CommandError("No benchmark users, run with --seed first.")
+        by_email = {user["email"]: user for user in users}
+        for pk, email in models.Tag.objects.filter(
+            user__email__in=by_email
+        ).values_list("id", "user__email"):
+            by_email[email]["tags"].append(pk)
+        for user in users:
+            user["tags"] = user["tags"] or [0]
+        return users
+
+    @contextlib.contextmanager
+    def server(self, url):
+        if url:
+            yield url
+            return
+        # Token requests of the benchmark users must not be throttled
+        with override_settings(
+            ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ["127.0.0.1"],
+            REST_FRAMEWORK=dict(
+                getattr(settings, "REST_FRAMEWORK", {}),
+                DEFAULT_THROTTLE_RATES={}
+            )
+        ), benchmarks.LocalServer() as local_url:
+            yield local_url
+
+    def run_scenario(self, base_url, users, scenario, options):
+        method, path, body, authenticated = scenario
+        local = threading.local()
+        picks = itertools.cycle(users)
+        lock = threading.Lock()
+
+        def send(_number):
+            if not hasattr(local, "client"):
+                local.client = benchmarks.Client(base_url)
+            with lock:
+                user = next(picks)
+            return local.client.request(
+                method,
+                path(user),
+                body(user) if body else None,
+                user["token"] if authenticated else None
+            )
+
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            list(executor.map(send, range(options["warmup"])))
+            started = time.perf_counter()
+            samples = list(executor.map(send, range(options["requests"])))
+            elapsed = time.perf_counter() - started
+        return benchmarks.summarize(samples, elapsed)
+
+    def report(self, name, result):
+        def number(value, digits=1):
+            return "-" if value is None else f"{value:.{digits}f}"
+
+        self.stdout.write(
+            f"{name:<16}{result['requests']:>9}"
+            f"{number(result['requests_per_second']):>10}"
+            f"{number(result['p50_ms']):>9}{number(result['p95_ms']):>9}"
+            f"{number(result['p99_ms']):>9}"
+            f"{number(result['queries_per_request']):>9}"
+            f"{result['errors']:>8}"
+        )
+
+    def compare(self, baseline, report):
+        self.stdout.write(
+            f"Compared with {baseline.get('commit') or 'baseline'}:"
+        )
+        for name, result in report["results"].items():
+            before = baseline["results"].get(name)
+            if not before:
+                continue
+            changes = []
+            for key, label in (
+                ("requests_per_second", "req/s"),
+                ("p95_ms", "p95"),
+                ("queries_per_request", "queries"),
+            ):
+                if before.get(key) and result.get(key) is not None:
+                    change = (result[key] - before[key]) / before[key] * 100
+                    changes.append(f"{label} {change:+.1f}%")
+            self.stdout.write(f"  {name:<16}{'  '.join(changes)}")
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
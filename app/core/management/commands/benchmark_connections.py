@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+# name: environment of the benchmark_api process
+MODES = {
+    "per-request": {"DB_POOL": "0", "DB_CONN_MAX_AGE": "0"},
+    "persistent": {"DB_POOL": "0", "DB_CONN_MAX_AGE": "60"},
+    "pooled": {"DB_POOL": "1"},
+}
+
+
+class Command(BaseCommand):
+    """
+    Django command running benchmark_api with a database connection per
+    request, persistent connections and pooled connections, each in a
+    process of its own since the database settings are read at startup
+    """
+    help = "Compare the API throughput with each database connection mode"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true",
+                            help="Insert the benchmark dataset first")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument(
+            "--modes",
+            default=",".join(MODES),
+            help="Comma separated connection modes to run"
+        )
+        parser.add_argument("--scenarios", default="tags,profile,recipes",
+                            help="Comma separated benchmark_api scenarios")
+        parser.add_argument("--requests", type=int, default=500,
+                            help="Requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--json", action="store_true",
+                            help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        modes = options["modes"].split(",")
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        if connections["default"].vendor != "postgresql":
+            raise CommandError("Connection modes need PostgreSQL.")
+
+        results = {}
+        for number, mode in enumerate(modes):
+            results[mode] = self.run_mode(
+                mode, options, seed=options["seed"] and number == 0
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(
+            f"{'mode':<13}{'scenario':<12}{'req/s':>9}{'p50 ms':>9}"
+            f"{'p95 ms':>9}{'errors':>8}"
+        )
+        for mode, scenarios in results.items():
+            for name, row in scenarios.items():
+                self.report(mode, name, row)
+
+    def run_mode(self, mode, options, seed=False):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            command = [
+                sys.executable,
+                os.path.join(settings.BASE_DIR, "manage.py"),
+                "benchmark_api",
+                "--users", str(options["users"]),
+                "--scenarios", options["scenarios"],
+                "--requests", str(options["requests"]),
+                "--concurrency", str(options["concurrency"]),
+                "--output", output,
+            ]
+            if seed:
+                command.append("--seed")
+            try:
+                subprocess.run(
+                    command,
+                    env=dict(os.environ, **MODES[mode]),
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
+            except subprocess.CalledProcessError as exc:
+                raise CommandError(f"The {mode} run failed:\n{exc.stderr}")
+            with open(output) as results:
+                return json.load(results)["results"]
+
+    def report(self, mode, name, row):
+        def number(value, digits=1):
+            return "-" if value is None else f"{value:.{digits}f}"
+
+        self.stdout.write(
+            f"{mode:<13}{name:<12}"
+            f"{number(row['requests_per_second']):>9}"
+            f"{number(row['p50_ms']):>9}{number(row['p95_ms']):>9}"
+            f"{row['errors']:>8}"
+        )
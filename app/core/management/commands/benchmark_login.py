@@ -0,0 +1,120 @@
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+
+HASHERS = {
+    "argon2": "core.hashers.Argon2PasswordHasher",
+    "bcrypt": "core.hashers.BCryptSHA256PasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    """
+    Django command measuring token requests per second under concurrent
+    load, for every password hasher, for clients reusing their token and
+    for throttled requests
+    """
+    help = "Benchmark login throughput of the token endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--hashers",
+            default=",".join(HASHERS),
+            help="Comma separated hashers to compare"
+        )
+
+    def handle(self, *args, **options):
+        self.url = reverse("user:token")
+        user = get_user_model().objects.create_user(
+            f"benchmark-{uuid.uuid4().hex}@localmachine.com",
+            PASSWORD
+        )
+        self.payload = {"email": user.email, "password": PASSWORD}
+        # Throttled requests would each log a warning
+        logging.disable(logging.WARNING)
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ["testserver"]
+            ):
+                self.run_scenarios(user, options)
+        finally:
+            logging.disable(logging.NOTSET)
+            user.delete()
+
+    def run_scenarios(self, user, options):
+        with self.throttle_rates():
+            for name in options["hashers"].split(","):
+                self.benchmark_hasher(user, name, options)
+            token = Token.objects.get_or_create(user=user)[0]
+            self.report(
+                "token reuse", options,
+                HTTP_AUTHORIZATION=f"Token {token.key}"
+            )
+        # A credential stuffing burst on one account
+        cache.clear()
+        with self.throttle_rates(login_email="1/hour"):
+            self.report(
+                "throttled", options,
+                dict(self.payload, password="wrong")
+            )
+
+    def benchmark_hasher(self, user, name, options):
+        with override_settings(PASSWORD_HASHERS=[HASHERS[name]]):
+            try:
+                user.password = make_password(PASSWORD)
+            except ValueError as exc:
+                self.stdout.write(f"  {name:<12} skipped: {exc}")
+                return
+            user.save(update_fields=["password"])
+            self.report(name, options)
+
+    def throttle_rates(self, **rates):
+        return override_settings(REST_FRAMEWORK=dict(
+            getattr(settings, "REST_FRAMEWORK", {}),
+            DEFAULT_THROTTLE_RATES=rates
+        ))
+
+    def login(self, client, payload, headers):
+        try:
+            return client.post(self.url, payload, **headers).status_code
+        finally:
+            connections.close_all()
+
+    def report(self, label, options, payload=None, **headers):
+        clients = [Client() for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            statuses = list(executor.map(
+                lambda number: self.login(
+                    clients[number % len(clients)],
+                    payload or self.payload,
+                    headers
+                ),
+                range(options["requests"])
+            ))
+        elapsed = time.perf_counter() - started
+        counts = ", ".join(
+            f"{status} x{statuses.count(status)}"
+            for status in sorted(set(statuses))
+        )
+        self.stdout.write(
+            f"  {label:<12} {options['requests'] / elapsed:9.1f} req/s  "
+            f"{elapsed / options['requests'] * 1000:7.2f} ms/request  "
+            f"status {counts}"
+        )
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views import static
+
+from core import media
+
+
+class Command(BaseCommand):
+    """
+    Django command to compare core.media.serve with django's static
+    serve view on full, conditional and range requests
+    """
+    help = "Benchmark the media serving view against django.views.static"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=2 * 2 ** 20)
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with tempfile.TemporaryDirectory() as root:
+            path = "photo.jpg"
+            with open(os.path.join(root, path), "wb") as destination:
+                destination.write(os.urandom(options["size"]))
+
+            etag = media.serve(factory.get("/"), path, root)["ETag"]
+            last_modified = static.serve(
+                factory.get("/"), path, root
+            )["Last-Modified"]
+            scenarios = [
+                ("full file", {}, {}),
+                (
+                    "revalidation",
+                    {"HTTP_IF_MODIFIED_SINCE": last_modified},
+                    {"HTTP_IF_NONE_MATCH": etag},
+                ),
+                (
+                    "64KB range",
+                    {"HTTP_RANGE": "bytes=0-65535"},
+                    {"HTTP_RANGE": "bytes=0-65535"},
+                ),
+            ]
+            for name, static_headers, media_headers in scenarios:
+                self.stdout.write(name)
+                self.report(
+                    "static", options,
+                    lambda: static.serve(
+                        factory.get("/", **static_headers), path, root
+                    )
+                )
+                self.report(
+                    "media", options,
+                    lambda: media.serve(
+                        factory.get("/", **media_headers), path, root
+                    )
+                )
+
+    def report(self, label, options, view):
+        sent = 0
+        started = time.perf_counter()
+        for _ in range(options["requests"]):
+            response = view()
+            if response.streaming:
+                sent += sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                sent += len(response.content)
+            response.close()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"  {label:<7} {options['requests'] / elapsed:9.1f} req/s  "
+            f"status {response.status_code}  "
+            f"{sent / options['requests'] / 1024:9.1f} KB/request"
+        )
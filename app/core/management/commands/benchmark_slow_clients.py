@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from core import benchmarks
+from core import models
+
+
+SERVERS = ("wsgi", "asgi")
+
+
+class Command(BaseCommand):
+    """
+    Django command measuring how a server process copes with clients
+    slowly uploading images: while they upload, other clients list their
+    tags and the latency and throughput they get is reported. The WSGI
+    server holds one of its ``--threads`` per upload, the ASGI server
+    reads upload bodies on its event loop.
+    """
+    help = "Compare WSGI and ASGI serving under slow uploading clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=SERVERS,
+                            help="Run one server only, both by default")
+        parser.add_argument("--seed", action="store_true",
+                            help="Insert the benchmark dataset first")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument(
+            "--slow",
+            default="0,8,32,128",
+            help="Comma separated numbers of slow clients to run with"
+        )
+        parser.add_argument("--duration", type=float, default=5,
+                            help="Seconds each slow client takes to upload")
+        parser.add_argument("--concurrency", type=int, default=4,
+                            help="Clients listing tags meanwhile")
+        parser.add_argument("--threads", type=int, default=8,
+                            help="Threads of the WSGI server")
+        parser.add_argument("--json", action="store_true",
+                            help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options["slow"].split(",")]
+        except ValueError:
+            raise CommandError("--slow takes comma separated numbers.")
+        if options["seed"]:
+            benchmarks.seed(users=options["users"], recipes=1)
+
+        if options["server"]:
+            results = {options["server"]: self.run_server(
+                options["server"], levels, options
+            )}
+        else:
+            # The async routes are picked when the URLconf is imported,
+            # each server gets a process of its own
+            results = {
+                server: self.run_child(server, options) for server in SERVERS
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(
+            f"{'server':<8}{'slow':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'errors':>8}{'uploaded':>10}{'failed':>8}"
+        )
+        for server, rows in results.items():
+            for row in rows:
+                self.report(server, row)
+
+    def run_child(self, server, options):
+        command = [
+            sys.executable,
+            os.path.join(settings.BASE_DIR, "manage.py"),
+            "benchmark_slow_clients",
+            "--server", server,
+            "--json",
+            "--users", str(options["users"]),
+            "--slow", options["slow"],
+            "--duration", str(options["duration"]),
+            "--concurrency", str(options["concurrency"]),
+            "--threads", str(options["threads"]),
+        ]
+        env = dict(
+            os.environ,
+            RECIPE_ASYNC_VIEWS="1" if server == "asgi" else "0"
+        )
+        try:
+            output = subprocess.run(
+                command, env=env, capture_output=True, text=True, check=True
+            ).stdout
+        except subprocess.CalledProcessError as exc:
+            raise CommandError(f"The {server} run failed:\n{exc.stderr}")
+        return json.loads(output.strip().splitlines()[-1])[server]
+
+    def run_server(self, server, levels, options):
+        if server == "asgi" and not settings.RECIPE_ASYNC_VIEWS:
+            raise CommandError(
+                "Run the asgi server with RECIPE_ASYNC_VIEWS=1."
+            )
+        users = self.load_users(options["users"])
+        if server == "asgi":
+            local_server = benchmarks.LocalASGIServer()
+        else:
+            local_server = benchmarks.LocalServer(threads=options["threads"])
+
+        with override_settings(
+            ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ["127.0.0.1"]
+        ), local_server as base_url:
+            return [
+                dict(self.run_level(base_url, users, slow, options),
+                     slow=slow)
+                for slow in levels
+            ]
+
+    def load_users(self, count):
+        emails = [benchmarks.EMAIL.format(number) for number in range(count)]
+        users = [
+            {"token": key, "recipe": None}
+            for key in get_user_model().objects.filter(
+                email__in=emails
+            ).values_list("auth_token__key", flat=True)
+        ]
+        if not users:
+            raise CommandError("No benchmark users, run with --seed first.")
+        recipes = dict(
+            models.Recipe.objects.filter(user__email__in=emails)
+            .values_list("user__auth_token__key", "id")
+        )
+        for user in users:
+            user["recipe"] = recipes.get(user["token"])
+        return [user for user in users if user["recipe"]]
+
+    def run_level(self, base_url, users, slow, options):
+        """
+        Run slow uploads and measure the tag lists served meanwhile
+        """
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, format="PNG")
+        content_type, body = benchmarks.multipart_body(
+            "image", "benchmark.png", buffer.getvalue()
+        )
+
+        async def upload_all():
+            return await asyncio.gather(*(
+                benchmarks.slow_request(
+                    base_url,
+                    reverse(
+                        "recipe:recipe-upload-image",
+                        args=[users[number % len(users)]["recipe"]]
+                    ),
+                    {
+                        "Authorization":
+                            f"Token {users[number % len(users)]['token']}",
+                        "Content-Type": content_type,
+                    },
+                    body,
+                    options["duration"]
+                )
+                for number in range(slow)
+            ))
+
+        uploads = []
+        uploader = threading.Thread(
+            target=lambda: uploads.extend(asyncio.run(upload_all()))
+        )
+        uploader.start()
+
+        samples = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["duration"]
+
+        def list_tags(number):
+            client = benchmarks.Client(base_url, keep_alive=False)
+            user = users[number % len(users)]
+            while time.perf_counter() < deadline:
+                try:
+                    sample = client.request(
+                        "GET", reverse("recipe:tag-list"),
+                        token=user["token"]
+                    )
+                except OSError:
+                    sample = (599, 0.0, None)
+                with lock:
+                    samples.append(sample)
+
+        started = time.perf_counter()
+        listers = [
+            threading.Thread(target=list_tags, args=(number,))
+            for number in range(options["concurrency"])
+        ]
+        for lister in listers:
+            lister.start()
+        for lister in listers:
+            lister.join()
+        elapsed = time.perf_counter() - started
+        uploader.join()
+
+        result = benchmarks.summarize(samples, elapsed)
+        result["uploaded"] = sum(1 for status, _s in uploads if status == 202)
+        result["upload_failed"] = len(uploads) - result["uploaded"]
+        return result
+
+    def report(self, server, row):
+        def number(value, digits=1):
+            return "-" if value is None else f"{value:.{digits}f}"
+
+        self.stdout.write(
+            f"{server:<8}{row['slow']:>6}"
+            f"{number(row['requests_per_second']):>9}"
+            f"{number(row['p50_ms']):>9}{number(row['p95_ms']):>9}"
+            f"{number(row['p99_ms']):>9}{row['errors']:>8}"
+            f"{row['uploaded']:>10}{row['upload_failed']:>8}"
+        )
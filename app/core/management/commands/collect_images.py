@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import models
+from core import storage
+
+
+class Command(BaseCommand):
+    """
+    Django command to delete recipe images no recipe references anymore
+    """
+    help = "Garbage collect unreferenced recipe images"
+
+    def handle(self, *args, **options):
+        grace = getattr(settings, "RECIPE_IMAGE_GC_GRACE", 3600)
+        names = models.ImageBlob.objects.filter(
+            ref_count=0
+        ).values_list("name", flat=True)
+        collected = sum(storage.collect(name, grace) for name in names)
+
+        tmp_dir = storage.recipe_image_storage.path(
+            os.path.join(storage.recipe_image_storage.prefix, "tmp")
+        )
+        if os.path.isdir(tmp_dir):
+            for entry in os.scandir(tmp_dir):
+                if entry.stat().st_mtime < time.time() - grace:
+                    os.remove(entry.path)
+                    collected += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Collected {collected} files")
+        )
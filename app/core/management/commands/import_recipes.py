@@ -0,0 +1,236 @@
+import multiprocessing
+import queue
+import time
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import importer
+
+
+# Seconds between progress lines, every batch is reported at -v 2
+REPORT_INTERVAL = 5
+
+
+def run_worker(batches, progress, options):
+    """
+    Import the batches handed to one worker process
+    """
+    # Never share the parent's database connection after fork
+    connections.close_all()
+    rows = importer.RecipeImporter(
+        on_flush=lambda count: progress.put(("imported", count)),
+        **options
+    )
+    try:
+        for batch in iter(batches.get, None):
+            for number, row in batch:
+                try:
+                    rows.add(row)
+                except importer.InvalidRow as exc:
+                    progress.put(("skipped", f"line {number}: {exc}"))
+        rows.flush()
+    except Exception as exc:
+        progress.put(("failed", f"{type(exc).__name__}: {exc}"))
+        raise SystemExit(1)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """
+    Django command to import recipes from NDJSON or CSV files
+    """
+    help = (
+        "Import recipes, creating missing tags and ingredients by name. "
+        "Rows are NDJSON objects or CSV rows with title, time_minutes, "
+        "price, link, tags and ingredients, and optionally the user email."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument(
+            "--format", choices=["ndjson", "csv"],
+            help="Input format, guessed from the file extension by default"
+        )
+        parser.add_argument(
+            "--user", help="Email of the owner of rows without a user"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=importer.BATCH_SIZE
+        )
+        parser.add_argument(
+            "--copy", action="store_true",
+            help="Write rows with COPY on PostgreSQL"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=0,
+            help="Worker processes, rows are split between them by user"
+        )
+        parser.add_argument(
+            "--max-errors", type=int, default=20,
+            help="Number of skipped rows reported in detail"
+        )
+
+    def handle(self, *args, **options):
+        self.started = self.last_report = time.monotonic()
+        self.imported = 0
+        self.skipped = 0
+        self.reported = 0
+        self.verbosity = options["verbosity"]
+        self.max_errors = options["max_errors"]
+        importer_options = {
+            "batch_size": options["batch_size"],
+            "use_copy": options["copy"],
+        }
+
+        if options["workers"] > 0:
+            self.import_parallel(options, importer_options)
+        else:
+            rows = importer.RecipeImporter(
+                on_flush=self.report_progress,
+                **importer_options
+            )
+            for number, row in self.read(options):
+                try:
+                    rows.add(row)
+                except importer.InvalidRow as exc:
+                    self.skip(f"line {number}: {exc}")
+            rows.flush()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.imported} recipes in {elapsed:.1f}s "
+            f"({self.rate(elapsed):.0f} rows/s), skipped {self.skipped}"
+        ))
+
+    def read(self, options):
+        """
+        Yield (line number, parsed row) of every input file
+        """
+        for path in options["paths"]:
+            file_format = options["format"] or importer.detect_format(path)
+            try:
+                source = open(path, newline="", encoding="utf-8")
+            except OSError as exc:
+                raise CommandError(exc)
+            with source:
+                for number, raw in importer.read_rows(source, file_format):
+                    try:
+                        yield number, importer.parse_row(raw, options["user"])
+                    except importer.InvalidRow as exc:
+                        self.skip(f"{path} line {number}: {exc}")
+
+    def import_parallel(self, options, importer_options):
+        """
+        Hand batches of rows to worker processes, every user always goes
+        to the same worker so tag and ingredient names never race
+        """
+        if connections["default"].vendor == "sqlite":
+            raise CommandError(
+                "Parallel imports need a database accepting concurrent "
+                "writers, run without --workers on SQLite"
+            )
+        context = multiprocessing.get_context("fork")
+        workers = options["workers"]
+        # Bounded queues keep memory flat when workers fall behind
+        self.queues = [context.Queue(maxsize=2) for _ in range(workers)]
+        self.progress = context.Queue()
+        # Forked children must open their own connections
+        connections.close_all()
+        self.processes = [
+            context.Process(
+                target=run_worker,
+                args=(batches, self.progress, importer_options)
+            )
+            for batches in self.queues
+        ]
+        for process in self.processes:
+            process.start()
+        try:
+            self.feed_workers(options)
+        finally:
+            for process in self.processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+        failed = [p for p in self.processes if p.exitcode != 0]
+        if failed:
+            raise CommandError(f"{len(failed)} import workers failed")
+
+    def feed_workers(self, options):
+        """
+        Route parsed rows to workers by user and wait for them to finish
+        """
+        workers = len(self.queues)
+        batch_size = options["batch_size"]
+        pending = [[] for _ in range(workers)]
+        for number, row in self.read(options):
+            index = zlib.crc32(row["user"].encode("utf-8")) % workers
+            pending[index].append((number, row))
+            if len(pending[index]) >= batch_size:
+                self.put(index, pending[index])
+                pending[index] = []
+            self.drain()
+        for index in range(workers):
+            if pending[index]:
+                self.put(index, pending[index])
+            self.put(index, None)
+
+        while any(process.is_alive() for process in self.processes):
+            self.drain(timeout=0.5)
+        self.drain()
+
+    def put(self, index, batch):
+        """
+        Queue a batch for a worker, reporting progress while it is busy
+        """
+        while True:
+            try:
+                self.queues[index].put(batch, timeout=0.5)
+                return
+            except queue.Full:
+                if not self.processes[index].is_alive():
+                    raise CommandError("An import worker failed")
+                self.drain()
+
+    def drain(self, timeout=None):
+        """
+        Handle the messages sent by workers, waiting up to timeout for
+        the first one
+        """
+        block = timeout is not None
+        while True:
+            try:
+                kind, value = self.progress.get(block, timeout)
+            except queue.Empty:
+                return
+            block = False
+            if kind == "imported":
+                self.report_progress(value)
+            elif kind == "skipped":
+                self.skip(value)
+            else:
+                self.stderr.write(f"Import worker failed: {value}")
+
+    def report_progress(self, count):
+        self.imported += count
+        now = time.monotonic()
+        if self.verbosity > 1 or (
+            self.verbosity and now - self.last_report >= REPORT_INTERVAL
+        ):
+            self.last_report = now
+            elapsed = now - self.started
+            self.stdout.write(
+                f"{self.imported} recipes ({self.rate(elapsed):.0f} rows/s)"
+            )
+
+    def rate(self, elapsed):
+        return self.imported / elapsed if elapsed else 0
+
+    def skip(self, message):
+        self.skipped += 1
+        if self.reported < self.max_errors:
+            self.reported += 1
+            self.stderr.write(f"Skipped {message}")
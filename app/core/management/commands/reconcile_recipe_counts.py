@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import counters
+
+
+class Command(BaseCommand):
+    """
+    Django command to fix drifted recipe counts of tags and ingredients
+    """
+    help = "Recount the recipes of tags and ingredients that drifted"
+
+    def handle(self, *args, **options):
+        for model in counters.RELATIONS:
+            fixed = counters.reconcile_recipe_counts(model)
+            self.stdout.write(self.style.SUCCESS(
+                f"Fixed {fixed} {model._meta.verbose_name_plural}"
+            ))
@@ -0,0 +1,483 @@
+import atexit
+import bisect
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FILE_PATTERN = "metrics-*.json"
+
+
+class Metric:
+    """
+    Labelled metric whose samples are kept in one shard per thread.
+
+    A thread only ever writes its own shard, so recording a sample takes
+    no lock; the lock is only taken when a thread records its first
+    sample and when the shards are collected. Shards of finished threads
+    are folded together so thread per request servers stay bounded.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.reset()
+        (registry or REGISTRY).register(self)
+
+    def reset(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+
+    def key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes the labels {', '.join(self.labelnames)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self.retire()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def retire(self):
+        """
+        Fold the shards of finished threads, called with the lock held
+        """
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, value in list(shard.items()):
+                    self.add(self._retired, key, value)
+        self._shards = alive
+
+    def samples(self):
+        """
+        Return the label values and value of every labelled child
+        """
+        with self._lock:
+            self.retire()
+            merged = {}
+            for key, value in self._retired.items():
+                self.add(merged, key, value)
+            for _thread, shard in self._shards:
+                for key, value in list(shard.items()):
+                    self.add(merged, key, value)
+        return merged
+
+    def snapshot(self):
+        return {
+            "type": self.kind,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [
+                [list(key), value] for key, value in self.samples().items()
+            ],
+        }
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self.shard()
+        key = self.key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @staticmethod
+    def add(samples, key, value):
+        samples[key] = samples.get(key, 0) + value
+
+
+class Histogram(Metric):
+    """
+    Histogram of observed values, bucket counts are kept per bucket and
+    made cumulative when rendered
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(float(bound) for bound in sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        shard = self.shard()
+        key = self.key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    @staticmethod
+    def add(samples, key, value):
+        entry = samples.get(key)
+        if entry is None:
+            samples[key] = [list(value[0]), value[1]]
+            return
+        for index, count in enumerate(value[0]):
+            entry[0][index] += count
+        entry[1] += value[1]
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class Gauge(Metric):
+    """
+    Current value set by its owner, the values of several processes are
+    summed leaving out processes that exited
+    """
+    kind = "gauge"
+
+    def reset(self):
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[self.key(labels)] = value
+
+    def samples(self):
+        return dict(self._values)
+
+
+class Timer:
+    """
+    Context manager observing the seconds spent in its block, labels set
+    on it inside the block are used as well
+    """
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(
+            time.perf_counter() - self.started, **self.labels
+        )
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def snapshot(self):
+        """
+        Return the samples of every metric as JSON serializable data
+        """
+        return {
+            name: metric.snapshot() for name, metric in self.metrics.items()
+        }
+
+
+def merge(snapshots):
+    """
+    Sum the samples of snapshots taken in several processes, histograms
+    whose buckets differ from the first snapshot seen are left out
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            kind = Histogram if metric["type"] == "histogram" else Counter
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = dict(metric, samples={})
+            elif (target["type"] != metric["type"]
+                  or target.get("buckets") != metric.get("buckets")):
+                continue
+            for labels, value in metric["samples"]:
+                kind.add(target["samples"], tuple(labels), value)
+    for metric in merged.values():
+        metric["samples"] = [
+            [list(key), value] for key, value in metric["samples"].items()
+        ]
+    return merged
+
+
+def escape(value, quotes=True):
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        f'{name}="{escape(value)}"' for name, value in pairs
+    )
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """
+    Render a snapshot in the Prometheus text exposition format
+    """
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        names = metric["labelnames"]
+        lines.append(f"# HELP {name} {escape(metric['help'], False)}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for values, value in sorted(metric["samples"]):
+            if metric["type"] != "histogram":
+                lines.append(
+                    f"{name}{format_labels(names, values)} "
+                    f"{format_value(value)}"
+                )
+                continue
+            counts, total = value
+            cumulative = 0
+            bounds = metric["buckets"] + [float("inf")]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = format_labels(
+                    names, values, [("le", format_value(float(bound)))]
+                )
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = format_labels(names, values)
+            lines.append(f"{name}_sum{labels} {format_value(float(total))}")
+            lines.append(f"{name}_count{labels} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class ProcessFiles:
+    """
+    Share the metrics of several worker processes through a directory.
+
+    Each process writes its snapshot to its own file, at most every
+    ``interval`` seconds after a request, when it is scraped and when it
+    exits. A scrape sums every file, files of exited workers are kept so
+    counters never go back. Empty the directory when the server starts.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.flushed = None
+        self.lock = threading.Lock()
+        self.name = self.process_name()
+
+    def process_name(self):
+        # Pids are reused, a new worker must not overwrite an old file
+        return f"metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self.flushed = None
+        self.name = self.process_name()
+
+    def directory(self):
+        return getattr(settings, "METRICS_DIR", None)
+
+    def flush(self, force=True):
+        directory = self.directory()
+        if not directory:
+            return
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 10)
+        now = time.monotonic()
+        if (not force and self.flushed is not None
+                and now - self.flushed < interval):
+            return
+        if not self.lock.acquire(blocking=force):
+            return
+        try:
+            self.flushed = now
+            self.write(directory)
+        finally:
+            self.lock.release()
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as output:
+                json.dump(self.registry.snapshot(), output)
+            os.replace(path, os.path.join(directory, self.name))
+        except BaseException:
+            os.remove(path)
+            raise
+
+    def collect(self):
+        """
+        Return the snapshot of every process, or of this process when no
+        METRICS_DIR is set
+        """
+        directory = self.directory()
+        if not directory:
+            return self.registry.snapshot()
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, FILE_PATTERN)):
+            try:
+                with open(path) as source:
+                    snapshot = json.load(source)
+            except (OSError, ValueError):
+                continue
+            if not process_alive(os.path.basename(path).split("-")[1]):
+                snapshot = {
+                    name: metric for name, metric in snapshot.items()
+                    if metric["type"] != "gauge"
+                }
+            snapshots.append(snapshot)
+        return merge(snapshots)
+
+
+def process_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def after_fork():
+    """
+    A forked worker starts from zero rather than counting its parent's
+    samples again
+    """
+    REGISTRY.reset()
+    process_files.after_fork()
+
+
+def serve(request):
+    """
+    Serve the metrics of every worker to scrapers sending METRICS_TOKEN
+    as a bearer token, or to anyone when METRICS_PUBLIC is set
+    """
+    if not getattr(settings, "METRICS_PUBLIC", False):
+        token = getattr(settings, "METRICS_TOKEN", None)
+        presented = request.META.get("HTTP_AUTHORIZATION", "")
+        if not token or not hmac.compare_digest(
+            presented, f"Bearer {token}"
+        ):
+            return HttpResponse(status=403)
+    return HttpResponse(
+        render(process_files.collect()),
+        content_type=CONTENT_TYPE
+    )
+
+
+REGISTRY = Registry()
+process_files = ProcessFiles(REGISTRY)
+os.register_at_fork(after_in_child=after_fork)
+atexit.register(process_files.flush)
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling requests",
+    ["view", "method", "status"]
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_queries",
+    "Database queries run by requests",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time spent running database queries",
+    ["database"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+             0.5, 1.0)
+)
+TOKEN_AUTHENTICATIONS = Counter(
+    "token_authentications_total",
+    "Token authentications by outcome: cached, database or failed",
+    ["outcome"]
+)
+LOGINS = Counter(
+    "logins_total",
+    "Token requests by outcome: success, failure, reused or throttled",
+    ["outcome"]
+)
+LIST_CACHE_REQUESTS = Counter(
+    "list_cache_requests_total",
+    "List cache lookups by collection and result",
+    ["collection", "result"]
+)
+UPLOAD_SIZE = Histogram(
+    "image_upload_bytes",
+    "Size of received recipe images by upload kind",
+    ["kind"],
+    buckets=tuple(2 ** power for power in range(14, 26))
+)
+IMAGE_JOB_DURATION = Histogram(
+    "image_job_duration_seconds",
+    "Time spent on image jobs by outcome: done, failed or skipped",
+    ["outcome"]
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "db_connections_opened_total",
+    "Database connections opened",
+    ["database"]
+)
+DB_HEALTH_CHECKS = Counter(
+    "db_health_checks_total",
+    "Checks of reused database connections by outcome: ok or failed",
+    ["database", "outcome"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Pooled database connections by state: idle or in_use",
+    ["database", "state"]
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    ["database"],
+    buckets=(0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Requests for a pooled database connection that timed out",
+    ["database"]
+)
@@ -0,0 +1,305 @@
+import abc
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import random
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from core import metrics
+
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDERS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+
+# Recorders of the request being handled. Context variables are copied
+# into sync_to_async threads, so queries an async view runs in a thread
+# pool are recorded as well.
+active_recorders = contextvars.ContextVar("active_recorders", default=())
+
+
+def execute_with_recorders(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection, see
+    core.signals.connection_instrumented
+    """
+    for recorder in active_recorders.get():
+        execute = functools.partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    # Kept first, connection.execute_wrapper() pops the last wrapper
+    if execute_with_recorders not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_with_recorders)
+
+
+@contextlib.contextmanager
+def recording(*recorders):
+    """
+    Pass the queries run in this context through recorders
+    """
+    recorders = tuple(recorder for recorder in recorders if recorder)
+    if not recorders:
+        yield
+        return
+    token = active_recorders.set(active_recorders.get() + recorders)
+    try:
+        yield
+    finally:
+        active_recorders.reset(token)
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Reduce a statement to its shape: literals become ``?`` and IN lists
+    of any length the same ``(...)``, so the queries of an N+1 pattern
+    share one fingerprint
+    """
+    sql = WHITESPACE.sub(" ", sql).strip()
+    sql = STRING.sub("?", sql)
+    sql = NUMBER.sub("?", sql)
+    return PLACEHOLDERS.sub("(...)", sql)
+
+
+class AsyncCapableMiddleware(abc.ABC):
+    """
+    Middleware running in the mode of the handler it wraps, so a request
+    to an async view does not hold a thread in between
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets Django await __call__
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.start(request)
+        with recording(*state["recorders"]):
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        with recording(*state["recorders"]):
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
+
+    @abc.abstractmethod
+    def start(self, request):
+        """
+        Return the state of the request, with the query recorders to use
+        """
+
+    @abc.abstractmethod
+    def finish(self, request, response, state):
+        """
+        Return the response once the view handled the request
+        """
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting and timing the queries of one
+    request per fingerprint
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            stats = self.queries.setdefault(fingerprint(sql), [0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+
+    def top(self, limit):
+        """
+        Return the fingerprints that took the most time
+        """
+        ranked = sorted(
+            self.queries.items(),
+            key=lambda item: item[1][1],
+            reverse=True
+        )
+        return [
+            {"sql": sql, "count": count, "duration_ms": round(total * 1000, 2)}
+            for sql, (count, total) in ranked[:limit]
+        ]
+
+    def duplicates(self, threshold):
+        """
+        Return the fingerprints run at least threshold times, the mark of
+        a query issued once per row
+        """
+        return {
+            sql: count for sql, (count, _total) in self.queries.items()
+            if count >= threshold
+        }
+
+
+class RequestInstrumentationMiddleware(AsyncCapableMiddleware):
+    """
+    Time every request and, for a sample of them, count, time and
+    fingerprint their queries.
+
+    Responses get a ``Server-Timing`` header. Requests slower than
+    SLOW_REQUEST_MS are logged as JSON with their top queries, and
+    sampled requests repeating a query DUPLICATE_QUERY_THRESHOLD times
+    are logged as a probable N+1. Unsampled requests only pay for two
+    clock reads.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, "REQUEST_SAMPLE_RATE", 0.05)
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_MS", 500)
+        self.top_queries = getattr(settings, "SLOW_REQUEST_TOP_QUERIES", 5)
+        self.duplicate_threshold = getattr(
+            settings, "DUPLICATE_QUERY_THRESHOLD", 5
+        )
+        self.server_timing = getattr(settings, "SERVER_TIMING", True)
+
+    def start(self, request):
+        recorder = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            recorder = QueryRecorder()
+        return {"recorders": [recorder], "started": time.perf_counter()}
+
+    def finish(self, request, response, state):
+        recorder = state["recorders"][0]
+        duration_ms = (time.perf_counter() - state["started"]) * 1000
+
+        if self.server_timing:
+            self.add_server_timing(response, duration_ms, recorder)
+        if duration_ms >= self.slow_ms:
+            self.log_slow_request(request, response, duration_ms, recorder)
+        if recorder is not None:
+            duplicates = recorder.duplicates(self.duplicate_threshold)
+            if duplicates:
+                logger.warning("duplicate_queries %s", json.dumps({
+                    "method": request.method,
+                    "path": request.path,
+                    "view": self.get_view_name(request),
+                    "queries": duplicates,
+                }))
+        return response
+
+    def add_server_timing(self, response, duration_ms, recorder):
+        metrics = [f"app;dur={duration_ms:.1f}"]
+        if recorder is not None:
+            metrics.append(
+                f'db;dur={recorder.duration * 1000:.1f};'
+                f'desc="{recorder.count} queries"'
+            )
+        if response.has_header("Server-Timing"):
+            metrics.insert(0, response["Server-Timing"])
+        response["Server-Timing"] = ", ".join(metrics)
+
+    def log_slow_request(self, request, response, duration_ms, recorder):
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "view": self.get_view_name(request),
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 2),
+            "sampled": recorder is not None,
+        }
+        if recorder is not None:
+            entry.update({
+                "queries": recorder.count,
+                "db_ms": round(recorder.duration * 1000, 2),
+                "top_queries": recorder.top(self.top_queries),
+            })
+        logger.warning("slow_request %s", json.dumps(entry))
+
+    def get_view_name(self, request):
+        match = getattr(request, "resolver_match", None)
+        return match.view_name if match else None
+
+
+class QueryMetrics:
+    """
+    Database execute wrapper counting the queries of a request and
+    observing their duration
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            metrics.DB_QUERY_DURATION.observe(
+                time.perf_counter() - started,
+                database=context["connection"].alias
+            )
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Record the duration and queries of every request per view, see
+    core.metrics. Views are labelled by class and viewset action so the
+    number of series stays bounded whatever the URLs requested.
+    """
+    METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+    def start(self, request):
+        return {"recorders": [QueryMetrics()], "started": time.perf_counter()}
+
+    def finish(self, request, response, state):
+        recorder = state["recorders"][0]
+        duration = time.perf_counter() - state["started"]
+        view = self.get_view_label(request)
+        metrics.REQUEST_DURATION.observe(
+            duration,
+            view=view,
+            method=request.method if request.method in self.METHODS
+            else "other",
+            status=f"{response.status_code // 100}xx"
+        )
+        metrics.REQUEST_QUERIES.observe(recorder.count, view=view)
+        metrics.process_files.flush(force=False)
+        return response
+
+    def get_view_label(self, request):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "unmatched"
+        func = match.func
+        cls = getattr(func, "cls", None)
+        if cls is None:
+            return f"{func.__module__}.{func.__name__}"
+        actions = getattr(func, "actions", None)
+        if actions:
+            action = actions.get(request.method.lower())
+            if action:
+                return f"{cls.__name__}.{action}"
+        return cls.__name__
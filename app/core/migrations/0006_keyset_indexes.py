@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrentlyOnPostgres(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name', '-id'], name='core_ingr_user_name_id_idx'),
+        ),
+        core.operations.AddIndexConcurrentlyOnPostgres(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='core_recipe_user_id_idx'),
+        ),
+        core.operations.AddIndexConcurrentlyOnPostgres(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name', '-id'], name='core_tag_user_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_keyset_indexes'),
+    ]
+
+    # The auto-created through tables already have a unique
+    # (recipe_id, <related>_id) index for the recipe side of the EXISTS
+    # probes; these cover lookups driven from the tag/ingredient side.
+    operations = [
+        core.operations.CreateIndexConcurrentlyOnPostgres(
+            table='core_recipe_tags',
+            columns=['tag_id', 'recipe_id'],
+            name='core_recipe_tags_tag_recipe_idx',
+        ),
+        core.operations.CreateIndexConcurrentlyOnPostgres(
+            table='core_recipe_ingredients',
+            columns=['ingredient_id', 'recipe_id'],
+            name='core_recipe_ingr_ingr_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+from core.search import update_search_vector
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_vector(apps, schema_editor):
+    """
+    Fill the search vector in id ranges, every batch commits on its own
+    so rows are only locked for the duration of one small UPDATE
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Recipe = apps.get_model('core', 'Recipe')
+    recipes = Recipe.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        ids = list(
+            recipes.filter(id__gt=last_id, search_vector__isnull=True)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        update_search_vector(recipes.filter(id__in=ids))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_search_vector,
+            migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
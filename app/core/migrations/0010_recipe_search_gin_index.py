@@ -0,0 +1,20 @@
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+import core.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_backfill_recipe_search_vector'),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrentlyOnPostgres(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search_gin_idx'),
+        ),
+    ]
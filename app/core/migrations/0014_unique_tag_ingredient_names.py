@@ -0,0 +1,62 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+import core.operations
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    Fold tags and ingredients sharing a name for the same user into the
+    oldest one, moving their recipes over, so the constraint can be built
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name, column in (
+        ('Tag', 'tags', 'tag_id'),
+        ('Ingredient', 'ingredients', 'ingredient_id'),
+    ):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep=Min('id'),
+            count=Count('id')
+        ).filter(count__gt=1)
+        for group in duplicates.iterator():
+            others = list(model.objects.filter(
+                user_id=group['user_id'],
+                name=group['name']
+            ).exclude(pk=group['keep']).values_list('id', flat=True))
+            recipe_ids = set(through.objects.filter(**{
+                f'{column}__in': others
+            }).exclude(recipe_id__in=through.objects.filter(**{
+                column: group['keep']
+            }).values('recipe_id')).values_list('recipe_id', flat=True))
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{column: group['keep']})
+                for recipe_id in recipe_ids
+            ])
+            model.objects.filter(pk__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names,
+            migrations.RunPython.noop,
+            atomic=True,
+        ),
+        core.operations.AddUniqueConstraintConcurrently(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_user_name_uniq'),
+        ),
+        core.operations.AddUniqueConstraintConcurrently(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_user_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+import core.operations
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_recipe_counts(apps, schema_editor):
+    """
+    Count the recipes of every tag and ingredient in id ranges, every
+    batch commits on its own
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name, column in (
+        ('Tag', 'tags', 'tag_id'),
+        ('Ingredient', 'ingredients', 'ingredient_id'),
+    ):
+        model = apps.get_model('core', model_name)
+        rows = model.objects.using(schema_editor.connection.alias)
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        counted = Coalesce(
+            Subquery(
+                through.objects.filter(**{column: OuterRef('pk')})
+                .order_by()
+                .values(column)
+                .annotate(count=Count('*'))
+                .values('count')
+            ),
+            Value(0)
+        )
+        last_id = 0
+        while True:
+            ids = list(
+                rows.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            rows.filter(id__in=ids).update(recipe_count=counted)
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_unique_tag_ingredient_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            backfill_recipe_counts,
+            migrations.RunPython.noop,
+            elidable=True,
+        ),
+        core.operations.AddIndexConcurrentlyOnPostgres(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', '-id'], name='core_ingr_user_count_id_idx'),
+        ),
+        core.operations.AddIndexConcurrentlyOnPostgres(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', '-id'], name='core_tag_user_count_id_idx'),
+        ),
+    ]
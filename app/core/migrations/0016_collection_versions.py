@@ -0,0 +1,69 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+BATCH_SIZE = 1000
+COLLECTIONS = ('recipes', 'tags', 'ingredients')
+
+
+def create_collection_versions(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    CollectionVersion = apps.get_model('core', 'CollectionVersion')
+    alias = schema_editor.connection.alias
+    user_ids = User.objects.using(alias).values_list('id', flat=True)
+    CollectionVersion.objects.using(alias).bulk_create(
+        (
+            CollectionVersion(user_id=user_id, collection=collection)
+            for user_id in user_ids.iterator()
+            for collection in COLLECTIONS
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=32)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.user')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='collectionversion',
+            constraint=models.UniqueConstraint(fields=('user', 'collection'), name='core_collection_version_uniq'),
+        ),
+        migrations.RunPython(
+            create_collection_versions,
+            migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:28
+
+import itertools
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+BATCH_SIZE = 1000
+COLLECTIONS = (
+    ('Tag', 'tags'),
+    ('Ingredient', 'ingredients'),
+    ('Recipe', 'recipes'),
+)
+
+
+def bulk_create_batches(queryset, objs):
+    """
+    bulk_create reads its whole input, feed it one batch at a time
+    """
+    objs = iter(objs)
+    while True:
+        batch = list(itertools.islice(objs, BATCH_SIZE))
+        if not batch:
+            break
+        queryset.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_change_log(apps, schema_editor):
+    """
+    Log every existing object once, so a sync from cursor 0 returns the
+    full data of a user
+    """
+    alias = schema_editor.connection.alias
+    User = apps.get_model('core', 'User')
+    CollectionVersion = apps.get_model('core', 'CollectionVersion')
+    Change = apps.get_model('core', 'Change')
+    bulk_create_batches(CollectionVersion.objects.using(alias), (
+        CollectionVersion(user_id=user_id, collection='changes')
+        for user_id in User.objects.using(alias).values_list(
+            'id', flat=True
+        ).iterator()
+    ))
+    for model_name, collection in COLLECTIONS:
+        model = apps.get_model('core', model_name)
+        bulk_create_batches(Change.objects.using(alias), (
+            Change(user_id=user_id, collection=collection, object_id=pk)
+            for pk, user_id in model.objects.using(alias).order_by(
+                'id'
+            ).values_list('id', 'user_id').iterator()
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_collection_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('collection', models.CharField(max_length=32)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.user')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'id'], name='core_change_user_id_idx'),
+        ),
+        migrations.RunPython(
+            backfill_change_log,
+            migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
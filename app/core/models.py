@@ -1,12 +1,17 @@
 import uuid
 import os
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 from django.conf import settings
+from django.utils import timezone
+
+from core.storage import recipe_image_storage
 
 
 def recipe_image_file_path(instance, filename):
@@ -18,6 +23,15 @@ def recipe_image_file_path(instance, filename):
     return os.path.join("uploads/recipe/", filename)
 
 
+def recipe_image_variant_file_path(instance, filename):
+    """
+    Generate file path for a processed recipe image variant
+    """
+    ext = filename.split(".")[-1]
+    filename = f"{uuid.uuid4()}.{ext}"
+    return os.path.join("uploads/recipe/variants/", filename)
+
+
 class UserManager(BaseUserManager):
 
     def create_user(self, email, password=None, **extra_fields):
@@ -70,6 +84,27 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Maintained by core.signals, fixed by reconcile_recipe_counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-name", "-id"],
+                name="core_tag_user_name_id_idx"
+            ),
+            models.Index(
+                fields=["user", "-recipe_count", "-id"],
+                name="core_tag_user_count_id_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="core_tag_user_name_uniq"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -84,6 +119,27 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Maintained by core.signals, fixed by reconcile_recipe_counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-name", "-id"],
+                name="core_ingr_user_name_id_idx"
+            ),
+            models.Index(
+                fields=["user", "-recipe_count", "-id"],
+                name="core_ingr_user_count_id_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="core_ingredient_user_name_uniq"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -103,7 +159,177 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField("Ingredient")
     tags = models.ManyToManyField("Tag")
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=recipe_image_storage
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-id"],
+                name="core_recipe_user_id_idx"
+            ),
+            GinIndex(
+                fields=["search_vector"],
+                name="core_recipe_search_gin_idx"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "image" in field_names:
+            # Remember the stored image to maintain its reference count
+            instance._loaded_image = values[field_names.index("image")] or ""
+        return instance
 
     def __str__(self):
         return self.title
+
+
+class RecipeImageVariant(models.Model):
+    """
+    Resized, metadata free rendition of a recipe image
+    """
+    recipe = models.ForeignKey(
+        "Recipe",
+        on_delete=models.CASCADE,
+        related_name="image_variants"
+    )
+    name = models.CharField(max_length=32)
+    format = models.CharField(max_length=8)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    image = models.ImageField(upload_to=recipe_image_variant_file_path)
+
+    class Meta:
+        unique_together = [("recipe", "name", "format")]
+
+    def __str__(self):
+        return f"{self.recipe_id} {self.name}.{self.format}"
+
+
+class ImageJob(models.Model):
+    """
+    Background processing of an uploaded recipe image
+    """
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (PROCESSING, "Processing"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    recipe = models.ForeignKey(
+        "Recipe",
+        on_delete=models.CASCADE,
+        related_name="image_jobs"
+    )
+    source = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.recipe_id} {self.status}"
+
+
+class ImageUpload(models.Model):
+    """
+    Resumable recipe image upload sent in several chunks
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    recipe = models.ForeignKey(
+        "Recipe",
+        on_delete=models.CASCADE,
+        related_name="image_uploads"
+    )
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file_name} {self.offset}/{self.size}"
+
+
+class ImageBlob(models.Model):
+    """
+    Reference count of a content addressed recipe image file
+    """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class CollectionVersion(models.Model):
+    """
+    Version of the recipes, tags or ingredients of a user, bumped by every
+    write to the collection. Lists derive their ETag and cache keys from
+    it.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    collection = models.CharField(max_length=32)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "collection"],
+                name="core_collection_version_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.collection} v{self.version}"
+
+
+class Change(models.Model):
+    """
+    Entry of a user's change log, written for every recipe, tag or
+    ingredient created, updated or deleted. Deletes are kept as
+    tombstones and the id is the cursor of the sync endpoint.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    collection = models.CharField(max_length=32)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "id"],
+                name="core_change_user_id_idx"
+            ),
+        ]
+
+    def __str__(self):
+        action = "deleted" if self.deleted else "updated"
+        return f"{self.collection} {self.object_id} {action}"
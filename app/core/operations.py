@@ -0,0 +1,133 @@
+from django.contrib.postgres.indexes import PostgresIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import NotSupportedError
+from django.db.migrations.operations import AddConstraint, AddIndex
+from django.db.migrations.operations.base import Operation
+
+
+class AddUniqueConstraintConcurrently(AddConstraint):
+    """
+    Add a unique constraint without blocking writes on PostgreSQL, the
+    unique index is built concurrently then attached to the table as the
+    constraint. Other backends add the constraint as usual.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        connection = schema_editor.connection
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if (
+            connection.vendor != "postgresql"
+            or not self.allow_migrate_model(connection.alias, model)
+        ):
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        if connection.in_atomic_block:
+            raise NotSupportedError(
+                "The AddUniqueConstraintConcurrently operation cannot be "
+                "executed inside a transaction (set atomic = False on the "
+                "migration)."
+            )
+
+        quote_name = schema_editor.quote_name
+        name = quote_name(self.constraint.name)
+        table = quote_name(model._meta.db_table)
+        columns = ", ".join(
+            quote_name(model._meta.get_field(field).column)
+            for field in self.constraint.fields
+        )
+        schema_editor.execute(
+            f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})"
+        )
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX "
+            f"{name}"
+        )
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    Build an index with CREATE INDEX CONCURRENTLY on PostgreSQL and with
+    a plain CREATE INDEX on other backends, which skip the index types of
+    django.contrib.postgres they cannot build. The migration state is
+    updated on every backend.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        if not isinstance(self.index, PostgresIndex):
+            return AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        if not isinstance(self.index, PostgresIndex):
+            return AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+
+class CreateIndexConcurrentlyOnPostgres(Operation):
+    """
+    Index columns of a table the migration state has no model for, such as
+    an auto-created through table, concurrently on PostgreSQL and with a
+    plain CREATE INDEX on other backends
+    """
+    reversible = True
+
+    def __init__(self, table, columns, name):
+        self.table = table
+        self.columns = columns
+        self.name = name
+
+    def deconstruct(self):
+        return (
+            self.__class__.__name__,
+            [],
+            {"table": self.table, "columns": self.columns, "name": self.name}
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def concurrently(self, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return ""
+        if connection.in_atomic_block:
+            raise NotSupportedError(
+                "The CreateIndexConcurrentlyOnPostgres operation cannot be "
+                "executed inside a transaction (set atomic = False on the "
+                "migration)."
+            )
+        return " CONCURRENTLY"
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        quote_name = schema_editor.quote_name
+        columns = ", ".join(quote_name(column) for column in self.columns)
+        schema_editor.execute(
+            f"CREATE INDEX{self.concurrently(schema_editor)} "
+            f"{quote_name(self.name)} ON {quote_name(self.table)} "
+            f"({columns})"
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        schema_editor.execute(
+            f"DROP INDEX{self.concurrently(schema_editor)} "
+            f"{schema_editor.quote_name(self.name)}"
+        )
+
+    def describe(self):
+        return f"Create index {self.name} on {self.table}"
@@ -0,0 +1,42 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import connections
+from django.db.models import OuterRef, Subquery
+
+
+SEARCH_CONFIG = "english"
+
+
+def related_names(model):
+    """
+    Return a subquery joining the names of ``model`` rows linked to
+    the outer recipe
+    """
+    return Subquery(
+        model.objects.filter(recipe=OuterRef("pk"))
+        .values("recipe")
+        .annotate(names=StringAgg("name", " "))
+        .values("names")
+    )
+
+
+def update_search_vector(queryset):
+    """
+    Recompute the search vector of the recipes in queryset. Titles weigh
+    more than tag names, which weigh more than ingredient names.
+    """
+    if connections[queryset.db].vendor != "postgresql":
+        return 0
+
+    meta = queryset.model._meta
+    tag = meta.get_field("tags").related_model
+    ingredient = meta.get_field("ingredients").related_model
+    return queryset.update(
+        search_vector=(
+            SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector(related_names(tag), weight="B",
+                           config=SEARCH_CONFIG)
+            + SearchVector(related_names(ingredient), weight="C",
+                           config=SEARCH_CONFIG)
+        )
+    )
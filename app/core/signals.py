@@ -0,0 +1,349 @@
+import threading
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core import changes
+from core import counters
+from core import middleware
+from core import models
+from core import versions
+from core.authentication import token_cache
+from core import storage
+from core.search import update_search_vector
+
+
+# Ids of the users this thread is deleting, see user_deleting()
+deleting = threading.local()
+
+
+def logged(user_id):
+    """
+    Whether writes to the objects of a user are versioned and logged,
+    not while the user is deleted with them
+    """
+    return user_id not in getattr(deleting, "user_ids", ())
+
+
+@receiver(post_save, sender=models.Recipe)
+def recipe_saved(sender, instance, created, update_fields, **kwargs):
+    """
+    Refresh the search vector when the recipe title may have changed
+    """
+    if created or update_fields is None or "title" in update_fields:
+        update_search_vector(models.Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=models.Recipe.tags.through)
+@receiver(m2m_changed, sender=models.Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """
+    Refresh the search vector of recipes whose tags or ingredients changed
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            update_search_vector(
+                models.Recipe.objects.filter(pk=instance.pk)
+            )
+        return
+
+    if action == "pre_clear":
+        instance._search_recipe_ids = list(
+            instance.recipe_set.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        recipe_ids = instance.__dict__.pop("_search_recipe_ids", [])
+        update_search_vector(models.Recipe.objects.filter(pk__in=recipe_ids))
+    elif action in ("post_add", "post_remove"):
+        update_search_vector(models.Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(m2m_changed, sender=models.Recipe.tags.through)
+@receiver(m2m_changed, sender=models.Recipe.ingredients.through)
+def recipe_counts_changed(sender, instance, action, reverse, model, pk_set,
+                          **kwargs):
+    """
+    Keep the recipe_count of tags and ingredients in step with the links
+    written, removals only count links that existed
+    """
+    counted_model = type(instance) if reverse else model
+    through, column = counters.RELATIONS[counted_model]
+    stash = f"_recipe_counts_{column}"
+    if reverse:
+        links = through.objects.filter(**{column: instance.pk})
+        column = "recipe_id"
+    else:
+        links = through.objects.filter(recipe_id=instance.pk)
+
+    if action in ("pre_remove", "pre_clear"):
+        if action == "pre_remove":
+            links = links.filter(**{f"{column}__in": pk_set})
+        instance.__dict__[stash] = list(links.values_list(column, flat=True))
+        return
+    if action == "post_add":
+        changed, delta = pk_set, 1
+    elif action in ("post_remove", "post_clear"):
+        changed, delta = instance.__dict__.pop(stash, []), -1
+    else:
+        return
+    if not changed:
+        return
+    if reverse:
+        counters.add_recipes(
+            counted_model.objects.filter(pk=instance.pk),
+            delta * len(changed)
+        )
+    else:
+        counters.add_recipes(model.objects.filter(pk__in=changed), delta)
+
+
+@receiver(pre_delete, sender=models.Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """
+    The through rows of a deleted recipe go without an m2m_changed signal
+    """
+    instance._relation_ids = {}
+    for model, (through, column) in counters.RELATIONS.items():
+        pks = list(
+            through.objects.filter(recipe_id=instance.pk)
+            .values_list(column, flat=True)
+        )
+        if pks:
+            counters.add_recipes(model.objects.filter(pk__in=pks), -1)
+        instance._relation_ids[changes.COLLECTIONS[model]] = pks
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(post_save, sender=models.Ingredient)
+def recipe_relation_renamed(sender, instance, created, **kwargs):
+    """
+    Refresh the search vector of recipes linked to a renamed tag or
+    ingredient
+    """
+    if not created:
+        update_search_vector(instance.recipe_set.all())
+
+
+@receiver(pre_delete, sender=models.Tag)
+@receiver(pre_delete, sender=models.Ingredient)
+def recipe_relation_deleting(sender, instance, **kwargs):
+    instance._recipe_ids = list(
+        instance.recipe_set.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=models.Tag)
+@receiver(post_delete, sender=models.Ingredient)
+def recipe_relation_deleted(sender, instance, **kwargs):
+    """
+    Drop the name of a deleted tag or ingredient from its recipes, the
+    through rows are removed without an m2m_changed signal
+    """
+    recipe_ids = getattr(instance, "_recipe_ids", [])
+    update_search_vector(models.Recipe.objects.filter(pk__in=recipe_ids))
+
+
+@receiver(post_save, sender=models.Recipe)
+def recipe_written(sender, instance, **kwargs):
+    versions.bump(instance.user_id, "recipes")
+    changes.record(instance.user_id, {"recipes": [instance.pk]})
+
+
+@receiver(post_delete, sender=models.Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    """
+    Deleting a recipe also changes the recipe counts of its relations
+    """
+    if not logged(instance.user_id):
+        return
+    versions.bump(instance.user_id)
+    changes.record(
+        instance.user_id,
+        getattr(instance, "_relation_ids", None),
+        {"recipes": [instance.pk]}
+    )
+
+
+@receiver(m2m_changed, sender=models.Recipe.tags.through)
+@receiver(m2m_changed, sender=models.Recipe.ingredients.through)
+def recipe_relations_versioned(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    """
+    Touch the recipes whose relations changed, bump both collections and
+    log the recipes and the tags or ingredients whose count changed
+    """
+    collection = (
+        "tags" if sender is models.Recipe.tags.through else "ingredients"
+    )
+    stash = f"_cleared_{collection}"
+    if action == "pre_clear":
+        linked = instance.recipe_set if reverse else getattr(
+            instance, collection
+        )
+        instance.__dict__[stash] = list(linked.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop(stash, [])
+    elif action not in ("post_add", "post_remove"):
+        return
+    if not pk_set:
+        return
+
+    if reverse:
+        recipe_ids, related_ids = list(pk_set), [instance.pk]
+    else:
+        recipe_ids, related_ids = [instance.pk], list(pk_set)
+    models.Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    versions.bump(instance.user_id, "recipes", collection)
+    changes.record(
+        instance.user_id,
+        {"recipes": recipe_ids, collection: related_ids}
+    )
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(post_delete, sender=models.Tag)
+def tag_written(sender, instance, **kwargs):
+    if logged(instance.user_id):
+        versions.bump(instance.user_id, "tags")
+
+
+@receiver(post_save, sender=models.Ingredient)
+@receiver(post_delete, sender=models.Ingredient)
+def ingredient_written(sender, instance, **kwargs):
+    if logged(instance.user_id):
+        versions.bump(instance.user_id, "ingredients")
+
+
+@receiver(post_save, sender=models.Tag)
+@receiver(post_save, sender=models.Ingredient)
+def recipe_relation_logged(sender, instance, **kwargs):
+    changes.record(
+        instance.user_id,
+        {changes.COLLECTIONS[sender]: [instance.pk]}
+    )
+
+
+@receiver(post_delete, sender=models.Tag)
+@receiver(post_delete, sender=models.Ingredient)
+def recipe_relation_removed(sender, instance, **kwargs):
+    """
+    Recipes lose the deleted tag or ingredient without a signal
+    """
+    if not logged(instance.user_id):
+        return
+    versions.bump(instance.user_id, "recipes")
+    changes.record(
+        instance.user_id,
+        {"recipes": getattr(instance, "_recipe_ids", [])},
+        {changes.COLLECTIONS[sender]: [instance.pk]}
+    )
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=models.User)
+@receiver(post_delete, sender=models.User)
+def user_changed(sender, instance, **kwargs):
+    """
+    Drop cached tokens of a user that was updated, deactivated or deleted
+    through UserProfileView, the admin or the shell
+    """
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(pre_delete, sender=models.User)
+def user_deleting(sender, instance, **kwargs):
+    """
+    The recipes, tags and ingredients of a user are deleted with the user,
+    and so are its change log and versions. Logging them would insert
+    rows pointing at the user being deleted. The collector sends this
+    after the pre_delete of those objects and before any post_delete.
+    """
+    if not hasattr(deleting, "user_ids"):
+        deleting.user_ids = set()
+    deleting.user_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=models.User)
+def user_deleted(sender, instance, **kwargs):
+    deleting.user_ids.discard(instance.pk)
+
+
+@receiver(post_save, sender=models.User)
+def user_created(sender, instance, created, **kwargs):
+    """
+    Start the collection versions of new users, writes only bump
+    existing versions
+    """
+    if created:
+        versions.create(instance.pk)
+
+
+@receiver(pre_save, sender=models.Recipe)
+def recipe_image_loading(sender, instance, update_fields, **kwargs):
+    """
+    Look up the stored image of recipes not loaded with it
+    """
+    if hasattr(instance, "_loaded_image"):
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    instance._loaded_image = (
+        models.Recipe.objects.filter(pk=instance.pk)
+        .values_list("image", flat=True).first()
+        if instance.pk else None
+    ) or ""
+
+
+@receiver(post_save, sender=models.Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    """
+    Move the reference count from the replaced image to the new one
+    """
+    previous = getattr(instance, "_loaded_image", None)
+    current = instance.image.name or ""
+    if previous is None or previous == current:
+        return
+    storage.retain(current)
+    storage.release(previous)
+    instance._loaded_image = current
+
+
+@receiver(post_delete, sender=models.Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    storage.release(instance.image.name)
+
+
+@receiver(post_delete, sender=models.RecipeImageVariant)
+def recipe_image_variant_deleted(sender, instance, **kwargs):
+    """
+    Variants belong to a single recipe, remove their file with the row
+    """
+    name = instance.image.name
+    transaction.on_commit(lambda: instance.image.storage.delete(name))
+
+
+@receiver(connection_created)
+def connection_instrumented(sender, connection, **kwargs):
+    """
+    Let the request middleware record the queries of every connection,
+    including those opened by the thread pool of async views
+    """
+    middleware.install(connection)
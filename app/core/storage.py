@@ -0,0 +1,120 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files after the SHA-256 of their content,
+    sharded in two levels of subdirectories. Identical uploads share one
+    file and a name always refers to the same bytes, so it can be served
+    with immutable cache headers.
+    """
+    prefix = "uploads/recipe/sha256"
+
+    def hashed_name(self, sha256, ext):
+        return os.path.join(
+            self.prefix, sha256[:2], sha256[2:4], f"{sha256}.{ext.lower()}"
+        )
+
+    def is_hashed(self, name):
+        return bool(name) and name.startswith(self.prefix + "/")
+
+    def temporary_path(self):
+        path = self.path(os.path.join(self.prefix, "tmp", uuid.uuid4().hex))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def place(self, path, sha256, ext):
+        """
+        Move a fully written local file to its content address. The file
+        is renamed rather than copied, replacing an identical copy if one
+        is already stored.
+        """
+        name = self.hashed_name(sha256, ext)
+        destination = self.path(name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        os.replace(path, destination)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lstrip(".") or "bin"
+        path = self.temporary_path()
+        sha256 = hashlib.sha256()
+        with open(path, "wb") as destination:
+            for chunk in content.chunks():
+                sha256.update(chunk)
+                destination.write(chunk)
+        return self.place(path, sha256.hexdigest(), ext)
+
+
+recipe_image_storage = ContentAddressedStorage()
+
+
+def retain(name):
+    """
+    Count one more recipe referencing a stored image
+    """
+    from core.models import ImageBlob
+
+    if not recipe_image_storage.is_hashed(name):
+        return
+    with transaction.atomic():
+        ImageBlob.objects.get_or_create(name=name)
+        ImageBlob.objects.filter(name=name).update(
+            ref_count=F("ref_count") + 1
+        )
+
+
+def release(name):
+    """
+    Count one less reference and collect the file once it is unused
+    """
+    from core.models import ImageBlob
+
+    if not recipe_image_storage.is_hashed(name):
+        return
+    ImageBlob.objects.filter(name=name, ref_count__gt=0).update(
+        ref_count=F("ref_count") - 1
+    )
+    transaction.on_commit(lambda: collect(name))
+
+
+def collect(name, grace=None):
+    """
+    Delete an unreferenced image. Files written less than ``grace``
+    seconds ago are kept, an upload of the same content may be about to
+    reference them; collect_images sweeps them later.
+    """
+    from core.models import ImageBlob
+
+    if grace is None:
+        grace = getattr(settings, "RECIPE_IMAGE_GC_GRACE", 3600)
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(
+            name=name, ref_count=0
+        ).first()
+        if blob is None:
+            return False
+        try:
+            modified = os.path.getmtime(recipe_image_storage.path(name))
+        except FileNotFoundError:
+            modified = 0
+        if modified > time.time() - grace:
+            return False
+        recipe_image_storage.delete(name)
+        blob.delete()
+    return True
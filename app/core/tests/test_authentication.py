@@ -0,0 +1,117 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import TokenCache, token_cache
+
+
+PROFILE_URL = reverse("user:profile")
+
+
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="nazrul@localmachine.com",
+            password="test12345",
+            name="Test User"
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_cache_evicts_least_recently_used(self):
+        """
+        Test the cache stays within its size
+        """
+        cache = TokenCache(maxsize=2, ttl=60)
+        cache.set("a", self.user, self.token)
+        cache.set("b", self.user, self.token)
+        cache.get("a")
+        cache.set("c", self.user, self.token)
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_cache_entries_expire(self):
+        """
+        Test entries are not served past their ttl
+        """
+        cache = TokenCache(maxsize=2, ttl=0)
+        cache.set("a", self.user, self.token)
+
+        self.assertIsNone(cache.get("a"))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="nazrul@localmachine.com",
+            password="test12345",
+            name="Test User"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_repeated_requests_skip_token_query(self):
+        """
+        Test a known token authenticates without querying
+        """
+        self.client.get(PROFILE_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+        self.assertEqual(token_cache.stats()["hits"], 1)
+
+    def test_deleted_token_rejected(self):
+        """
+        Test a deleted token is no longer accepted
+        """
+        self.client.get(PROFILE_URL)
+        self.token.delete()
+
+        res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """
+        Test a deactivated user is no longer authenticated
+        """
+        self.client.get(PROFILE_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_visible(self):
+        """
+        Test profile changes are served to the next request
+        """
+        self.client.get(PROFILE_URL)
+        self.client.patch(PROFILE_URL, {"name": "New Name"})
+
+        res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.data["name"], "New Name")
+
+    def test_deleted_user_rejected(self):
+        """
+        Test deleting the profile revokes the cached token
+        """
+        self.client.get(PROFILE_URL)
+        self.client.delete(PROFILE_URL)
+
+        res = self.client.get(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,74 @@
+import asyncio
+
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core import benchmarks
+from core import models
+
+
+class BenchmarkTests(TestCase):
+    """
+    Test the dataset and statistics of the benchmark_api command
+    """
+
+    def test_seed(self):
+        """
+        Test seeding links every recipe and keeps the counters right
+        """
+        created = benchmarks.seed(
+            users=2, recipes=3, tags=2, ingredients=4, links=2
+        )
+
+        self.assertEqual(created, 2)
+        self.assertEqual(Token.objects.count(), 2)
+        self.assertEqual(models.Recipe.objects.count(), 6)
+        self.assertEqual(models.Ingredient.objects.count(), 8)
+        self.assertEqual(
+            models.Tag.objects.aggregate(total=Sum("recipe_count"))["total"],
+            12
+        )
+        for recipe in models.Recipe.objects.all():
+            self.assertEqual(
+                {tag.user_id for tag in recipe.tags.all()}, {recipe.user_id}
+            )
+        self.assertEqual(
+            models.Change.objects.filter(collection="recipes").count(), 6
+        )
+
+        self.assertEqual(benchmarks.seed(users=2), 0)
+
+    def test_summarize(self):
+        """
+        Test percentiles use the nearest rank and errors are counted
+        """
+        samples = [(200, number / 1000, 2) for number in range(1, 101)]
+        samples[0] = (500, 0.001, None)
+
+        summary = benchmarks.summarize(samples, elapsed=2)
+
+        self.assertEqual(summary["requests_per_second"], 50)
+        self.assertEqual(summary["errors"], 1)
+        self.assertAlmostEqual(summary["p50_ms"], 50)
+        self.assertAlmostEqual(summary["p99_ms"], 99)
+        self.assertEqual(summary["queries_per_request"], 2)
+
+    @override_settings(ALLOWED_HOSTS=["127.0.0.1"])
+    def test_slow_request(self):
+        """
+        Test a body sent in pieces is served by a pooled WSGI server
+        """
+        with benchmarks.LocalServer(threads=2) as base_url:
+            status, seconds = asyncio.run(benchmarks.slow_request(
+                base_url,
+                reverse("user:token"),
+                {"Content-Type": "application/json"},
+                b'{"email": "nazrul@localmachine.com"}',
+                duration=0.05,
+                pieces=5
+            ))
+
+        self.assertEqual(status, 400)
+        self.assertGreaterEqual(seconds, 0.05)
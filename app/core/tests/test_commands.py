@@ -1,7 +1,17 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Change, Ingredient, Recipe, Tag
 
 
 class CommandTests(TestCase):
@@ -24,3 +34,139 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@londonappdev.com",
+            "testpass"
+        )
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+
+    def write_file(self, suffix, content):
+        source = tempfile.NamedTemporaryFile(
+            "w", suffix=suffix, delete=False, encoding="utf-8"
+        )
+        with source:
+            source.write(content)
+        self.addCleanup(os.remove, source.name)
+        return source.name
+
+    def call(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_recipes", *args, stdout=stdout, stderr=stderr, **options
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_ndjson(self):
+        """
+        Test importing recipes reuses tags by name and creates the others
+        """
+        rows = [
+            {"user": self.user.email, "title": "Curry", "time_minutes": 30,
+             "price": "7.50", "tags": ["Vegan", "Dinner"],
+             "ingredients": ["Rice"]},
+            {"user": self.user.email, "title": "Toast", "time_minutes": 5,
+             "price": 1, "tags": ["Dinner"]},
+        ]
+        path = self.write_file(
+            ".ndjson", "".join(json.dumps(row) + "\n" for row in rows)
+        )
+
+        stdout, stderr = self.call(path, batch_size=1)
+
+        self.assertIn("Imported 2 recipes", stdout)
+        curry = Recipe.objects.get(title="Curry")
+        self.assertEqual(curry.price, Decimal("7.50"))
+        self.assertCountEqual(
+            curry.tags.values_list("name", flat=True), ["Vegan", "Dinner"]
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name="Dinner").recipe_count, 2
+        )
+        self.assertEqual(
+            list(Ingredient.objects.values_list("name", flat=True)), ["Rice"]
+        )
+        self.assertEqual(
+            set(Change.objects.filter(collection="recipes").values_list(
+                "object_id", flat=True
+            )),
+            set(Recipe.objects.values_list("id", flat=True))
+        )
+
+    def test_import_csv_default_user(self):
+        """
+        Test importing CSV rows owned by the user given on the command line
+        """
+        path = self.write_file(
+            ".csv",
+            "title,time_minutes,price,link,tags,ingredients\n"
+            "Salad,10,4.00,,Vegan|Lunch,Lettuce|Tomato\n"
+        )
+
+        self.call(path, user=self.user.email)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.link, "")
+        self.assertCountEqual(
+            recipe.ingredients.values_list("name", flat=True),
+            ["Lettuce", "Tomato"]
+        )
+
+    def test_import_skips_invalid_rows(self):
+        """
+        Test invalid rows are reported and the others imported
+        """
+        path = self.write_file(".ndjson", "\n".join([
+            "not json",
+            json.dumps({"user": self.user.email, "title": "",
+                        "time_minutes": 1, "price": 1}),
+            json.dumps({"user": "nobody@example.com", "title": "Pie",
+                        "time_minutes": 1, "price": 1}),
+            json.dumps({"user": 42, "title": "Pie",
+                        "time_minutes": 1, "price": 1}),
+            json.dumps({"user": self.user.email, "title": "Pie",
+                        "time_minutes": "soon", "price": 1}),
+            json.dumps({"user": self.user.email, "title": "Pie",
+                        "time_minutes": 1, "price": 1}),
+        ]))
+
+        stdout, stderr = self.call(path)
+
+        self.assertIn("skipped 5", stdout)
+        self.assertEqual(stderr.count("Skipped"), 5)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_import_queries_per_batch(self):
+        """
+        Test a batch costs the same number of queries whatever its size
+        """
+        def import_rows(count):
+            path = self.write_file(".ndjson", "".join(
+                json.dumps({"user": self.user.email, "title": f"R{i}",
+                            "time_minutes": 1, "price": 1,
+                            "tags": ["Vegan", f"T{count}"]}) + "\n"
+                for i in range(count)
+            ))
+            with CaptureQueriesContext(connection) as context:
+                self.call(path)
+            return len(context.captured_queries)
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            self.skipTest("Requires bulk insert returning primary keys")
+        self.assertEqual(import_rows(2), import_rows(50))
+
+    def test_import_workers_need_concurrent_writes(self):
+        """
+        Test parallel imports are refused on SQLite
+        """
+        if connection.vendor != "sqlite":
+            self.skipTest("Requires SQLite")
+        path = self.write_file(".ndjson", "")
+
+        with self.assertRaises(CommandError):
+            self.call(path, workers=2)
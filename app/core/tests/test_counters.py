@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import counters
+from core import models
+
+
+class RecipeCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@londonappdev.com",
+            "testpass"
+        )
+        self.vegan = models.Tag.objects.create(user=self.user, name="Vegan")
+        self.dinner = models.Tag.objects.create(user=self.user, name="Dinner")
+        self.rice = models.Ingredient.objects.create(
+            user=self.user,
+            name="Rice"
+        )
+        self.recipe = self.create_recipe("Curry")
+
+    def create_recipe(self, title):
+        return models.Recipe.objects.create(
+            user=self.user,
+            title=title,
+            time_minutes=10,
+            price=5.00
+        )
+
+    def assertCounts(self, *expected):
+        for row, count in expected:
+            row.refresh_from_db()
+            self.assertEqual(row.recipe_count, count, row.name)
+
+    def test_add_and_remove(self):
+        """
+        Test adding and removing tags updates their counts
+        """
+        self.recipe.tags.add(self.vegan, self.dinner)
+        self.recipe.tags.add(self.vegan)
+        self.recipe.ingredients.add(self.rice)
+        self.assertCounts((self.vegan, 1), (self.dinner, 1), (self.rice, 1))
+
+        other = self.create_recipe("Salad")
+        other.tags.remove(self.vegan)
+        self.recipe.tags.remove(self.vegan)
+        self.assertCounts((self.vegan, 0), (self.dinner, 1))
+
+    def test_set_and_clear(self):
+        """
+        Test replacing and clearing tags updates their counts
+        """
+        self.recipe.tags.set([self.vegan])
+        self.recipe.tags.set([self.dinner])
+        self.assertCounts((self.vegan, 0), (self.dinner, 1))
+
+        self.recipe.tags.clear()
+        self.assertCounts((self.dinner, 0))
+
+    def test_reverse_relation(self):
+        """
+        Test writing recipes from the tag side updates the tag count
+        """
+        other = self.create_recipe("Salad")
+        self.vegan.recipe_set.add(self.recipe, other)
+        self.assertCounts((self.vegan, 2))
+
+        self.vegan.recipe_set.remove(other, other)
+        self.assertCounts((self.vegan, 1))
+
+        self.vegan.recipe_set.clear()
+        self.assertCounts((self.vegan, 0))
+
+    def test_recipe_deleted(self):
+        """
+        Test deleting a recipe decrements its tags and ingredients
+        """
+        self.recipe.tags.add(self.vegan)
+        self.recipe.ingredients.add(self.rice)
+
+        self.recipe.delete()
+
+        self.assertCounts((self.vegan, 0), (self.rice, 0))
+
+    def test_reconcile_recipe_counts(self):
+        """
+        Test reconciling fixes drifted counts only
+        """
+        self.recipe.tags.add(self.vegan)
+        models.Tag.objects.filter(pk=self.vegan.pk).update(recipe_count=7)
+        models.Tag.objects.filter(pk=self.dinner.pk).update(recipe_count=2)
+
+        self.assertEqual(counters.reconcile_recipe_counts(models.Tag), 2)
+        self.assertCounts((self.vegan, 1), (self.dinner, 0))
+        self.assertEqual(counters.reconcile_recipe_counts(models.Tag), 0)
+
+    def test_reconcile_command(self):
+        models.Ingredient.objects.filter(pk=self.rice.pk).update(
+            recipe_count=3
+        )
+
+        call_command("reconcile_recipe_counts", stdout=StringIO())
+
+        self.assertCounts((self.rice, 0))
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from core import models
+
+
+class IndexUsageTests(TestCase):
+    """
+    Check the hot list queries are planned on their composite indexes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            "test@londonappdev.com",
+            "testpass"
+        )
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Tiny test tables are cheaper to scan, make the planner
+            # show which index it would use
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_tag_list_uses_index(self):
+        self.assertUsesIndex(
+            models.Tag.objects.filter(user=self.user).order_by("-name", "-id"),
+            "core_tag_user_name_id_idx"
+        )
+
+    def test_ingredient_list_uses_index(self):
+        self.assertUsesIndex(
+            models.Ingredient.objects.filter(user=self.user).order_by(
+                "-name", "-id"
+            ),
+            "core_ingr_user_name_id_idx"
+        )
+
+    def test_tag_popularity_uses_index(self):
+        self.assertUsesIndex(
+            models.Tag.objects.filter(user=self.user).order_by(
+                "-recipe_count", "-id"
+            ),
+            "core_tag_user_count_id_idx"
+        )
+
+    def test_tag_name_lookup_uses_unique_index(self):
+        index_name = "core_tag_user_name_uniq"
+        if connection.vendor == "sqlite":
+            # SQLite builds table constraints as anonymous indexes
+            index_name = "sqlite_autoindex_core_tag"
+        else:
+            # On an empty table the popularity index, also leading with
+            # user, costs the same
+            models.Tag.objects.bulk_create([
+                models.Tag(user=self.user, name=f"Tag {number}")
+                for number in range(200)
+            ])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE core_tag")
+        self.assertUsesIndex(
+            models.Tag.objects.filter(user=self.user, name="Vegan"),
+            index_name
+        )
+
+    def test_recipe_list_uses_index(self):
+        self.assertUsesIndex(
+            models.Recipe.objects.filter(user=self.user).order_by("-id"),
+            "core_recipe_user_id_idx"
+        )
+
+    def test_recipe_tag_filter_uses_through_index(self):
+        self.assertUsesIndex(
+            models.Recipe.tags.through.objects.filter(tag_id=1),
+            "core_recipe_tags_tag_recipe_idx"
+        )
+
+    def test_recipe_ingredient_filter_uses_through_index(self):
+        self.assertUsesIndex(
+            models.Recipe.ingredients.through.objects.filter(ingredient_id=1),
+            "core_recipe_ingr_ingr_recipe_idx"
+        )
+
+
+class UniqueNameTests(TestCase):
+
+    def test_tag_name_unique_per_user(self):
+        """
+        Test a user can not have two tags with the same name
+        """
+        user = get_user_model().objects.create_user(
+            "test@londonappdev.com",
+            "testpass"
+        )
+        other = get_user_model().objects.create_user(
+            "other@londonappdev.com",
+            "testpass"
+        )
+        models.Tag.objects.create(user=user, name="Vegan")
+        models.Tag.objects.create(user=other, name="Vegan")
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Tag.objects.create(user=user, name="Vegan")
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+
+
+class MediaServeTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.content = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.hashed_path = (
+            f"uploads/recipe/sha256/{self.digest[:2]}/{self.digest[2:4]}/"
+            f"{self.digest}.jpg"
+        )
+        self.plain_path = "uploads/recipe/plain.jpg"
+        for path in (self.hashed_path, self.plain_path):
+            fullpath = os.path.join(self.root.name, path)
+            os.makedirs(os.path.dirname(fullpath), exist_ok=True)
+            with open(fullpath, "wb") as destination:
+                destination.write(self.content)
+
+        settings_override = override_settings(MEDIA_ROOT=self.root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_hashed_file_cached_forever(self):
+        """
+        Test content addressed files are served as immutable
+        """
+        res = self.client.get(f"/media/{self.hashed_path}")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b"".join(res.streaming_content), self.content)
+        self.assertEqual(res["ETag"], f'"{self.digest}"')
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+
+    def test_plain_file_revalidated(self):
+        """
+        Test other files get a short max-age
+        """
+        res = self.client.get(f"/media/{self.plain_path}")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("immutable", res["Cache-Control"])
+
+    def test_if_none_match_not_modified(self):
+        """
+        Test a matching ETag is answered with 304
+        """
+        etag = self.client.get(f"/media/{self.plain_path}")["ETag"]
+
+        res = self.client.get(
+            f"/media/{self.plain_path}", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_range_request(self):
+        """
+        Test serving part of a file
+        """
+        res = self.client.get(
+            f"/media/{self.hashed_path}", HTTP_RANGE="bytes=10-19"
+        )
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b"".join(res.streaming_content), self.content[10:20])
+        self.assertEqual(res["Content-Range"], f"bytes 10-19/{1024}")
+
+        res = self.client.get(
+            f"/media/{self.hashed_path}", HTTP_RANGE="bytes=-4"
+        )
+        self.assertEqual(b"".join(res.streaming_content), self.content[-4:])
+
+    def test_unsatisfiable_range(self):
+        """
+        Test a range past the end of the file
+        """
+        res = self.client.get(
+            f"/media/{self.hashed_path}", HTTP_RANGE="bytes=5000-"
+        )
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res["Content-Range"], "bytes */1024")
+
+    def test_stale_if_range_sends_full_file(self):
+        """
+        Test If-Range with an old ETag ignores the range
+        """
+        res = self.client.get(
+            f"/media/{self.plain_path}",
+            HTTP_RANGE="bytes=0-9",
+            HTTP_IF_RANGE='"stale"'
+        )
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/")
+    def test_accel_redirect(self):
+        """
+        Test the body is delegated to the front server when configured
+        """
+        res = self.client.get(f"/media/{self.hashed_path}")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            res["X-Accel-Redirect"], f"/protected-media/{self.hashed_path}"
+        )
+        self.assertEqual(res.content, b"")
+
+    def test_path_traversal_not_found(self):
+        """
+        Test files outside the media root are not served
+        """
+        res = self.client.get("/media/../../etc/passwd")
+
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,283 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+
+
+def value(metric, **labels):
+    return metric.samples().get(metric.key(labels))
+
+
+class MetricsRegistryTests(TestCase):
+    """
+    Test the in-process metrics registry
+    """
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.counter = metrics.Counter(
+            "jobs_total", "Jobs run", ["queue"], registry=self.registry
+        )
+        self.histogram = metrics.Histogram(
+            "job_seconds", "Job time", buckets=(0.1, 1),
+            registry=self.registry
+        )
+
+    def test_counter_threads(self):
+        """
+        Test samples recorded by finished threads are kept
+        """
+        def work():
+            for _number in range(1000):
+                self.counter.inc(queue="default")
+
+        threads = [threading.Thread(target=work) for _number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.counter.inc(2, queue="other")
+
+        self.assertEqual(value(self.counter, queue="default"), 4000)
+        self.assertEqual(value(self.counter, queue="other"), 2)
+        self.assertEqual(len(self.counter._shards), 1)
+
+    def test_labels_required(self):
+        """
+        Test samples must have exactly the labels of their metric
+        """
+        with self.assertRaises(ValueError):
+            self.counter.inc()
+        with self.assertRaises(ValueError):
+            self.histogram.observe(1, queue="default")
+
+    def test_render(self):
+        """
+        Test histograms are rendered with cumulative buckets
+        """
+        for seconds in (0.05, 0.1, 0.5, 3):
+            self.histogram.observe(seconds)
+        self.counter.inc(queue='say "hi"')
+
+        text = metrics.render(self.registry.snapshot())
+
+        self.assertIn("# TYPE job_seconds histogram\n", text)
+        self.assertIn('job_seconds_bucket{le="0.1"} 2\n', text)
+        self.assertIn('job_seconds_bucket{le="1.0"} 3\n', text)
+        self.assertIn('job_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn("job_seconds_sum 3.65\n", text)
+        self.assertIn("job_seconds_count 4\n", text)
+        self.assertIn('jobs_total{queue="say \\"hi\\""} 1\n', text)
+
+    def test_merge(self):
+        """
+        Test snapshots of several processes are summed
+        """
+        self.counter.inc(queue="default")
+        self.histogram.observe(0.5)
+        snapshot = self.registry.snapshot()
+
+        merged = metrics.merge([snapshot, json.loads(json.dumps(snapshot))])
+
+        self.assertEqual(
+            merged["jobs_total"]["samples"], [[["default"], 2]]
+        )
+        self.assertEqual(
+            merged["job_seconds"]["samples"], [[[], [[0, 2, 0], 1.0]]]
+        )
+
+    def test_reset(self):
+        """
+        Test a reset registry, as in a forked worker, starts from zero
+        """
+        self.counter.inc(queue="default")
+
+        self.registry.reset()
+
+        self.assertEqual(self.counter.samples(), {})
+
+    def test_gauge(self):
+        """
+        Test gauges keep the last value set, summed across processes
+        """
+        gauge = metrics.Gauge(
+            "workers", "Busy workers", ["queue"], registry=self.registry
+        )
+        gauge.set(3, queue="default")
+        gauge.set(1, queue="default")
+        snapshot = self.registry.snapshot()
+
+        merged = metrics.merge([snapshot, snapshot])
+
+        self.assertEqual(value(gauge, queue="default"), 1)
+        self.assertEqual(merged["workers"]["samples"], [[["default"], 2]])
+        self.assertIn(
+            'workers{queue="default"} 1\n', metrics.render(snapshot)
+        )
+
+
+class ProcessFilesTests(TestCase):
+    """
+    Test metrics shared by worker processes through METRICS_DIR
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.registry = metrics.Registry()
+        self.counter = metrics.Counter(
+            "jobs_total", "Jobs run", registry=self.registry
+        )
+        self.files = metrics.ProcessFiles(self.registry)
+
+    def test_collect_workers(self):
+        """
+        Test a scrape sums the files of every worker
+        """
+        self.counter.inc(3)
+        with open(os.path.join(self.directory, "metrics-1-a.json"), "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        self.counter.inc()
+
+        with override_settings(METRICS_DIR=self.directory):
+            snapshot = self.files.collect()
+
+        self.assertEqual(snapshot["jobs_total"]["samples"], [[[], 7]])
+        self.assertIn(self.files.name, os.listdir(self.directory))
+
+    def test_collect_exited_workers(self):
+        """
+        Test gauges of workers that exited are left out of a scrape
+        """
+        gauge = metrics.Gauge("busy", "Busy", registry=self.registry)
+        gauge.set(2)
+        self.counter.inc()
+        # A pid no process can have, above the kernel maximum
+        with open(os.path.join(self.directory, "metrics-99999999-a.json"),
+                  "w") as f:
+            json.dump(self.registry.snapshot(), f)
+
+        with override_settings(METRICS_DIR=self.directory):
+            snapshot = self.files.collect()
+
+        self.assertEqual(snapshot["jobs_total"]["samples"], [[[], 2]])
+        self.assertEqual(snapshot["busy"]["samples"], [[[], 2]])
+
+    @override_settings(METRICS_FLUSH_INTERVAL=60)
+    def test_flush_interval(self):
+        """
+        Test requests only write the file once per interval
+        """
+        with override_settings(METRICS_DIR=self.directory):
+            self.files.flush(force=False)
+            self.counter.inc()
+            self.files.flush(force=False)
+
+        with open(os.path.join(self.directory, self.files.name)) as f:
+            self.assertEqual(json.load(f)["jobs_total"]["samples"], [])
+
+    def test_fork(self):
+        """
+        Test a forked worker writes its own file
+        """
+        name = self.files.name
+
+        self.files.after_fork()
+
+        self.assertNotEqual(self.files.name, name)
+
+
+class MetricsApiTests(TestCase):
+    """
+    Test the metrics recorded by requests and the metrics endpoint
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "nazrul@localmachine.com",
+            "test12345"
+        )
+        self.client = APIClient()
+
+    def test_request_metrics(self):
+        """
+        Test requests are recorded per view and viewset action
+        """
+        self.client.force_authenticate(self.user)
+        labels = {"view": "TagViewSet.list", "method": "GET", "status": "2xx"}
+        before = value(metrics.REQUEST_DURATION, **labels)
+        count = sum(before[0]) if before else 0
+
+        self.client.get(reverse("recipe:tag-list"))
+
+        after = value(metrics.REQUEST_DURATION, **labels)
+        self.assertEqual(sum(after[0]), count + 1)
+        self.assertIsNotNone(
+            value(metrics.REQUEST_QUERIES, view="TagViewSet.list")
+        )
+
+    def test_login_outcomes(self):
+        """
+        Test token requests are counted by outcome
+        """
+        failures = value(metrics.LOGINS, outcome="failure") or 0
+        successes = value(metrics.LOGINS, outcome="success") or 0
+
+        self.client.post(reverse("user:token"), {
+            "email": self.user.email, "password": "wrong"
+        })
+        self.client.post(reverse("user:token"), {
+            "email": self.user.email, "password": "test12345"
+        })
+
+        self.assertEqual(
+            value(metrics.LOGINS, outcome="failure"), failures + 1
+        )
+        self.assertEqual(
+            value(metrics.LOGINS, outcome="success"), successes + 1
+        )
+
+    @override_settings(METRICS_PUBLIC=True)
+    def test_metrics_endpoint(self):
+        """
+        Test the metrics are served in the text exposition format
+        """
+        res = self.client.get(reverse("metrics"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn(
+            b"# TYPE http_request_duration_seconds histogram", res.content
+        )
+
+    @override_settings(METRICS_TOKEN="scraper-secret")
+    def test_metrics_token(self):
+        """
+        Test a configured token is required to scrape the metrics
+        """
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, 403)
+
+        res = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scraper-secret"
+        )
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_PUBLIC=False)
+    def test_metrics_private_by_default(self):
+        """
+        Test the metrics are refused without a token unless made public
+        """
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, 403)
+
+        res = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(res.status_code, 403)
@@ -0,0 +1,127 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.middleware import RequestInstrumentationMiddleware, fingerprint
+from core.models import Tag
+
+
+def log_entry(output):
+    return json.loads(output.split(" ", 1)[1])
+
+
+class RequestInstrumentationTests(TestCase):
+    """
+    Test the request timing and query instrumentation middleware
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "nazrul@localmachine.com",
+            "test12345"
+        )
+
+    def middleware(self, view, **options):
+        with override_settings(**options):
+            return RequestInstrumentationMiddleware(view)
+
+    def test_fingerprint(self):
+        """
+        Test statements differing in literals share a fingerprint
+        """
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21"),
+            fingerprint("SELECT *\n FROM t WHERE id IN (%s) LIMIT 1")
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE name = 'a''b' AND x = 1.5"),
+            "SELECT * FROM t WHERE name = ? AND x = ?"
+        )
+
+    @override_settings(REQUEST_SAMPLE_RATE=1, SLOW_REQUEST_MS=60000)
+    def test_server_timing(self):
+        """
+        Test sampled API responses report their time and queries
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(reverse("recipe:tag-list"))
+
+        self.assertRegex(
+            res["Server-Timing"],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$'
+        )
+
+    def test_unsampled_request(self):
+        """
+        Test requests outside the sample only report their duration
+        """
+        middleware = self.middleware(
+            lambda request: HttpResponse(),
+            REQUEST_SAMPLE_RATE=0,
+            SLOW_REQUEST_MS=60000
+        )
+
+        response = middleware(RequestFactory().get("/"))
+
+        self.assertRegex(response["Server-Timing"], r"^app;dur=[\d.]+$")
+
+    def test_slow_request_logged(self):
+        """
+        Test slow requests are logged with their slowest queries
+        """
+        def view(request):
+            list(Tag.objects.all())
+            get_user_model().objects.count()
+            return HttpResponse(status=201)
+
+        middleware = self.middleware(
+            view, REQUEST_SAMPLE_RATE=1, SLOW_REQUEST_MS=0
+        )
+
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            middleware(RequestFactory().post("/api/recipe/tags/"))
+
+        entry = log_entry(logs.records[0].getMessage())
+        self.assertEqual(entry["method"], "POST")
+        self.assertEqual(entry["status"], 201)
+        self.assertEqual(entry["queries"], 2)
+        self.assertEqual(len(entry["top_queries"]), 2)
+        self.assertIn("core_tag", " ".join(
+            query["sql"] for query in entry["top_queries"]
+        ))
+
+    def test_duplicate_queries_logged(self):
+        """
+        Test a query repeated per row is reported as duplicate
+        """
+        tags = [
+            Tag.objects.create(user=self.user, name=str(number))
+            for number in range(3)
+        ]
+
+        def view(request):
+            for tag in tags:
+                Tag.objects.get(pk=tag.pk)
+            return HttpResponse()
+
+        middleware = self.middleware(
+            view,
+            REQUEST_SAMPLE_RATE=1,
+            SLOW_REQUEST_MS=60000,
+            DUPLICATE_QUERY_THRESHOLD=3
+        )
+
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            middleware(RequestFactory().get("/"))
+
+        [record] = logs.records
+        self.assertEqual(record.levelname, "WARNING")
+        self.assertTrue(record.getMessage().startswith("duplicate_queries "))
+        entry = log_entry(record.getMessage())
+        self.assertEqual(list(entry["queries"].values()), [3])
@@ -0,0 +1,287 @@
+import threading
+import time
+from unittest import skipUnless
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase
+
+from core import metrics
+from core.db import pool
+from core.db.postgresql.base import DatabaseWrapper
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def value(metric, **labels):
+    return metric.samples().get(metric.key(labels), 0)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """
+    Test the pool of connections shared by the threads of a process
+    """
+
+    def setUp(self):
+        self.pool = pool.ConnectionPool("pool-tests", max_size=2, timeout=1)
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_reuse(self):
+        """
+        Test a released connection is handed to the next caller
+        """
+        first, reused = self.pool.acquire(self.connect)
+        self.assertFalse(reused)
+        self.pool.release(first)
+
+        second, reused = self.pool.acquire(self.connect)
+
+        self.assertIs(second, first)
+        self.assertTrue(reused)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_timeout(self):
+        """
+        Test callers wait for a connection of a full pool, up to timeout
+        """
+        self.pool.timeout = 0.05
+        self.pool.acquire(self.connect)
+        self.pool.acquire(self.connect)
+        timeouts = value(metrics.DB_POOL_TIMEOUTS, database="pool-tests")
+
+        with self.assertRaises(pool.PoolTimeout):
+            self.pool.acquire(self.connect)
+
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(
+            value(metrics.DB_POOL_TIMEOUTS, database="pool-tests"),
+            timeouts + 1
+        )
+
+    def test_wait_for_release(self):
+        """
+        Test a caller waiting on a full pool gets the connection released
+        """
+        first, _reused = self.pool.acquire(self.connect)
+        self.pool.acquire(self.connect)
+        releaser = threading.Timer(0.05, self.pool.release, [first])
+        releaser.start()
+
+        connection, reused = self.pool.acquire(self.connect)
+        releaser.join()
+
+        self.assertIs(connection, first)
+        self.assertTrue(reused)
+
+    def test_unusable_closed(self):
+        """
+        Test connections released as unusable or failing the check are
+        closed and replaced
+        """
+        first, _reused = self.pool.acquire(self.connect)
+        self.pool.release(first, reusable=False)
+        second, _reused = self.pool.acquire(self.connect)
+        self.pool.release(second)
+
+        third, reused = self.pool.acquire(self.connect, check=lambda c: False)
+
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertFalse(reused)
+        self.assertEqual(self.opened, [first, second, third])
+
+    def test_expired_closed(self):
+        """
+        Test connections idle or open for too long are replaced
+        """
+        first, _reused = self.pool.acquire(self.connect)
+        self.pool.release(first)
+        self.pool.max_idle = 0
+        second, _reused = self.pool.acquire(self.connect)
+        self.pool.max_idle = 600
+        self.pool.max_lifetime = 0
+
+        self.pool.release(second)
+
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual(self.pool.idle, [])
+
+    def test_connect_failure(self):
+        """
+        Test a failed connection attempt does not take a place in the pool
+        """
+        def fail():
+            raise OperationalError("down")
+
+        for _attempt in range(3):
+            with self.assertRaises(OperationalError):
+                self.pool.acquire(fail)
+
+        self.assertEqual(self.pool.opening, 0)
+        self.pool.acquire(self.connect)
+        self.pool.acquire(self.connect)
+
+    def test_gauges(self):
+        """
+        Test the pool reports its idle and used connections
+        """
+        first, _reused = self.pool.acquire(self.connect)
+        self.pool.acquire(self.connect)
+        self.pool.release(first)
+
+        labels = {"database": "pool-tests"}
+        self.assertEqual(
+            value(metrics.DB_POOL_CONNECTIONS, state="idle", **labels), 1
+        )
+        self.assertEqual(
+            value(metrics.DB_POOL_CONNECTIONS, state="in_use", **labels), 1
+        )
+
+    def test_close(self):
+        """
+        Test a closed pool closes its idle connections and the ones
+        released later
+        """
+        first, _reused = self.pool.acquire(self.connect)
+        second, _reused = self.pool.acquire(self.connect)
+        self.pool.release(first)
+
+        self.pool.close()
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.pool.release(second)
+
+        self.assertTrue(second.closed)
+
+    def test_registry(self):
+        """
+        Test pools are shared per alias and connection parameters
+        """
+        self.addCleanup(pool.close_pools, "pool-tests")
+        shared = pool.get_pool("pool-tests", {"database": "a"}, max_size=1)
+
+        self.assertIs(pool.get_pool("pool-tests", {"database": "a"}), shared)
+        self.assertIsNot(
+            pool.get_pool("pool-tests", {"database": "b"}), shared
+        )
+        self.assertEqual(shared.max_size, 1)
+
+        pool.close_pools("pool-tests")
+        self.assertTrue(shared.closed)
+
+
+class DatabaseWrapperConfigTests(SimpleTestCase):
+    """
+    Test the configuration of the pooled PostgreSQL backend
+    """
+
+    def settings_dict(self, **options):
+        return {
+            "NAME": "app", "USER": "", "PASSWORD": "", "HOST": "",
+            "PORT": "", "CONN_MAX_AGE": 0, "OPTIONS": options,
+            "AUTOCOMMIT": True, "TIME_ZONE": None,
+        }
+
+    def test_pool_option_not_sent(self):
+        """
+        Test the pool option is not passed on to psycopg2
+        """
+        wrapper = DatabaseWrapper(self.settings_dict(pool={"max_size": 3}))
+
+        self.assertNotIn("pool", wrapper.get_connection_params())
+        self.assertEqual(wrapper.pool_options, {"max_size": 3})
+        self.assertTrue(wrapper.pooled)
+
+    def test_pool_with_persistent_connections(self):
+        """
+        Test a pool cannot be combined with persistent connections
+        """
+        settings_dict = dict(self.settings_dict(pool=True), CONN_MAX_AGE=60)
+
+        with self.assertRaises(ImproperlyConfigured):
+            DatabaseWrapper(settings_dict)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs PostgreSQL")
+class PostgresConnectionTests(TestCase):
+    """
+    Test connections of the backend against a real database
+    """
+
+    def make_wrapper(self, alias, **settings):
+        settings_dict = dict(connection.settings_dict, **settings)
+        wrapper = DatabaseWrapper(settings_dict, alias)
+        self.addCleanup(pool.close_pools, alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            return cursor.fetchone()[0]
+
+    def terminate(self, pid):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+        # Termination is asynchronous
+        time.sleep(0.1)
+
+    def test_pooled_connection_reused(self):
+        """
+        Test a closed pooled connection is reused by the next connection
+        """
+        wrapper = self.make_wrapper(
+            "pooled", CONN_MAX_AGE=0, OPTIONS={"pool": {"max_size": 1}}
+        )
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        other = self.make_wrapper(
+            "pooled", CONN_MAX_AGE=0, OPTIONS={"pool": {"max_size": 1}}
+        )
+
+        self.assertEqual(self.backend_pid(other), pid)
+
+    def test_persistent_health_check(self):
+        """
+        Test a persistent connection closed by the server is replaced at
+        the start of the next request
+        """
+        wrapper = self.make_wrapper(
+            "persistent", CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True,
+            OPTIONS={}
+        )
+        pid = self.backend_pid(wrapper)
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertEqual(self.backend_pid(wrapper), pid)
+        self.terminate(pid)
+
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertNotEqual(self.backend_pid(wrapper), pid)
+
+    def test_pooled_health_check(self):
+        """
+        Test a pooled connection closed by the server is not handed out
+        """
+        wrapper = self.make_wrapper(
+            "pooled", CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True,
+            OPTIONS={"pool": True}
+        )
+        pid = self.backend_pid(wrapper)
+        wrapper.close()
+        self.terminate(pid)
+
+        self.assertNotEqual(self.backend_pid(wrapper), pid)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core import models
+from core.storage import ContentAddressedStorage, recipe_image_storage
+
+
+def sample_recipe(user, **params):
+    defaults = {
+        "title": "Sample Recipe",
+        "time_minutes": 10,
+        "price": 5.00,
+    }
+    defaults.update(params)
+    return models.Recipe.objects.create(user=user, **defaults)
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.location.name)
+
+    def tearDown(self):
+        self.location.cleanup()
+
+    def test_name_is_sharded_content_hash(self):
+        """
+        Test files are stored under the sharded hash of their content
+        """
+        content = b"recipe image"
+        digest = hashlib.sha256(content).hexdigest()
+
+        name = self.storage.save("photo.JPG", ContentFile(content))
+
+        self.assertEqual(
+            name,
+            f"uploads/recipe/sha256/{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        )
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_identical_content_stored_once(self):
+        """
+        Test saving the same bytes twice shares one file
+        """
+        first = self.storage.save("a.png", ContentFile(b"same"))
+        second = self.storage.save("b.png", ContentFile(b"same"))
+
+        self.assertEqual(first, second)
+        directory = os.path.dirname(self.storage.path(first))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+
+@override_settings(RECIPE_IMAGE_GC_GRACE=0)
+class ImageReferenceCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="nazrul@localmachine.com",
+            password="test12345"
+        )
+
+    def set_image(self, recipe, content):
+        recipe.image.save("photo.jpg", ContentFile(content))
+        return recipe.image.name
+
+    def blob(self, name):
+        return models.ImageBlob.objects.get(name=name)
+
+    def test_shared_image_collected_with_last_reference(self):
+        """
+        Test a deduplicated image survives until no recipe uses it
+        """
+        recipe1 = sample_recipe(self.user)
+        recipe2 = sample_recipe(self.user)
+        name = self.set_image(recipe1, b"shared photo")
+        self.assertEqual(self.set_image(recipe2, b"shared photo"), name)
+        self.assertEqual(self.blob(name).ref_count, 2)
+
+        recipe1.delete()
+        self.assertEqual(self.blob(name).ref_count, 1)
+        call_command("collect_images", stdout=open(os.devnull, "w"))
+        self.assertTrue(recipe_image_storage.exists(name))
+
+        recipe2.delete()
+        call_command("collect_images", stdout=open(os.devnull, "w"))
+        self.assertFalse(recipe_image_storage.exists(name))
+        self.assertFalse(models.ImageBlob.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """
+        Test replacing an image drops the reference to the old one
+        """
+        recipe = sample_recipe(self.user)
+        old = self.set_image(recipe, b"old photo")
+        new = self.set_image(
+            models.Recipe.objects.get(pk=recipe.pk), b"new photo"
+        )
+
+        self.assertEqual(self.blob(old).ref_count, 0)
+        self.assertEqual(self.blob(new).ref_count, 1)
+
+        recipe_image_storage.delete(old)
+        recipe_image_storage.delete(new)
@@ -0,0 +1,49 @@
+from django.db.models import F
+from django.utils import timezone
+
+from core import models
+
+
+COLLECTIONS = ("recipes", "tags", "ingredients")
+# Bumped by every write to the change log, see core.changes
+CHANGES = "changes"
+
+
+def create(user_id):
+    models.CollectionVersion.objects.bulk_create(
+        [
+            models.CollectionVersion(user_id=user_id, collection=collection)
+            for collection in COLLECTIONS + (CHANGES,)
+        ],
+        ignore_conflicts=True
+    )
+
+
+def bump(user_ids, *collections):
+    """
+    Move the given collections of the users to a new version. Versions
+    are created with the user, so this is a single UPDATE.
+    """
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    models.CollectionVersion.objects.filter(
+        user_id__in=user_ids,
+        collection__in=collections or COLLECTIONS
+    ).update(version=F("version") + 1, updated_at=timezone.now())
+
+
+def get(user_id, collection):
+    """
+    Return the current (version, updated_at) of a user's collection
+    """
+    current = models.CollectionVersion.objects.filter(
+        user_id=user_id,
+        collection=collection
+    ).values_list("version", "updated_at").first()
+    if current is None:
+        version = models.CollectionVersion.objects.get_or_create(
+            user_id=user_id,
+            collection=collection
+        )[0]
+        current = version.version, version.updated_at
+    return current
@@ -0,0 +1,91 @@
+"""
+Async variants of the busiest recipe endpoints, routed when
+RECIPE_ASYNC_VIEWS is set, as recipe_backend.asgi does.
+
+Under ASGI Django reads the request body on the event loop before the
+view is called, so a slow client uploading an image only holds a
+coroutine. Django 3.1 has no async ORM, the viewset itself therefore runs
+in the shared sync_to_async thread pool rather than in the single thread
+Django gives to sync views, which also bounds the database connections
+open at once to the size of that pool.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import path, re_path
+
+from recipe import views
+
+
+def database_sync_to_async(func):
+    """
+    Run func in the thread pool, closing connections of the pool thread
+    that errored or outlived CONN_MAX_AGE as a request would
+    """
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def as_async_view(viewset, actions, **initkwargs):
+    """
+    Return an async view serving actions of viewset
+    """
+    view = viewset.as_view(actions, **initkwargs)
+
+    @database_sync_to_async
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        # Rendering may read lazy querysets, keep it off the event loop
+        response.render()
+        return response
+
+    async def async_view(request, *args, **kwargs):
+        return await respond(request, *args, **kwargs)
+
+    # Read by the CSRF and metrics middleware like on DRF views
+    async_view.cls = view.cls
+    async_view.initkwargs = view.initkwargs
+    async_view.actions = view.actions
+    async_view.csrf_exempt = True
+    return async_view
+
+
+LIST_ACTIONS = {"get": "list", "post": "create"}
+
+urlpatterns = [
+    path(
+        "tags/",
+        as_async_view(views.TagViewSet, LIST_ACTIONS, basename="tag"),
+        name="tag-list"
+    ),
+    path(
+        "ingradient/",
+        as_async_view(
+            views.IngradientViewSet, LIST_ACTIONS, basename="ingredient"
+        ),
+        name="ingredient-list"
+    ),
+    path(
+        "recipe/",
+        as_async_view(views.RecipeViewSet, LIST_ACTIONS, basename="recipe"),
+        name="recipe-list"
+    ),
+    re_path(
+        r"^recipe/(?P<pk>[^/.]+)/upload-image/$",
+        as_async_view(
+            views.RecipeViewSet,
+            {"post": "upload_image"},
+            basename="recipe",
+            detail=True
+        ),
+        name="recipe-upload-image"
+    ),
+]
@@ -0,0 +1,181 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from core import changes
+from core import models
+from core import versions
+from core.counters import refresh_recipe_counts
+from core.search import update_search_vector
+from recipe.serializers import RecipeBulkItemSerializer
+
+
+MAX_ITEMS = getattr(settings, "RECIPE_BULK_MAX_ITEMS", 1000)
+BATCH_SIZE = 1000
+
+RELATIONS = [
+    ("tags", models.Tag, models.Recipe.tags.through, "tag_id"),
+    (
+        "ingredients",
+        models.Ingredient,
+        models.Recipe.ingredients.through,
+        "ingredient_id"
+    ),
+]
+
+
+def bulk_save_recipes(user, items):
+    """
+    Validate and write a batch of recipes for user in one transaction.
+
+    Items with an ``id`` update that recipe, the others create one. An
+    item failing validation is reported in its result and skipped, the
+    rest of the batch is still written. Returns one result per item.
+    """
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = RecipeBulkItemSerializer(
+            data=item,
+            partial=isinstance(item, dict) and "id" in item
+        )
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = {"index": index, "errors": serializer.errors}
+
+    check_related_ids(user, valid, results)
+    existing = check_recipe_ids(user, valid, results)
+
+    created, updated = [], []
+    for index, data in valid.items():
+        data = dict(data)
+        related = {
+            relation[0]: list(dict.fromkeys(data.pop(relation[0])))
+            for relation in RELATIONS if relation[0] in data
+        }
+        pk = data.pop("id", None)
+        if pk is None:
+            recipe = models.Recipe(user=user, **data)
+            created.append((index, recipe, related))
+        else:
+            recipe = existing[pk]
+            for field, value in data.items():
+                setattr(recipe, field, value)
+            updated.append((index, recipe, related, list(data)))
+
+    with transaction.atomic():
+        create_recipes([entry[1] for entry in created])
+        update_recipes(updated)
+        changed = write_relations(created + [entry[:3] for entry in updated])
+
+    for entries, outcome in ((created, "created"), (updated, "updated")):
+        for index, recipe, *rest in entries:
+            results[index] = {"index": index, "id": recipe.pk,
+                              "status": outcome}
+
+    if created or updated:
+        recipe_ids = [result["id"] for result in results if "id" in result]
+        update_search_vector(models.Recipe.objects.filter(pk__in=recipe_ids))
+        versions.bump(user.pk)
+        changes.record(user.pk, dict(changed, recipes=recipe_ids))
+    return results
+
+
+def reject(valid, results, index, errors):
+    valid.pop(index)
+    results[index] = {"index": index, "errors": errors}
+
+
+def check_related_ids(user, valid, results):
+    """
+    Resolve the tag and ingredient ids of every item with one query per
+    relation, scoped to the user
+    """
+    for name, model, through, column in RELATIONS:
+        requested = {
+            pk for data in valid.values() for pk in data.get(name, [])
+        }
+        if not requested:
+            continue
+        found = set(
+            model.objects.filter(user=user, pk__in=requested)
+            .values_list("pk", flat=True)
+        )
+        for index, data in list(valid.items()):
+            missing = [pk for pk in data.get(name, []) if pk not in found]
+            if missing:
+                reject(valid, results, index, {name: [
+                    _('Invalid pk "%(pk)s" - object does not exist.')
+                    % {"pk": pk}
+                    for pk in missing
+                ]})
+
+
+def check_recipe_ids(user, valid, results):
+    """
+    Load every recipe updated by the batch with a single query
+    """
+    ids = [data["id"] for data in valid.values() if "id" in data]
+    existing = models.Recipe.objects.filter(user=user).in_bulk(ids)
+    for index, data in list(valid.items()):
+        if "id" in data and data["id"] not in existing:
+            reject(valid, results, index, {"id": [_("Not found.")]})
+    return existing
+
+
+def create_recipes(recipes):
+    if not recipes:
+        return
+    connection = connections[models.Recipe.objects.db]
+    if connection.features.can_return_rows_from_bulk_insert:
+        models.Recipe.objects.bulk_create(recipes, batch_size=BATCH_SIZE)
+    else:
+        # Primary keys are only set by bulk_create on backends that can
+        # return inserted rows
+        for recipe in recipes:
+            recipe.save()
+
+
+def update_recipes(updated):
+    if not updated:
+        return
+    # bulk_update does not apply auto_now
+    now = timezone.now()
+    for entry in updated:
+        entry[1].updated_at = now
+    fields = {field for entry in updated for field in entry[3]}
+    models.Recipe.objects.bulk_update(
+        [entry[1] for entry in updated],
+        sorted(fields | {"updated_at"}),
+        batch_size=BATCH_SIZE
+    )
+
+
+def write_relations(entries):
+    """
+    Replace the tags and ingredients given for each recipe with one
+    delete and one batched insert per through table, then recount the
+    recipes of the tags and ingredients involved. Returns their ids per
+    relation.
+    """
+    changed_ids = {}
+    for name, model, through, column in RELATIONS:
+        recipe_ids = [
+            recipe.pk for index, recipe, related in entries
+            if name in related
+        ]
+        replaced = through.objects.filter(recipe_id__in=recipe_ids)
+        changed = set(replaced.values_list(column, flat=True))
+        replaced.delete()
+        links = [
+            through(recipe_id=recipe.pk, **{column: pk})
+            for index, recipe, related in entries
+            for pk in related.get(name, [])
+        ]
+        through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+        changed.update(getattr(link, column) for link in links)
+        refresh_recipe_counts(model, changed)
+        changed_ids[name] = changed
+    return changed_ids
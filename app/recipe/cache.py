@@ -0,0 +1,79 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core import metrics
+
+
+class ListCache:
+    """
+    Per-user cache of list responses.
+
+    Entries are keyed on the CollectionVersion of the list, read once by
+    the view before it queries the list. Writes bump that version in the
+    database, so every process stops reading the entries of the previous
+    version at once and they simply expire.
+    """
+
+    def __init__(self, alias="default", timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def entry_key(self, collection, user_id, version, path):
+        """
+        version is the (version, updated_at) pair of core.versions, the
+        timestamp keeps a reused user id off the lists of a deleted user
+        """
+        number, updated_at = version
+        digest = hashlib.md5(path.encode("utf-8")).hexdigest()
+        return (
+            f"recipe:{collection}:list:{user_id}:{number}:"
+            f"{updated_at.timestamp()}:{digest}"
+        )
+
+    def get(self, collection, user_id, version, path):
+        data = self.cache.get(
+            self.entry_key(collection, user_id, version, path)
+        )
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.LIST_CACHE_REQUESTS.inc(
+            collection=collection,
+            result="miss" if data is None else "hit"
+        )
+        return data
+
+    def set(self, collection, user_id, version, path, data):
+        self.cache.set(
+            self.entry_key(collection, user_id, version, path),
+            data,
+            timeout=self.timeout
+        )
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+list_cache = ListCache(
+    alias=getattr(settings, "RECIPE_LIST_CACHE_ALIAS", "default"),
+    timeout=getattr(settings, "RECIPE_LIST_CACHE_TIMEOUT", 300)
+)
@@ -0,0 +1,98 @@
+import csv
+import json
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+
+from core import models
+from core.importer import LIST_SEPARATOR
+
+
+CHUNK_SIZE = getattr(settings, "RECIPE_EXPORT_CHUNK_SIZE", 500)
+FIELDS = ["id", "title", "time_minutes", "price", "link", "tags",
+          "ingredients"]
+# Same separator the import_recipes command reads
+CSV_LIST_SEPARATOR = LIST_SEPARATOR
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of recipes read through a server side cursor, with the
+    tag and ingredient names of each chunk prefetched in two queries.
+    Only one chunk is held in memory at a time.
+    """
+    # iterator() ignores prefetch_related, relations are fetched by hand
+    names = [
+        Prefetch(relation, queryset=model.objects.only("id", "name"))
+        for relation, model in (
+            ("tags", models.Tag),
+            ("ingredients", models.Ingredient)
+        )
+    ]
+    chunk = []
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            prefetch_related_objects(chunk, *names)
+            yield chunk
+            chunk = []
+    if chunk:
+        prefetch_related_objects(chunk, *names)
+        yield chunk
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    for chunk in iter_chunks(queryset, chunk_size):
+        for recipe in chunk:
+            yield {
+                "id": recipe.id,
+                "title": recipe.title,
+                "time_minutes": recipe.time_minutes,
+                "price": str(recipe.price),
+                "link": recipe.link,
+                "tags": [tag.name for tag in recipe.tags.all()],
+                "ingredients": [
+                    ingredient.name
+                    for ingredient in recipe.ingredients.all()
+                ],
+            }
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+class Echo:
+    """
+    File-like object handing back what csv.writer writes to it
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        row["tags"] = CSV_LIST_SEPARATOR.join(row["tags"])
+        row["ingredients"] = CSV_LIST_SEPARATOR.join(row["ingredients"])
+        yield writer.writerow([row[field] for field in FIELDS])
+
+
+def stream(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """
+    Return an iterator of encoded lines of the export
+    """
+    rows = iter_rows(queryset, chunk_size)
+    if export_format == "ndjson":
+        lines = ndjson_lines(rows)
+    else:
+        lines = csv_lines(rows)
+    return (line.encode("utf-8") for line in lines)
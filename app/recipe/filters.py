@@ -0,0 +1,117 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Exists, F, FloatField, OuterRef, Q
+from django.db.models.functions import Cast
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+from core import models
+from core.search import SEARCH_CONFIG
+
+
+class RecipeFilter:
+    """
+    Filter recipes by comma separated tag and ingredient ids.
+
+    Every relation is matched with an ``EXISTS`` semi-join on its through
+    table rather than a join, so a recipe is returned once however many
+    of the ids it carries. ``<relation>_match=all`` only keeps recipes
+    linked to every given id, the default ``any`` keeps recipes linked to
+    at least one of them.
+    """
+    relations = {
+        "tags": (models.Recipe.tags.through, "tag_id"),
+        "ingredients": (models.Recipe.ingredients.through, "ingredient_id"),
+    }
+    match_modes = ("any", "all")
+
+    def __init__(self, query_params):
+        self.query_params = query_params
+
+    def filter_queryset(self, queryset):
+        for param, (through, column) in self.relations.items():
+            ids = self.get_ids(param)
+            if not ids:
+                continue
+            if self.get_match_mode(param) == "all":
+                for pk in ids:
+                    queryset = queryset.filter(
+                        self.exists(through, **{column: pk})
+                    )
+            else:
+                queryset = queryset.filter(
+                    self.exists(through, **{f"{column}__in": ids})
+                )
+        return queryset
+
+    def exists(self, through, **lookups):
+        return Exists(
+            through.objects.filter(recipe_id=OuterRef("pk"), **lookups)
+        )
+
+    def get_ids(self, param):
+        value = self.query_params.get(param)
+        if not value:
+            return []
+        try:
+            ids = {int(item) for item in value.split(",") if item.strip()}
+        except ValueError:
+            raise ValidationError(
+                {param: _("Expected a comma separated list of ids.")}
+            )
+        return sorted(ids)
+
+    def get_match_mode(self, param):
+        mode = self.query_params.get(f"{param}_match", "any")
+        if mode not in self.match_modes:
+            raise ValidationError(
+                {f"{param}_match": _("Expected one of: any, all.")}
+            )
+        return mode
+
+
+class RecipeSearch:
+    """
+    Full text search over recipe titles and their tag and ingredient
+    names with the ``search`` query parameter.
+
+    On PostgreSQL the maintained ``search_vector`` column is matched
+    through its GIN index and results are annotated with a ``rank``.
+    Other databases fall back to unranked ``icontains`` matching.
+    """
+    search_param = "search"
+
+    def __init__(self, query_params):
+        self.terms = query_params.get(self.search_param, "").strip()
+        self.ranked = False
+
+    def filter_queryset(self, queryset):
+        if not self.terms:
+            return queryset
+
+        if connections[queryset.db].vendor == "postgresql":
+            query = SearchQuery(
+                self.terms,
+                config=SEARCH_CONFIG,
+                search_type="websearch"
+            )
+            self.ranked = True
+            # ts_rank returns a real, the rank of a pagination cursor only
+            # compares equal once read back as a double
+            return queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+            )
+
+        return queryset.filter(
+            Q(title__icontains=self.terms)
+            | Q(Exists(models.Tag.objects.filter(
+                recipe=OuterRef("pk"), name__icontains=self.terms
+            )))
+            | Q(Exists(models.Ingredient.objects.filter(
+                recipe=OuterRef("pk"), name__icontains=self.terms
+            )))
+        )
+
+    @property
+    def order_by(self):
+        return ("-rank",) if self.ranked else ()
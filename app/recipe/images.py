@@ -0,0 +1,158 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core import metrics
+from core import models
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = getattr(settings, "IMAGE_VARIANT_SIZES", {
+    "thumbnail": 160,
+    "small": 480,
+    "large": 1280,
+})
+VARIANT_FORMATS = {
+    "jpeg": {"format": "JPEG", "quality": 85, "optimize": True,
+             "progressive": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process wide image worker pool, started on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_WORKERS", 2),
+                thread_name_prefix="image-worker"
+            )
+        return _executor
+
+
+def submit(recipe):
+    """
+    Record a processing job for the current recipe image and hand it to
+    the worker pool once the surrounding transaction commits
+    """
+    job = models.ImageJob.objects.create(
+        recipe=recipe,
+        source=recipe.image.name
+    )
+    if getattr(settings, "IMAGE_JOBS_ASYNC", True):
+        transaction.on_commit(
+            lambda: get_executor().submit(run_job, job.pk)
+        )
+    else:
+        process_job(job.pk)
+    return job
+
+
+def run_job(job_id):
+    """
+    Worker thread entry point, worker threads own their DB connections
+    """
+    try:
+        process_job(job_id)
+    except Exception:
+        logger.exception("Image job %s crashed", job_id)
+    finally:
+        connections.close_all()
+
+
+def claim_job(job_id):
+    """
+    Move a pending job to processing, returns False if another worker
+    already took it
+    """
+    claimed = models.ImageJob.objects.filter(
+        pk=job_id,
+        status=models.ImageJob.PENDING
+    ).update(status=models.ImageJob.PROCESSING, started_at=timezone.now())
+    return claimed == 1
+
+
+def process_job(job_id):
+    if not claim_job(job_id):
+        return
+
+    job = models.ImageJob.objects.select_related("recipe").get(pk=job_id)
+    job.attempts += 1
+    recipe = job.recipe
+    with metrics.IMAGE_JOB_DURATION.time(outcome="skipped") as timer:
+        try:
+            if recipe.image.name == job.source:
+                build_variants(recipe)
+                timer.labels["outcome"] = "done"
+        except Exception as exc:
+            job.status = models.ImageJob.FAILED
+            job.error = str(exc)
+            timer.labels["outcome"] = "failed"
+            logger.warning("Image job %s failed: %s", job_id, exc)
+        else:
+            job.status = models.ImageJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "attempts", "finished_at"])
+
+
+def requeue_stale_jobs(timeout=timedelta(minutes=10)):
+    """
+    Return jobs left processing by a worker that died to the queue
+    """
+    return models.ImageJob.objects.filter(
+        status=models.ImageJob.PROCESSING,
+        started_at__lt=timezone.now() - timeout
+    ).update(status=models.ImageJob.PENDING)
+
+
+def render(image, size, options):
+    """
+    Encode a copy of image fitting in size x size, the encoder is not
+    given the source EXIF so metadata is dropped
+    """
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, **options)
+    return variant.size, buffer.getvalue()
+
+
+def build_variants(recipe):
+    with recipe.image.open("rb") as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+
+    rendered = [
+        (name, ext, *render(image, size, options))
+        for name, size in VARIANT_SIZES.items()
+        for ext, options in VARIANT_FORMATS.items()
+    ]
+
+    recipe.image_variants.all().delete()
+
+    for name, ext, (width, height), content in rendered:
+        variant = models.RecipeImageVariant(
+            recipe=recipe,
+            name=name,
+            format=ext,
+            width=width,
+            height=height
+        )
+        variant.image.save(f"{name}.{ext}", ContentFile(content), save=False)
+        variant.save()
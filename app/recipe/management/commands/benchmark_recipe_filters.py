@@ -0,0 +1,165 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+
+from core import models
+from recipe.filters import RecipeFilter
+
+
+BENCH_EMAIL = "filter-benchmark@localmachine.com"
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark recipe tag/ingredient filtering
+    against the former join based filters on a seeded dataset
+    """
+    help = "Benchmark recipe filtering on a seeded dataset"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=1000000)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--ingredients", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--limit", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded dataset for the next run"
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        user, created = get_user_model().objects.get_or_create(
+            email=BENCH_EMAIL
+        )
+        if created or not models.Recipe.objects.filter(user=user).exists():
+            self.seed(user, options)
+
+        tag_ids = list(
+            models.Tag.objects.filter(user=user).values_list("id", flat=True)
+        )
+        ingredient_ids = list(
+            models.Ingredient.objects.filter(user=user)
+            .values_list("id", flat=True)
+        )
+        scenarios = [
+            ("1 tag, any", {"tags": tag_ids[:1]}),
+            ("5 tags, any", {"tags": tag_ids[:5]}),
+            ("20 tags, any", {"tags": tag_ids[:20]}),
+            ("2 tags, all", {"tags": tag_ids[:2], "tags_match": "all"}),
+            ("5 tags + 5 ingredients", {
+                "tags": tag_ids[:5],
+                "ingredients": ingredient_ids[:5],
+            }),
+        ]
+
+        for name, params in scenarios:
+            queryset = models.Recipe.objects.filter(user=user)
+            legacy = self.legacy_queryset(queryset, params)
+            engine = RecipeFilter(self.query_dict(params)).filter_queryset(
+                queryset
+            )
+            self.stdout.write(name)
+            self.report("join", legacy, options)
+            self.report("exists", engine, options)
+
+        if not options["keep"]:
+            user.delete()
+
+    def seed(self, user, options):
+        self.stdout.write(f"Seeding {options['recipes']} recipes...")
+        started = time.perf_counter()
+        models.Tag.objects.bulk_create(
+            models.Tag(user=user, name=f"tag {i}")
+            for i in range(options["tags"])
+        )
+        models.Ingredient.objects.bulk_create(
+            models.Ingredient(user=user, name=f"ingredient {i}")
+            for i in range(options["ingredients"])
+        )
+        tag_ids = [tag.id for tag in models.Tag.objects.filter(user=user)]
+        ingredient_ids = [
+            ingredient.id
+            for ingredient in models.Ingredient.objects.filter(user=user)
+        ]
+
+        recipe_tags = models.Recipe.tags.through
+        recipe_ingredients = models.Recipe.ingredients.through
+        last_id = 0
+        remaining = options["recipes"]
+        while remaining > 0:
+            size = min(options["batch_size"], remaining)
+            models.Recipe.objects.bulk_create(
+                models.Recipe(
+                    user=user,
+                    title=f"recipe {i}",
+                    time_minutes=10,
+                    price=5
+                )
+                for i in range(size)
+            )
+            recipe_ids = list(
+                models.Recipe.objects.filter(user=user, id__gt=last_id)
+                .order_by("id").values_list("id", flat=True)
+            )
+            recipe_tags.objects.bulk_create(
+                recipe_tags(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(tag_ids, 3)
+            )
+            recipe_ingredients.objects.bulk_create(
+                recipe_ingredients(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(ingredient_ids, 6)
+            )
+            last_id = recipe_ids[-1]
+            remaining -= size
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Seeded in {elapsed:.1f}s")
+
+    def legacy_queryset(self, queryset, params):
+        if params.get("tags_match") == "all":
+            for pk in params["tags"]:
+                queryset = queryset.filter(tags__id=pk)
+        elif params.get("tags"):
+            queryset = queryset.filter(tags__id__in=params["tags"])
+        if params.get("ingredients"):
+            queryset = queryset.filter(
+                ingredients__id__in=params["ingredients"]
+            )
+        return queryset
+
+    def query_dict(self, params):
+        query = QueryDict(mutable=True)
+        for key, value in params.items():
+            if isinstance(value, list):
+                value = ",".join(str(pk) for pk in value)
+            query[key] = value
+        return query
+
+    def report(self, label, queryset, options):
+        queryset = queryset.order_by("-id")
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            page = list(
+                queryset.values_list("id", flat=True)[:options["limit"]]
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(
+            f"  {label:<7} median {statistics.median(timings):8.2f}ms  "
+            f"rows {queryset.count():>8}  "
+            f"page duplicates {len(page) - len(set(page))}"
+        )
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import models
+from recipe import images
+from recipe import uploads
+
+
+class Command(BaseCommand):
+    """
+    Django command to drain pending recipe image jobs, e.g. the ones
+    left behind by a restarted web process, and purge unfinished uploads
+    """
+    help = "Process pending recipe image jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new jobs"
+        )
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = images.requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale jobs")
+            purged = uploads.purge_stale_uploads()
+            if purged:
+                self.stdout.write(f"Purged {purged} unfinished uploads")
+
+            job_ids = list(
+                models.ImageJob.objects.filter(
+                    status=models.ImageJob.PENDING
+                ).order_by("id").values_list("id", flat=True)
+            )
+            for job_id in job_ids:
+                images.process_job(job_id)
+            if job_ids:
+                self.stdout.write(f"Processed {len(job_ids)} jobs")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
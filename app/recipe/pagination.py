@@ -0,0 +1,144 @@
+import json
+from base64 import b64decode, b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the view's ``get_order_by()`` fields.
+
+    The cursor holds the ordering values of the last row of a page and
+    the next page is fetched with a ``WHERE`` on those values instead of
+    an ``OFFSET``, so deep pages cost the same as the first one. The last
+    ordering field must be unique (``id``) to act as the tiebreaker.
+
+    Pagination is opt-in: it is only applied when the client sends
+    ``page_size`` or ``cursor``, otherwise the full list is returned.
+    """
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    default_page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.ordering = list(view.get_order_by())
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            position = self.clean_position(queryset, position)
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param in params:
+            try:
+                return _positive_int(
+                    params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        if self.cursor_query_param in params:
+            return self.default_page_size
+        return None
+
+    def clean_position(self, queryset, position):
+        """
+        Convert the cursor values to the types of their ordering fields,
+        a cursor crafted with other values is invalid
+        """
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            if value is None or isinstance(value, (dict, list)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(
+                    self.get_field(queryset, field.lstrip("-"))
+                    .to_python(value)
+                )
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def get_field(self, queryset, name):
+        """
+        Return the model field or the output field of the annotation an
+        ordering key refers to
+        """
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def get_keyset_filter(self, position):
+        """
+        Build ``(a, b) < (x, y)`` as ``a < x OR (a = x AND b < y)``,
+        honouring the direction of each ordering field
+        """
+        keyset = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition = Q(**{f"{name}__{lookup}": position[index]})
+            for prev_field, value in zip(self.ordering[:index], position):
+                condition &= Q(**{prev_field.lstrip("-"): value})
+            keyset |= condition
+        return keyset
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = [
+            getattr(last, field.lstrip("-")) for field in self.ordering
+        ]
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(position)
+        )
+        return replace_query_param(
+            url, self.page_size_query_param, self.page_size
+        )
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, default=str).encode("utf-8")
+        return b64encode(payload).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(b64decode(encoded.encode("ascii")))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
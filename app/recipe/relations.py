@@ -0,0 +1,63 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """
+    Resolve every primary key of a many relation with a single IN query
+    rather than one lookup per item, reporting all missing keys at once
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk = queryset.model._meta.pk
+        keys = []
+        for item in data:
+            if child.pk_field is not None:
+                item = child.pk_field.to_internal_value(item)
+            try:
+                if isinstance(item, bool):
+                    raise ValueError(item)
+                keys.append(pk.to_python(item))
+            except (DjangoValidationError, TypeError, ValueError):
+                child.fail("incorrect_type", data_type=type(item).__name__)
+        if not keys:
+            return []
+
+        objects = queryset.in_bulk(keys)
+        missing = [key for key in dict.fromkeys(keys) if key not in objects]
+        if missing:
+            raise serializers.ValidationError([
+                child.error_messages["does_not_exist"].format(pk_value=key)
+                for key in missing
+            ], code="does_not_exist")
+        return [objects[key] for key in keys]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key relation limited to objects owned by the requesting user,
+    with ``many=True`` the keys are resolved in one query
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get("request")
+        if request is None:
+            return queryset.none()
+        return queryset.filter(user=request.user)
@@ -1,8 +1,35 @@
+from django.utils.translation import gettext_lazy
 from rest_framework import serializers
 from core import models
+from recipe.relations import UserPrimaryKeyRelatedField
 
 
-class TagSerializer(serializers.ModelSerializer):
+class UniqueNameMixin:
+    """
+    Names are unique per user, report a taken name as a validation error
+    """
+    name_taken_message = gettext_lazy("You already have one with this name.")
+
+    def get_owner_id(self):
+        if self.instance is not None:
+            return self.instance.user_id
+        request = self.context.get("request")
+        return getattr(getattr(request, "user", None), "pk", None)
+
+    def validate_name(self, value):
+        owner_id = self.get_owner_id()
+        if owner_id is None:
+            # Nobody to compare with, the unique constraint still applies
+            return value
+        queryset = self.Meta.model.objects.filter(user=owner_id, name=value)
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(self.name_taken_message)
+        return value
+
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """
     Serializer for tag object
     """
@@ -10,9 +37,10 @@ class TagSerializer(serializers.ModelSerializer):
         model = models.Tag
         fields = [
             'id',
-            'name'
+            'name',
+            'recipe_count'
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'recipe_count']
 
     def create(self, validated_data):
         user = self.context.get("request").user
@@ -20,7 +48,7 @@ class TagSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """
     Serializer for ingradients object
     """
@@ -28,9 +56,10 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = models.Ingredient
         fields = [
             'id',
-            'name'
+            'name',
+            'recipe_count'
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'recipe_count']
 
     def create(self, validated_data):
         user = self.context.get("request").user
@@ -42,11 +71,11 @@ class RecipeSerializer(serializers.ModelSerializer):
     """
     Serializer for recipe object
     """
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset=models.Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset=models.Tag.objects.all()
     )
@@ -70,11 +99,60 @@ class RecipeSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class RecipeBulkItemSerializer(RecipeSerializer):
+    """
+    Serializer for one recipe of a bulk write, related ids are checked
+    for the whole batch at once rather than one query per id
+    """
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        read_only_fields = []
+
+
+class RecipeImageVariantSerializer(serializers.ModelSerializer):
+    """
+    Serializer for processed recipe image variants
+    """
+    class Meta:
+        model = models.RecipeImageVariant
+        fields = [
+            "name", "format", "width", "height", "image"
+        ]
+        read_only_fields = fields
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
+    image_status = serializers.SerializerMethodField()
+    image_variants = RecipeImageVariantSerializer(many=True, read_only=True)
 
     class Meta:
         model = models.Recipe
         fields = [
-            "id", "image"
+            "id", "image", "image_status", "image_variants"
         ]
         read_only_fields = ["id"]
+
+    def get_image_status(self, recipe):
+        job = recipe.image_jobs.order_by("-id").first()
+        return job.status if job else None
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for resumable image uploads
+    """
+    class Meta:
+        model = models.ImageUpload
+        fields = [
+            "id", "file_name", "size", "offset"
+        ]
+        read_only_fields = ["id", "offset"]
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db.models import Prefetch
+
+from core import models
+from recipe import serializers
+
+
+BATCH_SIZE = getattr(settings, "RECIPE_SYNC_BATCH_SIZE", 500)
+
+COLLECTIONS = [
+    ("recipes", models.Recipe, serializers.RecipeSerializer),
+    ("tags", models.Tag, serializers.TagSerializer),
+    ("ingredients", models.Ingredient, serializers.IngredientSerializer),
+]
+
+
+def changes_since(user, cursor, limit=BATCH_SIZE, context=None):
+    """
+    Return the recipes, tags and ingredients of user changed after the
+    change log entry ``cursor``, reading at most ``limit`` entries.
+
+    Objects written several times in the batch are sent once with their
+    current data. Deleted objects, and objects already gone when the
+    batch is read, are listed by id under ``deleted``. The returned
+    ``cursor`` is passed back to read the next batch, ``more`` tells
+    whether one is waiting.
+    """
+    entries = list(
+        models.Change.objects.filter(user=user, id__gt=cursor)
+        .order_by("id")
+        .values_list("id", "collection", "object_id", "deleted")[:limit + 1]
+    )
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for _id, collection, object_id, deleted in entries:
+        latest.pop((collection, object_id), None)
+        latest[(collection, object_id)] = deleted
+
+    data = {
+        "cursor": entries[-1][0] if entries else cursor,
+        "more": more,
+    }
+    for collection, model, serializer_class in COLLECTIONS:
+        updated = [
+            object_id for (name, object_id), deleted in latest.items()
+            if name == collection and not deleted
+        ]
+        deleted = [
+            object_id for (name, object_id), deleted in latest.items()
+            if name == collection and deleted
+        ]
+        objects = get_queryset(model).filter(user=user).in_bulk(updated)
+        data[collection] = {
+            "updated": serializer_class(
+                [objects[pk] for pk in updated if pk in objects],
+                many=True,
+                context=context
+            ).data,
+            "deleted": deleted + [pk for pk in updated if pk not in objects],
+        }
+    return data
+
+
+def get_queryset(model):
+    if model is not models.Recipe:
+        return model.objects.all()
+    return model.objects.defer("search_vector").prefetch_related(*[
+        Prefetch(relation, queryset=related.objects.only("id"))
+        for relation, related in (
+            ("tags", models.Tag),
+            ("ingredients", models.Ingredient)
+        )
+    ])
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import include, path, resolve, reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe, Tag
+from recipe import async_views
+from recipe import urls
+
+
+urlpatterns = [
+    path("api/recipe/", include(
+        (async_views.urlpatterns + urls.urlpatterns, urls.app_name)
+    )),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, IMAGE_JOBS_ASYNC=False)
+class AsyncViewTests(TransactionTestCase):
+    """
+    Test the async variants of the recipe API views. Their queries run in
+    pool threads with their own connections, so data has to be committed.
+    """
+
+    def setUp(self):
+        # Persistent connections of the idle pool threads would outlive
+        # the tests and keep the test database from being dropped. Not a
+        # class decorator, it does not wrap async tests before Python 3.10
+        connections_patch = mock.patch.dict(
+            connections.databases["default"], CONN_MAX_AGE=0
+        )
+        connections_patch.start()
+        self.addCleanup(connections_patch.stop)
+        self.user = get_user_model().objects.create_user(
+            "nazrul@localmachine.com",
+            "test12345"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Khichuri", time_minutes=30, price=2
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        for variant in self.recipe.image_variants.all():
+            variant.image.delete()
+        self.recipe.image.delete()
+
+    def headers(self):
+        return {"authorization": f"Token {self.token.key}"}
+
+    async def test_routes_async(self):
+        """
+        Test the list and upload routes resolve to coroutine functions
+        """
+        for url in (
+            reverse("recipe:tag-list"),
+            reverse("recipe:ingredient-list"),
+            reverse("recipe:recipe-list"),
+            reverse("recipe:recipe-upload-image", args=[self.recipe.id]),
+        ):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+
+    async def test_create_and_list_tags(self):
+        """
+        Test tags created and listed through the async views
+        """
+        url = reverse("recipe:tag-list")
+
+        res = await self.async_client.post(
+            url, {"name": "Dinner"}, content_type="application/json",
+            **self.headers()
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = await self.async_client.get(url, **self.headers())
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag["name"] for tag in res.json()], ["Dinner"])
+        self.assertTrue(
+            await sync_to_async(Tag.objects.filter(name="Dinner").exists)()
+        )
+
+    async def test_authentication_required(self):
+        """
+        Test the async views keep the viewset permissions
+        """
+        res = await self.async_client.get(reverse("recipe:recipe-list"))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(REQUEST_SAMPLE_RATE=1)
+    async def test_pool_queries_recorded(self):
+        """
+        Test queries run in the thread pool are counted for the request
+        """
+        res = await self.async_client.get(
+            reverse("recipe:recipe-list"), **self.headers()
+        )
+
+        self.assertRegex(res["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+    def test_upload_image(self):
+        """
+        Test an image uploaded through the async view is stored
+        """
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, format="PNG")
+        image = SimpleUploadedFile("sample.png", buffer.getvalue())
+
+        # The Django 3.1 async test client fails multipart bodies, the
+        # sync one still calls the async view
+        res = self.client.post(
+            reverse("recipe:recipe-upload-image", args=[self.recipe.id]),
+            {"image": image},
+            HTTP_AUTHORIZATION=f"Token {self.token.key}"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith(".png"))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    async def test_export_streamed(self):
+        """
+        Test the export is streamed through the ASGI application, which
+        reads the rows of the response away from the event loop
+        """
+        # Keep the defaults it sets out of the other tests
+        with mock.patch.dict(os.environ):
+            from recipe_backend.asgi import application
+        url = reverse("recipe:recipe-export", args=["ndjson"])
+        communicator = ApplicationCommunicator(application, {
+            "type": "http",
+            "method": "GET",
+            "path": url,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Token {self.token.key}".encode()),
+            ],
+        })
+        await communicator.send_input({"type": "http.request"})
+
+        start = await communicator.receive_output(timeout=5)
+        body = b""
+        while True:
+            message = await communicator.receive_output(timeout=5)
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        self.assertEqual(start["status"], status.HTTP_200_OK)
+        self.assertEqual(
+            [json.loads(line)["title"] for line in body.splitlines()],
+            ["Khichuri"]
+        )
@@ -0,0 +1,162 @@
+import time
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import counters
+from core.models import Recipe, Tag
+from .test_recipe_api import (
+    sample_user,
+    sample_recipe,
+    sample_tag,
+    sample_ingredient
+)
+
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENT_URL = reverse("recipe:ingredient-list")
+
+
+class ConditionalListTests(TestCase):
+    """
+    Test lists answer conditional requests from the collection version
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url, etag, params=None):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_list_not_modified(self):
+        """
+        Test a list that did not change is answered with 304
+        """
+        sample_tag(user=self.user, name="Vegan")
+        res = self.client.get(TAGS_URL)
+        self.assertTrue(res.has_header("ETag"))
+        self.assertFalse(res.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            res = self.revalidate(TAGS_URL, res["ETag"])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+        self.assertTrue(res.has_header("ETag"))
+
+    def test_if_modified_since_ignored(self):
+        """
+        Test a date, one second precise, cannot hide a write made in the
+        second of the previous request
+        """
+        self.client.get(INGREDIENT_URL)
+        sample_ingredient(user=self.user, name="Salt")
+
+        res = self.client.get(
+            INGREDIENT_URL,
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_write_changes_etag(self):
+        """
+        Test creating and deleting tags changes the tag list ETag only
+        """
+        etag = self.client.get(TAGS_URL)["ETag"]
+        recipe_etag = self.client.get(RECIPE_URL)["ETag"]
+
+        tag = sample_tag(user=self.user, name="Vegan")
+        res = self.revalidate(TAGS_URL, etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(
+            self.revalidate(RECIPE_URL, recipe_etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        tag.delete()
+        res = self.revalidate(TAGS_URL, res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_relation_change_changes_etag(self):
+        """
+        Test linking an ingredient changes recipe and ingredient lists
+        """
+        recipe = sample_recipe(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        recipe_etag = self.client.get(RECIPE_URL)["ETag"]
+        ingredient_etag = self.client.get(INGREDIENT_URL)["ETag"]
+
+        recipe.ingredients.add(ingredient)
+
+        res = self.revalidate(RECIPE_URL, recipe_etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["ingredients"], [ingredient.id])
+        res = self.revalidate(INGREDIENT_URL, ingredient_etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_reconciled_counts_change_etag(self):
+        """
+        Test fixing drifted recipe counts changes the tag list ETag
+        """
+        tag = sample_tag(user=self.user)
+        Tag.objects.filter(pk=tag.pk).update(recipe_count=5)
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        counters.reconcile_recipe_counts(Tag)
+
+        res = self.revalidate(TAGS_URL, etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["recipe_count"], 0)
+
+    def test_etag_depends_on_query_and_user(self):
+        """
+        Test filtered lists and other users get their own ETags
+        """
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        res = self.revalidate(RECIPE_URL, etag, {"tags": "1"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        other = sample_user(email="test@localmachine.com")
+        self.client.force_authenticate(other)
+        res = self.revalidate(RECIPE_URL, etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_other_users_writes_ignored(self):
+        """
+        Test writes of another user keep the list not modified
+        """
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        sample_recipe(user=sample_user(email="test@localmachine.com"))
+
+        res = self.revalidate(RECIPE_URL, etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_relation_change_touches_recipe(self):
+        """
+        Test recipes record when their tags changed
+        """
+        recipe = sample_recipe(user=self.user)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            updated_at="2000-01-01T00:00:00Z"
+        )
+
+        sample_tag(user=self.user).recipe_set.add(recipe)
+
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated_at.year, 2000)
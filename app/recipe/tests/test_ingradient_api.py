@@ -38,8 +38,11 @@ class PrivateIngradientsApiTest(TestCase):
     """
     Test the authorize user Indradients api
     """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
     def setUp(self):
-        self.user = sample_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import mixins, status
+from rest_framework.test import APIClient
+
+from recipe.cache import list_cache
+
+from .test_recipe_api import (
+    sample_user,
+    sample_recipe,
+    sample_tag,
+    sample_ingredient
+)
+
+
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENT_URL = reverse("recipe:ingredient-list")
+
+
+@override_settings(RECIPE_LIST_CACHE=True)
+class ListCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """
+        Test a repeated list only looks up the collection version
+        """
+        sample_tag(user=self.user, name="Vegan")
+        self.client.get(TAGS_URL)
+        stats = list_cache.stats()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(res.data[0]["name"], "Vegan")
+        self.assertEqual(list_cache.stats()["hits"], stats["hits"] + 1)
+
+    def test_create_invalidates_list(self):
+        """
+        Test creating a tag through the api is visible right away
+        """
+        self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {"name": "Dessert"})
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual([tag["name"] for tag in res.data], ["Dessert"])
+
+    def test_recipe_relation_invalidates_assigned_only(self):
+        """
+        Test assigning an ingredient to a recipe refreshes assigned_only
+        """
+        ingredient = sample_ingredient(user=self.user, name="Salt")
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(INGREDIENT_URL, {"assigned_only": 1})
+        self.assertEqual(len(res.data), 0)
+
+        recipe.ingredients.add(ingredient)
+        res = self.client.get(INGREDIENT_URL, {"assigned_only": 1})
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_cache_limited_to_user(self):
+        """
+        Test cached lists are not shared between users
+        """
+        sample_tag(user=self.user, name="Vegan")
+        self.client.get(TAGS_URL)
+
+        user2 = sample_user(email="test@localmachine.com")
+        self.client.force_authenticate(user2)
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_write_during_list_not_cached_as_current(self):
+        """
+        Test a list read before a concurrent write is not served after it
+        """
+        list_view = mixins.ListModelMixin.list
+
+        def list_then_write(view, request, *args, **kwargs):
+            response = list_view(view, request, *args, **kwargs)
+            sample_tag(user=self.user, name="Late")
+            return response
+
+        with mock.patch.object(mixins.ListModelMixin, "list", list_then_write):
+            self.client.get(TAGS_URL)
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual([tag["name"] for tag in res.data], ["Late"])
+
+    @override_settings(RECIPE_LIST_CACHE=False)
+    def test_cache_disabled(self):
+        """
+        Test lists are not cached without a shared cache backend
+        """
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertFalse(res.has_header("X-Cache"))
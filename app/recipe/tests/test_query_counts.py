@@ -0,0 +1,189 @@
+import itertools
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Recipe
+from recipe import export
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .test_recipe_api import (
+    sample_user,
+    sample_recipe,
+    sample_tag,
+    sample_ingredient
+)
+
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENT_URL = reverse("recipe:ingredient-list")
+
+
+class QueryCountMixin:
+    """
+    Assert a list endpoint runs a fixed number of queries
+    whatever the number of rows it returns
+    """
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, create_row, params=None):
+        create_row()
+        baseline = self.count_queries(url, params)
+        for _ in range(10):
+            create_row()
+
+        self.assertEqual(self.count_queries(url, params), baseline)
+        return baseline
+
+
+class ListQueryCountTests(QueryCountMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.names = itertools.count()
+
+    def name(self):
+        """
+        Tag and ingredient names are unique per user
+        """
+        return f"Name {next(self.names)}"
+
+    def create_recipe(self):
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user, name=self.name()))
+        recipe.ingredients.add(
+            sample_ingredient(user=self.user, name=self.name())
+        )
+        return recipe
+
+    def test_recipe_list_queries_constant(self):
+        """
+        Test listing recipies prefetches tags and ingredients
+        """
+        queries = self.assertConstantQueries(RECIPE_URL, self.create_recipe)
+        # Collection version, recipes, tags and ingredients
+        self.assertEqual(queries, 4)
+
+    def test_recipe_list_paginated_queries_constant(self):
+        """
+        Test a recipe page costs the same as a full list
+        """
+        self.assertConstantQueries(
+            RECIPE_URL,
+            self.create_recipe,
+            {"page_size": 5}
+        )
+
+    def test_recipe_list_filtered_queries_constant(self):
+        """
+        Test filtering recipies keeps the query count fixed
+        """
+        tag = sample_tag(user=self.user, name="Vegan")
+
+        def create_row():
+            self.create_recipe().tags.add(tag)
+
+        self.assertConstantQueries(RECIPE_URL, create_row, {"tags": tag.id})
+
+    def test_tag_list_queries_constant(self):
+        """
+        Test listing tags runs the version lookup and one query
+        """
+        queries = self.assertConstantQueries(
+            TAGS_URL,
+            lambda: sample_tag(user=self.user, name=self.name())
+        )
+        self.assertEqual(queries, 2)
+
+    def test_ingredient_list_queries_constant(self):
+        """
+        Test listing ingredients runs the version lookup and one query
+        """
+        queries = self.assertConstantQueries(
+            INGREDIENT_URL,
+            lambda: sample_ingredient(user=self.user, name=self.name())
+        )
+        self.assertEqual(queries, 2)
+
+
+class RelatedIdsQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe_queries(self, count):
+        tags = [sample_tag(user=self.user, name=f"Tag {count}.{i}")
+                for i in range(count)]
+        ingredients = [
+            sample_ingredient(user=self.user, name=f"Item {count}.{i}")
+            for i in range(count)
+        ]
+        payload = {
+            "title": "Stew",
+            "time_minutes": 60,
+            "price": "9.00",
+            "tags": [tag.id for tag in tags],
+            "ingredients": [ingredient.id for ingredient in ingredients]
+        }
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return [
+            query["sql"] for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+
+    def test_related_ids_resolved_in_one_query(self):
+        """
+        Test tag and ingredient ids are looked up with one query each
+        whatever the number of ids
+        """
+        few = self.create_recipe_queries(1)
+        many = self.create_recipe_queries(40)
+
+        self.assertEqual(len(many), len(few))
+        lookups = [sql for sql in many if '"id" IN (' in sql]
+        self.assertEqual(len(lookups), 2)
+
+
+class ExportQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+        for i in range(5):
+            recipe = sample_recipe(user=cls.user, title=f"Recipe {i}")
+            recipe.tags.add(sample_tag(user=cls.user, name=f"Tag {i}"))
+
+    def test_export_prefetches_per_chunk(self):
+        """
+        Test each chunk of an export costs one query per relation
+        """
+        queryset = Recipe.objects.filter(user=self.user).order_by("id")
+
+        with CaptureQueriesContext(connection) as context:
+            rows = list(export.iter_rows(queryset, chunk_size=2))
+
+        self.assertEqual(len(rows), 5)
+        # The recipes, then tags and ingredients of each of three chunks
+        self.assertEqual(len(context.captured_queries), 1 + 3 * 2)
@@ -1,18 +1,35 @@
+import base64
+import csv
+import hashlib
+import json
 import tempfile
 import os
+from datetime import timedelta
+from io import BytesIO
+from unittest import skipUnless, mock
 from PIL import Image
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, Tag, Ingredient, ImageJob
 
+from recipe import export
+from recipe import images
+from recipe import uploads
 from recipe.serializers import RecipeSerializer
 
 RECIPE_URL = reverse("recipe:recipe-list")
+BULK_URL = reverse("recipe:recipe-bulk")
+
+
+def export_url(export_format):
+    return reverse("recipe:recipe-export", args=[export_format])
 
 
 def image_upload_url(recipe_id):
@@ -86,8 +103,11 @@ class PriveRecipeApiTest(TestCase):
     """
     Test the authorize user recipe api
     """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
     def setUp(self):
-        self.user = sample_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -119,6 +139,132 @@ class PriveRecipeApiTest(TestCase):
         self.assertEqual(len(res.data), 1)
         self.assertEqual(res.data[0].get("title"), recipe.title)
 
+    def test_retrieve_recipies_paginated(self):
+        """
+        Test recipies are paged with a keyset cursor when requested
+        """
+        recipies = [sample_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPE_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]],
+            [recipies[4].id, recipies[3].id]
+        )
+
+        seen = []
+        next_url = res.data["next"]
+        while next_url:
+            res = self.client.get(next_url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen.extend(item["id"] for item in res.data["results"])
+            next_url = res.data["next"]
+
+        self.assertEqual(seen, [recipies[2].id, recipies[1].id,
+                                recipies[0].id])
+
+    def test_retrieve_recipies_invalid_cursor(self):
+        """
+        Test an undecodable cursor is rejected
+        """
+        res = self.client.get(RECIPE_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_recipies_cursor_wrong_types(self):
+        """
+        Test a cursor whose values do not fit the ordering is rejected
+        """
+        for position in ([{"a": 1}], ["abc"], [None], [[1]]):
+            cursor = base64.b64encode(json.dumps(position).encode("utf-8"))
+
+            res = self.client.get(RECIPE_URL, {"cursor": cursor.decode()})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_recipies(self):
+        """
+        Test searching recipies by title, tag and ingredient names
+        """
+        recipe1 = sample_recipe(user=self.user, title="Thai vegetable curry")
+        recipe2 = sample_recipe(user=self.user, title="Beans on toast")
+        recipe3 = sample_recipe(user=self.user, title="Chicken tikka")
+        sample_recipe(user=self.user, title="Pancakes")
+        recipe2.tags.add(sample_tag(user=self.user, name="Curry night"))
+        recipe3.ingredients.add(
+            sample_ingredient(user=self.user, name="Curry paste")
+        )
+
+        res = self.client.get(RECIPE_URL, {"search": "curry"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item["id"] for item in res.data},
+            {recipe1.id, recipe2.id, recipe3.id}
+        )
+
+    def test_search_recipies_limited_to_user(self):
+        """
+        Test searching does not leak other users recipies
+        """
+        user2 = sample_user(email="test@localmachine.com")
+        sample_recipe(user=user2, title="Thai vegetable curry")
+
+        res = self.client.get(RECIPE_URL, {"search": "curry"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 0)
+
+    @skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL")
+    def test_search_recipies_ranked(self):
+        """
+        Test title matches rank above ingredient matches and the vector
+        follows tag renames
+        """
+        recipe1 = sample_recipe(user=self.user, title="Beans on toast")
+        recipe2 = sample_recipe(user=self.user, title="Curry")
+        recipe1.ingredients.add(
+            sample_ingredient(user=self.user, name="Curry powder")
+        )
+        tag = sample_tag(user=self.user, name="Breakfast")
+        recipe1.tags.add(tag)
+
+        res = self.client.get(RECIPE_URL, {"search": "curry"})
+        self.assertEqual(
+            [item["id"] for item in res.data],
+            [recipe2.id, recipe1.id]
+        )
+
+        tag.name = "Brunch"
+        tag.save()
+        res = self.client.get(RECIPE_URL, {"search": "brunch"})
+        self.assertEqual([item["id"] for item in res.data], [recipe1.id])
+
+    def test_search_recipies_paginated(self):
+        """
+        Test ranked search results are paged without skipping or
+        repeating recipies, whatever their rank
+        """
+        recipies = [
+            sample_recipe(user=self.user, title="Curry " * count + "rice")
+            for count in (1, 1, 2, 2, 3, 1, 2)
+        ]
+
+        res = self.client.get(RECIPE_URL, {"search": "curry"})
+        expected = [item["id"] for item in res.data]
+        seen = []
+        next_url = RECIPE_URL + "?search=curry&page_size=2"
+        while next_url:
+            res = self.client.get(next_url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen.extend(item["id"] for item in res.data["results"])
+            self.assertLessEqual(len(seen), len(expected))
+            next_url = res.data["next"]
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(sorted(seen), sorted(r.id for r in recipies))
+
     def test_recipe_create_successful(self):
         """
         Test creating a new recipe
@@ -146,6 +292,66 @@ class PriveRecipeApiTest(TestCase):
         res = self.client.post(RECIPE_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_recipe_create_with_tags_and_ingredients(self):
+        """
+        Test creating a recipe with related tags and ingredients
+        """
+        tag1 = sample_tag(user=self.user, name="Vegan")
+        tag2 = sample_tag(user=self.user, name="Dinner")
+        ingredient = sample_ingredient(user=self.user, name="Tofu")
+        payload = {
+            "title": "Tofu curry",
+            "time_minutes": 30,
+            "price": "7.00",
+            "tags": [tag2.id, tag1.id],
+            "ingredients": [ingredient.id]
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(pk=res.data["id"])
+        self.assertCountEqual(recipe.tags.all(), [tag1, tag2])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_recipe_create_reports_all_missing_ids(self):
+        """
+        Test every unknown or foreign tag id is reported at once
+        """
+        own = sample_tag(user=self.user)
+        other = sample_tag(user=sample_user(email="test@localmachine.com"))
+        payload = {
+            "title": "Chai",
+            "time_minutes": 5,
+            "price": "1.00",
+            "tags": [own.id, other.id, 999999],
+            "ingredients": []
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data["tags"]), 2)
+        self.assertIn(str(other.id), res.data["tags"][0])
+        self.assertIn("999999", res.data["tags"][1])
+
+    def test_recipe_create_invalid_tag_type(self):
+        """
+        Test related ids must be primary keys
+        """
+        payload = {
+            "title": "Chai",
+            "time_minutes": 5,
+            "price": "1.00",
+            "tags": ["vegan"],
+            "ingredients": []
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", res.data)
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -156,7 +362,230 @@ class RecipeImageUploadTests(TestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for variant in self.recipe.image_variants.all():
+            variant.image.delete()
         self.recipe.image.delete()
+        uploads.purge_stale_uploads(age=timedelta(0))
+
+    def sample_image_bytes(self, size=(10, 10)):
+        buffer = BytesIO()
+        Image.new('RGB', size).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def test_upload_image_stored_under_sniffed_extension(self):
+        """
+        Test the stored name follows the image content, not the file name
+        """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            ntf.write(self.sample_image_bytes())
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(self.recipe.image.name.endswith(".png"))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_upload_image_invalid_content(self):
+        """
+        Test bytes that are not an image are rejected and not kept
+        """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            ntf.write(b"definitely not an image" * 100)
+            ntf.seek(0)
+            with mock.patch("os.replace") as replace:
+                res = self.client.post(
+                    url, {"image": ntf}, format="multipart"
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        replace.assert_not_called()
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_upload_large_webp(self):
+        """
+        Test a WebP image larger than the header limit is accepted
+        """
+        buffer = BytesIO()
+        Image.frombytes("RGB", (700, 700), os.urandom(700 * 700 * 3)).save(
+            buffer, format="WEBP", lossless=True
+        )
+        self.assertGreater(len(buffer.getvalue()), uploads.MAX_HEADER_BYTES)
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".webp") as ntf:
+            ntf.write(buffer.getvalue())
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(self.recipe.image.name.endswith(".webp"))
+
+    def test_webp_dimensions(self):
+        """
+        Test the size of lossy, lossless and extended WebP images is read
+        from their header
+        """
+        for mode, options in (
+            ("RGB", {"quality": 80}),
+            ("RGB", {"lossless": True}),
+            ("RGBA", {"quality": 80}),
+        ):
+            buffer = BytesIO()
+            Image.new(mode, (321, 123)).save(buffer, "WEBP", **options)
+            validator = uploads.ImageValidator()
+            for index in range(0, len(buffer.getvalue()), 7):
+                validator.feed(buffer.getvalue()[index:index + 7])
+            validator.finish()
+
+            self.assertEqual(validator.extension, "webp")
+            self.assertEqual(validator.dimensions, (321, 123))
+
+    @mock.patch("recipe.uploads.MAX_BYTES", 256)
+    def test_upload_image_too_large(self):
+        """
+        Test an image over the byte cap is rejected
+        """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            ntf.write(self.sample_image_bytes(size=(200, 200)) + b"0" * 512)
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_resumable_upload(self):
+        """
+        Test uploading an image in chunks with a resume and a finalize
+        """
+        content = self.sample_image_bytes(size=(50, 50))
+        start_url = reverse(
+            "recipe:recipe-image-upload-start", args=[self.recipe.id]
+        )
+        res = self.client.post(
+            start_url, {"file_name": "photo.png", "size": len(content)}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        upload_id = res.data["id"]
+        chunk_url = reverse(
+            "recipe:recipe-image-upload-chunk",
+            args=[self.recipe.id, upload_id]
+        )
+
+        half = len(content) // 2
+        res = self.client.patch(
+            chunk_url, content[:half],
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET="0"
+        )
+        self.assertEqual(res.data["offset"], half)
+
+        res = self.client.patch(
+            chunk_url, content[:half],
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET="0"
+        )
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        res = self.client.get(chunk_url)
+        res = self.client.patch(
+            chunk_url, content[res.data["offset"]:],
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(res.data["offset"])
+        )
+        self.assertEqual(res.data["offset"], len(content))
+
+        res = self.client.post(
+            reverse(
+                "recipe:recipe-image-upload-finalize",
+                args=[self.recipe.id, upload_id]
+            ),
+            {"sha256": hashlib.sha256(content).hexdigest()}
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        with open(self.recipe.image.path, "rb") as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_resumable_upload_checksum_mismatch(self):
+        """
+        Test finalizing with a wrong checksum is rejected
+        """
+        content = self.sample_image_bytes()
+        res = self.client.post(
+            reverse("recipe:recipe-image-upload-start", args=[self.recipe.id]),
+            {"file_name": "photo.png", "size": len(content)}
+        )
+        upload_id = res.data["id"]
+        self.client.patch(
+            reverse(
+                "recipe:recipe-image-upload-chunk",
+                args=[self.recipe.id, upload_id]
+            ),
+            content,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET="0"
+        )
+
+        res = self.client.post(
+            reverse(
+                "recipe:recipe-image-upload-finalize",
+                args=[self.recipe.id, upload_id]
+            ),
+            {"sha256": "0" * 64}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_process_uploaded_image(self):
+        """
+        Test processing builds metadata free variants of the image
+        """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.new('RGB', (800, 400))
+            exif = Image.Exif()
+            exif[0x010f] = "Test Camera"
+            img.save(ntf, format="JPEG", exif=exif)
+            ntf.seek(0)
+            self.client.post(url, {"image": ntf}, format="multipart")
+
+        job = ImageJob.objects.get(recipe=self.recipe)
+        images.process_job(job.id)
+
+        res = self.client.get(reverse(
+            "recipe:recipe-image", args=[self.recipe.id]
+        ))
+        self.assertEqual(res.data["image_status"], ImageJob.DONE)
+        variants = {
+            (item["name"], item["format"]): item
+            for item in res.data["image_variants"]
+        }
+        self.assertEqual(len(variants), 6)
+        self.assertEqual(variants["thumbnail", "jpeg"]["width"], 160)
+        self.assertEqual(variants["large", "webp"]["width"], 800)
+
+        variant = self.recipe.image_variants.get(name="small", format="jpeg")
+        with Image.open(variant.image.path) as processed:
+            self.assertEqual(processed.size, (480, 240))
+            self.assertFalse(processed.getexif())
+            self.assertTrue(processed.info.get("progressive"))
+
+    def test_process_superseded_image_skipped(self):
+        """
+        Test a job for an image that was replaced builds nothing
+        """
+        job = ImageJob.objects.create(recipe=self.recipe, source="old.jpg")
+
+        images.process_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.DONE)
+        self.assertFalse(self.recipe.image_variants.exists())
 
     def test_upload_image_to_recipe(self):
         """
@@ -172,8 +601,9 @@ class RecipeImageUploadTests(TestCase):
 
             self.recipe.refresh_from_db()
 
-            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
             self.assertIn('image', res.data)
+            self.assertEqual(res.data["image_status"], ImageJob.PENDING)
             self.assertTrue(os.path.exists(self.recipe.image.path))
 
     def test_upload_image_bad_request(self):
@@ -221,3 +651,265 @@ class RecipeImageUploadTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 2)
+
+    def test_filter_recipies_by_tags_no_duplicates(self):
+        """
+        Test a recipe matching several tags is returned once
+        """
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name="vegan")
+        tag2 = sample_tag(user=self.user, name="vegetarian")
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPE_URL, {"tags": f"{tag1.id},{tag2.id}"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in res.data], [recipe.id])
+
+    def test_filter_recipies_by_all_tags(self):
+        """
+        Test filtering recipies carrying every given tag
+        """
+        recipe1 = sample_recipe(user=self.user, title="Vegan curry")
+        recipe2 = sample_recipe(user=self.user, title="Vegan salad")
+        tag1 = sample_tag(user=self.user, name="vegan")
+        tag2 = sample_tag(user=self.user, name="spicy")
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        res = self.client.get(
+            RECIPE_URL,
+            {"tags": f"{tag1.id},{tag2.id}", "tags_match": "all"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in res.data], [recipe1.id])
+
+    def test_filter_recipies_by_tags_and_ingredients(self):
+        """
+        Test tag and ingredient filters are combined
+        """
+        recipe1 = sample_recipe(user=self.user, title="Chicken curry")
+        recipe2 = sample_recipe(user=self.user, title="Vegan curry")
+        tag = sample_tag(user=self.user, name="curry")
+        ingredient = sample_ingredient(user=self.user, name="Chicken")
+        recipe1.tags.add(tag)
+        recipe1.ingredients.add(ingredient)
+        recipe2.tags.add(tag)
+
+        res = self.client.get(
+            RECIPE_URL,
+            {"tags": tag.id, "ingredients": ingredient.id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in res.data], [recipe1.id])
+
+    def test_filter_recipies_invalid_ids(self):
+        """
+        Test filtering with malformed ids is a bad request
+        """
+        res = self.client.get(RECIPE_URL, {"tags": "1,vegan"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URL, {"tags": "1", "tags_match": "x"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeBulkApiTests(TestCase):
+    """
+    Test the bulk recipe endpoint
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """
+        Test creating several recipies with tags and ingredients
+        """
+        tag = sample_tag(user=self.user, name="vegan")
+        ingredient = sample_ingredient(user=self.user, name="Tofu")
+        payload = [
+            {"title": "Tofu curry", "time_minutes": 30, "price": "7.00",
+             "tags": [tag.id], "ingredients": [ingredient.id]},
+            {"title": "Toast", "time_minutes": 5, "price": "1.00"},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data["results"]
+        self.assertEqual([r["status"] for r in results], ["created"] * 2)
+        recipe = Recipe.objects.get(pk=results[0]["id"])
+        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_reports_item_errors(self):
+        """
+        Test invalid items are reported while the others are written
+        """
+        user2 = sample_user(email="test@localmachine.com")
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {"title": "", "time_minutes": 5, "price": "1.00"},
+            {"title": "Stolen tag", "time_minutes": 5, "price": "1.00",
+             "tags": [other_tag.id]},
+            {"title": "Fine", "time_minutes": 5, "price": "1.00"},
+            {"id": 999999, "title": "Missing"},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        results = res.data["results"]
+        self.assertIn("title", results[0]["errors"])
+        self.assertIn("tags", results[1]["errors"])
+        self.assertEqual(results[2]["status"], "created")
+        self.assertIn("id", results[3]["errors"])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_update(self):
+        """
+        Test updating recipies replaces the relations given
+        """
+        recipe = sample_recipe(user=self.user, title="Old title")
+        old_tag = sample_tag(user=self.user, name="old")
+        new_tag = sample_tag(user=self.user, name="new")
+        recipe.tags.add(old_tag)
+
+        res = self.client.post(BULK_URL, [
+            {"id": recipe.id, "title": "New title", "tags": [new_tag.id]}
+        ], format="json")
+
+        self.assertEqual(res.data["results"][0]["status"], "updated")
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "New title")
+        self.assertEqual(recipe.time_minutes, 10)
+        self.assertEqual(list(recipe.tags.all()), [new_tag])
+        old_tag.refresh_from_db()
+        new_tag.refresh_from_db()
+        self.assertEqual((old_tag.recipe_count, new_tag.recipe_count), (0, 1))
+
+    def test_bulk_update_other_users_recipe(self):
+        """
+        Test recipies of other users can not be updated
+        """
+        recipe = sample_recipe(user=sample_user(email="test@localmachine.com"))
+
+        res = self.client.post(BULK_URL, [
+            {"id": recipe.id, "title": "Hijacked"}
+        ], format="json")
+
+        self.assertIn("errors", res.data["results"][0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Sample Recipe")
+
+    def test_bulk_requires_list(self):
+        """
+        Test the payload must be a list within the size limit
+        """
+        res = self.client.post(BULK_URL, {"title": "x"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch("recipe.bulk.MAX_ITEMS", 1):
+            res = self.client.post(BULK_URL, [{}, {}], format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(
+        connection.features.can_return_rows_from_bulk_insert,
+        "Requires bulk insert returning primary keys"
+    )
+    def test_bulk_create_queries_constant(self):
+        """
+        Test the number of queries does not grow with the batch
+        """
+        tag = sample_tag(user=self.user)
+
+        def payload(count):
+            return [
+                {"title": f"Recipe {i}", "time_minutes": 5, "price": "1.00",
+                 "tags": [tag.id]}
+                for i in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, payload(2), format="json")
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(BULK_URL, payload(50), format="json")
+
+        self.assertEqual(len(large), len(small))
+
+
+class RecipeExportApiTests(TestCase):
+    """
+    Test streaming exports of recipies
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, export_format, params=None):
+        res = self.client.get(export_url(export_format), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    def test_export_ndjson(self):
+        """
+        Test every recipe of the user is exported as one JSON line
+        """
+        recipe = sample_recipe(user=self.user, title="Curry")
+        recipe.tags.add(sample_tag(user=self.user, name="Dinner"))
+        recipe.ingredients.add(sample_ingredient(user=self.user, name="Rice"))
+        sample_recipe(user=self.user, title="Toast")
+        sample_recipe(user=sample_user(email="test@localmachine.com"))
+
+        lines = self.export("ndjson").splitlines()
+
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["title"] for row in rows], ["Toast", "Curry"])
+        self.assertEqual(rows[1]["tags"], ["Dinner"])
+        self.assertEqual(rows[1]["ingredients"], ["Rice"])
+        self.assertEqual(rows[1]["price"], "5.00")
+
+    def test_export_csv(self):
+        """
+        Test recipies are exported as CSV with a header row
+        """
+        recipe = sample_recipe(user=self.user, title="Curry, hot")
+        recipe.tags.add(
+            sample_tag(user=self.user, name="Dinner"),
+            sample_tag(user=self.user, name="Spicy")
+        )
+
+        rows = list(csv.DictReader(self.export("csv").splitlines()))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], "Curry, hot")
+        self.assertEqual(
+            sorted(rows[0]["tags"].split(export.CSV_LIST_SEPARATOR)),
+            ["Dinner", "Spicy"]
+        )
+
+    def test_export_filtered(self):
+        """
+        Test the export honours the list filters
+        """
+        tag = sample_tag(user=self.user, name="Vegan")
+        recipe = sample_recipe(user=self.user, title="Salad")
+        recipe.tags.add(tag)
+        sample_recipe(user=self.user, title="Steak")
+
+        lines = self.export("ndjson", {"tags": tag.id}).splitlines()
+
+        self.assertEqual([json.loads(line)["id"] for line in lines],
+                         [recipe.id])
@@ -0,0 +1,176 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .test_recipe_api import (
+    BULK_URL,
+    sample_user,
+    sample_recipe,
+    sample_tag,
+    sample_ingredient
+)
+
+
+SYNC_URL = reverse("recipe:recipe-sync")
+
+
+def updated_ids(data, collection):
+    return [item["id"] for item in data[collection]["updated"]]
+
+
+class RecipeSyncApiTests(TestCase):
+    """
+    Test syncing the changes made after a client cursor
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, cursor=0, **params):
+        res = self.client.get(SYNC_URL, dict(params, cursor=cursor))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_sync_from_start(self):
+        """
+        Test the first sync returns every object of the user once
+        """
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        sample_recipe(user=sample_user(email="test@localmachine.com"))
+
+        data = self.sync()
+
+        self.assertFalse(data["more"])
+        self.assertEqual(updated_ids(data, "recipes"), [recipe.id])
+        self.assertEqual(data["recipes"]["updated"][0]["tags"], [tag.id])
+        self.assertEqual(updated_ids(data, "tags"), [tag.id])
+        self.assertEqual(data["tags"]["updated"][0]["recipe_count"], 1)
+        self.assertEqual(updated_ids(data, "ingredients"), [ingredient.id])
+        self.assertEqual(data["recipes"]["deleted"], [])
+
+        self.assertEqual(self.sync(data["cursor"])["recipes"]["updated"], [])
+
+    def test_sync_changes_since_cursor(self):
+        """
+        Test only objects written after the cursor are returned
+        """
+        sample_tag(user=self.user, name="Vegan")
+        recipe = sample_recipe(user=self.user)
+        cursor = self.sync()["cursor"]
+
+        recipe.title = "Curry"
+        recipe.save()
+        tag = sample_tag(user=self.user, name="Dinner")
+
+        data = self.sync(cursor)
+        self.assertEqual(data["recipes"]["updated"][0]["title"], "Curry")
+        self.assertEqual(updated_ids(data, "tags"), [tag.id])
+        self.assertGreater(data["cursor"], cursor)
+
+    def test_sync_deletes(self):
+        """
+        Test deleted objects are returned as tombstones with the objects
+        they changed
+        """
+        tag = sample_tag(user=self.user, name="Vegan")
+        recipe = sample_recipe(user=self.user)
+        other = sample_recipe(user=self.user, title="Curry")
+        recipe.tags.add(tag)
+        other.tags.add(tag)
+        cursor = self.sync()["cursor"]
+        recipe_id, tag_id = recipe.id, tag.id
+
+        recipe.delete()
+        data = self.sync(cursor)
+        self.assertEqual(data["recipes"]["deleted"], [recipe_id])
+        self.assertEqual(data["tags"]["updated"][0]["recipe_count"], 1)
+
+        tag.delete()
+        data = self.sync(data["cursor"])
+        self.assertEqual(data["tags"]["deleted"], [tag_id])
+        self.assertEqual(data["recipes"]["updated"][0]["id"], other.id)
+        self.assertEqual(data["recipes"]["updated"][0]["tags"], [])
+
+    def test_sync_batches(self):
+        """
+        Test paging through the changes in bounded batches
+        """
+        recipes = [
+            sample_recipe(user=self.user, title=str(number))
+            for number in range(5)
+        ]
+
+        ids = []
+        data = {"cursor": 0, "more": True}
+        while data["more"]:
+            data = self.sync(data["cursor"], limit=2)
+            self.assertLessEqual(len(updated_ids(data, "recipes")), 2)
+            ids.extend(updated_ids(data, "recipes"))
+
+        self.assertEqual(ids, [recipe.id for recipe in recipes])
+
+    def test_sync_object_deleted_later(self):
+        """
+        Test an object gone before its tombstone is read is reported
+        deleted
+        """
+        recipe = sample_recipe(user=self.user)
+        sample_recipe(user=self.user, title="Curry")
+        recipe_id = recipe.id
+        recipe.delete()
+
+        data = self.sync(limit=1)
+
+        self.assertTrue(data["more"])
+        self.assertEqual(data["recipes"]["updated"], [])
+        self.assertEqual(data["recipes"]["deleted"], [recipe_id])
+
+    def test_sync_bulk_writes(self):
+        """
+        Test recipes written by the bulk endpoint are synced
+        """
+        tag = sample_tag(user=self.user)
+        cursor = self.sync()["cursor"]
+
+        res = self.client.post(
+            BULK_URL,
+            [{"title": "Curry", "time_minutes": 5, "price": "1.00",
+              "tags": [tag.id]}],
+            format="json"
+        )
+
+        data = self.sync(cursor)
+        self.assertEqual(
+            updated_ids(data, "recipes"), [res.data["results"][0]["id"]]
+        )
+        self.assertEqual(data["tags"]["updated"][0]["recipe_count"], 1)
+
+    def test_sync_queries(self):
+        """
+        Test a sync batch costs the same queries whatever its size
+        """
+        for number in range(5):
+            recipe = sample_recipe(user=self.user, title=str(number))
+            recipe.tags.add(sample_tag(user=self.user, name=str(number)))
+
+        with self.assertNumQueries(5):
+            self.sync()
+
+    def test_sync_invalid_cursor(self):
+        """
+        Test invalid cursors and limits are rejected
+        """
+        for params in ({"cursor": "abc"}, {"cursor": -1}, {"limit": 0}):
+            res = self.client.get(SYNC_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
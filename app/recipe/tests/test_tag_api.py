@@ -1,3 +1,5 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -37,8 +39,11 @@ class PrivateTagsApiTest(TestCase):
     """
     Test the authorize user tags api
     """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+
     def setUp(self):
-        self.user = sample_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
@@ -56,6 +61,25 @@ class PrivateTagsApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_retrieve_tags_paginated(self):
+        """
+        Test paging through tags returns every tag once in order
+        """
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ["Vegan", "Dessert", "Dinner", "Lunch", "Brunch"]
+        ]
+
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+        ids = [item["id"] for item in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            ids.extend(item["id"] for item in res.data["results"])
+
+        expected = Tag.objects.order_by("-name", "-id")
+        self.assertEqual(ids, [tag.id for tag in expected])
+        self.assertEqual(len(ids), len(tags))
+
     def test_tags_limited_to_user(self):
         """
         Test that tags are for authenticated user
@@ -95,6 +119,51 @@ class PrivateTagsApiTest(TestCase):
         res = self.client.post(TAGS_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_tags_create_duplicate_name(self):
+        """
+        Test tag names are unique per user
+        """
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(
+            user=sample_user(email="test@localmachine.com"),
+            name="Dinner"
+        )
+
+        res = self.client.post(TAGS_URL, {"name": "Vegan"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.data)
+
+        res = self.client.post(TAGS_URL, {"name": "Dinner"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_tags_create_duplicate_name_race(self):
+        """
+        Test a name taken after validation is still a validation error
+        """
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        with mock.patch.object(
+            TagSerializer, "validate_name", lambda serializer, value: value
+        ):
+            res = self.client.post(TAGS_URL, {"name": "Vegan"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.data)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_tag_serializer_without_request(self):
+        """
+        Test names validate without a request in the serializer context
+        """
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        self.assertTrue(TagSerializer(data={"name": "Vegan"}).is_valid())
+        serializer = TagSerializer(
+            Tag.objects.create(user=self.user, name="Dinner"),
+            data={"name": tag.name}
+        )
+        self.assertFalse(serializer.is_valid())
+
     def test_retrieve_tags_assigned_to_recipes(self):
         """
         Test tags are retrieved for recipies
@@ -116,3 +185,37 @@ class PrivateTagsApiTest(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 1)
+
+    def test_retrieve_tags_assigned_unique(self):
+        """
+        Test a tag used by several recipies is listed once
+        """
+        tag = sample_tag(user=self.user, name="Breakfast")
+        sample_tag(user=self.user, name="Lunch")
+        for title in ("Eggs", "Pancakes"):
+            sample_recipe(user=self.user, title=title).tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        self.assertEqual([item["id"] for item in res.data], [tag.id])
+
+    def test_retrieve_tags_by_popularity(self):
+        """
+        Test ordering tags by the number of recipies using them
+        """
+        rare = sample_tag(user=self.user, name="Rare")
+        common = sample_tag(user=self.user, name="Common")
+        unused = sample_tag(user=self.user, name="Unused")
+        for title in ("Eggs", "Pancakes"):
+            sample_recipe(user=self.user, title=title).tags.add(common)
+        sample_recipe(user=self.user, title="Toast").tags.add(rare)
+
+        res = self.client.get(TAGS_URL, {"ordering": "popularity"})
+
+        self.assertEqual(
+            [(item["id"], item["recipe_count"]) for item in res.data],
+            [(common.id, 2), (rare.id, 1), (unused.id, 0)]
+        )
+
+        res = self.client.get(TAGS_URL, {"ordering": "size"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
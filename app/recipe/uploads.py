@@ -0,0 +1,321 @@
+import hashlib
+import os
+import struct
+from datetime import timedelta
+
+from PIL import ImageFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from core import metrics
+from core import models
+from core.storage import recipe_image_storage
+
+
+MAX_BYTES = getattr(settings, "RECIPE_IMAGE_MAX_BYTES", 10 * 2 ** 20)
+MAX_DIMENSION = getattr(settings, "RECIPE_IMAGE_MAX_DIMENSION", 10000)
+# The image header has to show up within this many bytes
+MAX_HEADER_BYTES = 2 ** 20
+# RIFF header, first chunk header and the part of its data with the size
+WEBP_HEADER_BYTES = 30
+PARTIAL_UPLOAD_DIR = "uploads/recipe/partial/"
+
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+]
+
+
+class InvalidImage(MultiPartParserError):
+    """
+    Raised as soon as streamed bytes can not be an acceptable image,
+    DRF turns multipart parser errors into 400 responses
+    """
+
+
+def sniff_extension(head):
+    """
+    Return the file extension matching the image magic bytes
+    """
+    for magic, ext in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def webp_dimensions(head):
+    """
+    Read the canvas size from the first chunk of a WebP file. Pillow only
+    parses WebP once it has the whole file.
+    """
+    chunk, data = head[12:16], head[20:WEBP_HEADER_BYTES]
+    if chunk == b"VP8 " and data[3:6] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[6:10])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b"VP8L" and data[:1] == b"\x2f":
+        bits = int.from_bytes(data[1:5], "little")
+        return (bits & 0x3fff) + 1, (bits >> 14 & 0x3fff) + 1
+    if chunk == b"VP8X":
+        return (
+            int.from_bytes(data[4:7], "little") + 1,
+            int.from_bytes(data[7:10], "little") + 1
+        )
+    return None
+
+
+class ImageValidator:
+    """
+    Incrementally hash and validate image bytes as they arrive
+    """
+
+    def __init__(self, max_bytes=None, max_dimension=None):
+        self.max_bytes = max_bytes or MAX_BYTES
+        self.max_dimension = max_dimension or MAX_DIMENSION
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.extension = None
+        self.dimensions = None
+        self._head = b""
+        self._parser = ImageFile.Parser()
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise InvalidImage(
+                _("Image is larger than %(max)d bytes.")
+                % {"max": self.max_bytes}
+            )
+        self.sha256.update(chunk)
+
+        if len(self._head) < WEBP_HEADER_BYTES:
+            self._head += chunk[:WEBP_HEADER_BYTES - len(self._head)]
+        if self.extension is None:
+            if len(self._head) >= 12:
+                self.extension = sniff_extension(self._head)
+                if self.extension is None:
+                    raise InvalidImage(_("Upload a valid image."))
+
+        if self.dimensions is None:
+            self._feed_header(chunk)
+
+    def _feed_header(self, chunk):
+        if self.extension == "webp":
+            if len(self._head) >= WEBP_HEADER_BYTES:
+                self._set_dimensions(webp_dimensions(self._head))
+            return
+        try:
+            self._parser.feed(chunk)
+        except Exception:
+            raise InvalidImage(_("Upload a valid image."))
+        if self._parser.image is not None:
+            self._set_dimensions(self._parser.image.size)
+        elif self.size > MAX_HEADER_BYTES:
+            raise InvalidImage(_("Upload a valid image."))
+
+    def _set_dimensions(self, dimensions):
+        if dimensions is None or not all(dimensions):
+            raise InvalidImage(_("Upload a valid image."))
+        self.dimensions = dimensions
+        self._parser = None
+        if max(self.dimensions) > self.max_dimension:
+            raise InvalidImage(
+                _("Image is larger than %(max)d pixels.")
+                % {"max": self.max_dimension}
+            )
+
+    def finish(self):
+        if self.extension is None or self.dimensions is None:
+            raise InvalidImage(_("Upload a valid image."))
+        return self.sha256.hexdigest()
+
+
+class StoredImageFile(UploadedFile):
+    """
+    Uploaded image already written to its storage path
+    """
+
+    def __init__(self, stored_name, sha256, dimensions, **kwargs):
+        super().__init__(**kwargs)
+        self.stored_name = stored_name
+        self.sha256 = sha256
+        self.dimensions = dimensions
+
+    def close(self):
+        pass
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """
+    Stream the ``image`` field of a multipart request into the recipe
+    image storage, hashing and validating it chunk by chunk so a bad
+    upload is rejected early and nothing is buffered in memory. Once
+    complete the file is renamed in place to its content address.
+    """
+    image_field = "image"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.destination = None
+        self.partial_path = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # The whole body can not be larger than the image plus some room
+        # for the multipart envelope
+        if content_length > MAX_BYTES + 64 * 2 ** 10:
+            raise InvalidImage(
+                _("Image is larger than %(max)d bytes.") % {"max": MAX_BYTES}
+            )
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if field_name != self.image_field or self.destination is not None:
+            return
+        self.validator = ImageValidator()
+        self.partial_path = recipe_image_storage.temporary_path()
+        self.destination = open(self.partial_path, "xb")
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.is_receiving():
+            return None
+        try:
+            self.validator.feed(raw_data)
+        except InvalidImage:
+            self.discard()
+            raise
+        self.destination.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.is_receiving():
+            return None
+        try:
+            sha256 = self.validator.finish()
+        except InvalidImage:
+            self.discard()
+            raise
+        self.destination.close()
+
+        stored_name = recipe_image_storage.place(
+            self.partial_path, sha256, self.validator.extension
+        )
+        self.partial_path = None
+        metrics.UPLOAD_SIZE.observe(file_size, kind="form")
+        return StoredImageFile(
+            stored_name=stored_name,
+            sha256=sha256,
+            dimensions=self.validator.dimensions,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra
+        )
+
+    def is_receiving(self):
+        return (
+            self.field_name == self.image_field
+            and self.partial_path is not None
+        )
+
+    def discard(self):
+        """
+        Remove a partially written file, e.g. after an aborted request
+        """
+        if self.partial_path is not None:
+            self.destination.close()
+            os.remove(self.partial_path)
+            self.partial_path = None
+
+
+def partial_path(upload):
+    return recipe_image_storage.path(
+        os.path.join(PARTIAL_UPLOAD_DIR, f"{upload.id}.part")
+    )
+
+
+def start_upload(recipe, file_name, size):
+    """
+    Begin a resumable upload of an image for recipe
+    """
+    if size > MAX_BYTES:
+        raise InvalidImage(
+            _("Image is larger than %(max)d bytes.") % {"max": MAX_BYTES}
+        )
+    upload = models.ImageUpload.objects.create(
+        recipe=recipe,
+        file_name=file_name,
+        size=size
+    )
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "xb").close()
+    return upload
+
+
+def append_chunk(upload, stream, length, chunk_size=64 * 2 ** 10):
+    """
+    Append length bytes read from stream at the current upload offset
+    """
+    if upload.offset + length > upload.size:
+        raise InvalidImage(_("Chunk goes past the declared size."))
+    with open(partial_path(upload), "r+b") as destination:
+        destination.seek(upload.offset)
+        remaining = length
+        while remaining:
+            data = stream.read(min(chunk_size, remaining))
+            if not data:
+                break
+            destination.write(data)
+            remaining -= len(data)
+        destination.truncate()
+    upload.offset += length - remaining
+    upload.save(update_fields=["offset"])
+    return upload.offset
+
+
+def finish_upload(upload, sha256=None, chunk_size=64 * 2 ** 10):
+    """
+    Validate a complete upload and move it to its content address,
+    returns the storage name
+    """
+    if upload.offset != upload.size:
+        raise InvalidImage(_("Upload is incomplete."))
+
+    path = partial_path(upload)
+    validator = ImageValidator()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            validator.feed(chunk)
+    digest = validator.finish()
+    if sha256 and sha256.lower() != digest:
+        raise InvalidImage(_("Checksum does not match."))
+
+    stored_name = recipe_image_storage.place(
+        path, digest, validator.extension
+    )
+    upload.delete()
+    metrics.UPLOAD_SIZE.observe(upload.size, kind="resumable")
+    return stored_name
+
+
+def purge_stale_uploads(age=timedelta(days=1)):
+    """
+    Remove resumable uploads that were never finished
+    """
+    stale = list(models.ImageUpload.objects.filter(
+        created_at__lt=timezone.now() - age
+    ))
+    for upload in stale:
+        if os.path.exists(partial_path(upload)):
+            os.remove(partial_path(upload))
+        upload.delete()
+    return len(stale)
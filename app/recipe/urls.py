@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from recipe import async_views
 from recipe import views
 
 router = DefaultRouter()
@@ -13,3 +15,7 @@ app_name = "recipe"
 urlpatterns = [
     path("", include(router.urls)),
 ]
+
+if getattr(settings, "RECIPE_ASYNC_VIEWS", False):
+    # Resolved first, same paths and names as the viewset routes
+    urlpatterns = async_views.urlpatterns + urlpatterns
@@ -1,20 +1,89 @@
+import hashlib
+
 from rest_framework import viewsets, mixins, status
-from rest_framework import authentication
+from rest_framework import exceptions
 from rest_framework import permissions
 from rest_framework.decorators import action
+from rest_framework.pagination import _positive_int
+from rest_framework.relations import (
+    ManyRelatedField,
+    PrimaryKeyRelatedField,
+    RelatedField
+)
 from rest_framework.response import Response
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from django.utils.http import quote_etag
+from django.db.models import Prefetch
+from django.utils.translation import gettext as _
 from core import models
+from core import versions
+from core.authentication import CachedTokenAuthentication
 
 from recipe import serializers
+from recipe import bulk
+from recipe import export
+from recipe import filters
+from recipe import images
+from recipe import sync
+from recipe import uploads
+from recipe.cache import list_cache
+from recipe.pagination import KeysetPagination
 
 
 class BaseGenericViewSet(viewsets.GenericViewSet,
                          mixins.ListModelMixin,
                          mixins.CreateModelMixin):
 
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
-    order_by = "-name"
+    pagination_class = KeysetPagination
+    order_by = ("-name", "-id")
+    orderings = {
+        "name": ("-name", "-id"),
+        "popularity": ("-recipe_count", "-id"),
+    }
+    prefetch_actions = ["list"]
+    collection = None
+    cache_lists = False
+
+    def optimize_queryset(self, queryset):
+        """
+        Prefetch the relations rendered by the serializer, so listing
+        costs the same number of queries whatever the number of rows
+        """
+        if self.action not in self.prefetch_actions:
+            return queryset
+
+        model = queryset.model
+        select_related = []
+        prefetch_related = []
+        for field in self.get_serializer_class()().fields.values():
+            if field.write_only or "." in field.source:
+                continue
+            if isinstance(field, ManyRelatedField):
+                relation = model._meta.get_field(field.source)
+                related_model = relation.related_model
+                related_qs = related_model.objects.all()
+                if isinstance(field.child_relation, PrimaryKeyRelatedField):
+                    related_qs = related_qs.only(related_model._meta.pk.name)
+                prefetch_related.append(
+                    Prefetch(field.source, queryset=related_qs)
+                )
+            elif isinstance(field, RelatedField):
+                select_related.append(field.source)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
 
     def get_queryset(self):
         """
@@ -24,72 +93,350 @@ class BaseGenericViewSet(viewsets.GenericViewSet,
 
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(
-                recipe__isnull=False
-            )
+            # The maintained counter avoids joining the recipes
+            queryset = queryset.filter(recipe_count__gt=0)
+        queryset = self.optimize_queryset(queryset)
         return queryset.filter(user=self.request.user).order_by(
-                                                        self.order_by
+                                                        *self.get_order_by()
                                                     )
 
+    def get_order_by(self):
+        """
+        Return the ordering of the list, also used as pagination keyset.
+        The ``ordering`` query parameter picks one of ``orderings``.
+        """
+        ordering = self.request.query_params.get("ordering")
+        if not ordering:
+            return self.order_by
+        if ordering not in self.orderings:
+            raise exceptions.ValidationError({"ordering": [
+                _("Expected one of: %(orderings)s.")
+                % {"orderings": ", ".join(self.orderings)}
+            ]})
+        return self.orderings[ordering]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Answer conditional requests from the collection version, then
+        serve the list from the per-user cache when the view has one.
+        There is no Last-Modified, a date only tells writes apart to the
+        second.
+        """
+        version = versions.get(request.user.pk, self.collection)
+        etag = self.get_list_etag(request, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.get_list_response(
+                request, version, *args, **kwargs
+            )
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    def get_list_etag(self, request, version):
+        """
+        Derive the ETag of the list from the version of the user's
+        collection, without reading the list itself
+        """
+        version, _updated_at = version
+        digest = hashlib.md5(":".join([
+            str(request.user.pk),
+            self.collection,
+            str(version),
+            request.get_full_path(),
+            request.accepted_media_type or "",
+        ]).encode("utf-8")).hexdigest()
+        return quote_etag(digest)
+
+    def get_list_response(self, request, version, *args, **kwargs):
+        if not (self.cache_lists
+                and getattr(settings, "RECIPE_LIST_CACHE", False)):
+            return super().list(request, *args, **kwargs)
+
+        # The version read before the query, a write made meanwhile
+        # moves later requests to a new key
+        cache_args = (
+            self.collection,
+            request.user.pk,
+            version,
+            request.get_full_path()
+        )
+        data = list_cache.get(*cache_args)
+        if data is not None:
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        response = super().list(request, *args, **kwargs)
+        list_cache.set(*cache_args, response.data)
+        response["X-Cache"] = "MISS"
+        return response
 
-class TagViewSet(BaseGenericViewSet):
+
+class UniqueNameViewMixin:
+    """
+    Report a name taken by a concurrent request between the validation
+    and the insert as a validation error rather than a server error
+    """
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise exceptions.ValidationError(
+                {"name": [serializer.name_taken_message]}
+            )
+
+
+class TagViewSet(UniqueNameViewMixin, BaseGenericViewSet):
 
     serializer_class = serializers.TagSerializer
     queryset = models.Tag.objects.all()
+    collection = "tags"
+    cache_lists = True
 
 
-class IngradientViewSet(BaseGenericViewSet):
+class IngradientViewSet(UniqueNameViewMixin, BaseGenericViewSet):
 
     serializer_class = serializers.IngredientSerializer
     queryset = models.Ingredient.objects.all()
+    collection = "ingredients"
+    cache_lists = True
 
 
 class RecipeViewSet(BaseGenericViewSet):
 
     serializer_class = serializers.RecipeSerializer
-    queryset = models.Recipe.objects.all()
-    order_by = "-id"
-
-    def _str_to_int(self, string):
-        return [int(item) for item in string.split(",")]
+    queryset = models.Recipe.objects.defer("search_vector")
+    collection = "recipes"
+    order_by = ("-id",)
 
     def get_queryset(self):
         """
         Return objects for authenticated user only
         """
-        tags = self.request.query_params.get("tags")
-        ingredients = self.request.query_params.get("ingredients")
-        queryset = self.queryset
+        queryset = filters.RecipeFilter(
+            self.request.query_params
+        ).filter_queryset(self.queryset)
+        self.search = filters.RecipeSearch(self.request.query_params)
+        queryset = self.search.filter_queryset(queryset)
+
+        queryset = self.optimize_queryset(queryset)
+        return queryset.filter(user=self.request.user).order_by(
+                                                        *self.get_order_by()
+                                                    )
 
-        if tags:
-            queryset = queryset.filter(
-                tags__id__in=self._str_to_int(tags)
+    def get_order_by(self):
+        """
+        Order ranked search results by relevance first
+        """
+        return self.search.order_by + self.order_by
+
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        """
+        Create or update a list of recipes in one request, items with an
+        id are updated. Each item reports its own outcome.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise exceptions.ValidationError(
+                _("Expected a list of recipes.")
             )
-        if ingredients:
-            queryset = queryset.filter(
-                ingredients__id__in=self._str_to_int(ingredients)
+        if len(items) > bulk.MAX_ITEMS:
+            raise exceptions.ValidationError(
+                _("At most %(max)d recipes can be sent at once.")
+                % {"max": bulk.MAX_ITEMS}
             )
 
-        return queryset.filter(user=self.request.user).order_by(
-                                                        self.order_by
-                                                    )
+        results = bulk.bulk_save_recipes(request.user, items)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False, url_path="sync")
+    def sync(self, request):
+        """
+        Return the recipes, tags and ingredients changed or deleted after
+        the ``cursor`` of a previous sync, in batches of at most ``limit``
+        changes. Clients start from cursor 0.
+        """
+        params = request.query_params
+        try:
+            cursor = _positive_int(params.get("cursor", 0))
+            limit = _positive_int(
+                params.get("limit", sync.BATCH_SIZE),
+                strict=True,
+                cutoff=sync.BATCH_SIZE
+            )
+        except ValueError:
+            raise exceptions.ValidationError(
+                _("cursor and limit must be positive integers.")
+            )
+        return Response(sync.changes_since(
+            request.user,
+            cursor,
+            limit,
+            context=self.get_serializer_context()
+        ))
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path=r"export/(?P<export_format>ndjson|csv)",
+        url_name="export"
+    )
+    def export(self, request, export_format=None):
+        """
+        Stream every recipe of the user matching the list filters as
+        NDJSON or CSV, rows are read in chunks so memory stays flat
+        """
+        response = StreamingHttpResponse(
+            export.stream(self.get_queryset(), export_format),
+            content_type=export.CONTENT_TYPES[export_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="recipes.{export_format}"'
+        )
+        return response
+
+    def set_image(self, recipe, stored_name):
+        """
+        Point the recipe at a stored image and queue its processing
+        """
+        with transaction.atomic():
+            recipe.image.name = stored_name
+            recipe.save(update_fields=["image"])
+            images.submit(recipe)
+        return Response(
+            serializers.RecipeImageSerializer(
+                recipe,
+                context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_202_ACCEPTED
+        )
 
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
         """
-        Upload an image to recipe
+        Upload an image to recipe, the file is streamed to storage and
+        variants are built in the background
         """
 
         recipe = self.get_object()
-        serializer = serializers.RecipeImageSerializer(
-            recipe,
-            data=request.data
-        )
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        handler = uploads.RecipeImageUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        try:
+            image = request.FILES.get("image")
+        except Exception:
+            handler.discard()
+            raise
+
+        if not isinstance(image, uploads.StoredImageFile):
+            return Response(
+                {"image": [_("No file was submitted.")]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return self.set_image(recipe, image.stored_name)
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="image-uploads",
+        url_name="image-upload-start"
+    )
+    def image_upload_start(self, request, pk=None):
+        """
+        Start a resumable image upload
+        """
+        recipe = self.get_object()
+        serializer = serializers.ImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.start_upload(
+                recipe,
+                serializer.validated_data["file_name"],
+                serializer.validated_data["size"]
+            )
+        except uploads.InvalidImage as exc:
+            raise exceptions.ValidationError({"image": [str(exc)]})
 
         return Response(
-            serializer.errors,
-            status=status.HTTP_400_BAD_REQUEST
+            serializers.ImageUploadSerializer(upload).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        methods=["GET", "PATCH"],
+        detail=True,
+        url_path=r"image-uploads/(?P<upload_id>[0-9a-f-]{36})",
+        url_name="image-upload-chunk"
+    )
+    def image_upload_chunk(self, request, pk=None, upload_id=None):
+        """
+        Report the upload offset, or append the raw request body at the
+        offset given in the Upload-Offset header
+        """
+        recipe = self.get_object()
+        with transaction.atomic():
+            upload = self.get_image_upload(recipe, upload_id, lock=True)
+            if request.method == "GET":
+                return Response(serializers.ImageUploadSerializer(upload).data)
+
+            try:
+                offset = int(request.headers["Upload-Offset"])
+                length = int(request.headers["Content-Length"])
+            except (KeyError, ValueError):
+                raise exceptions.ValidationError(
+                    _("Upload-Offset and Content-Length are required.")
+                )
+            if offset != upload.offset:
+                return Response(
+                    serializers.ImageUploadSerializer(upload).data,
+                    status=status.HTTP_409_CONFLICT
+                )
+            try:
+                uploads.append_chunk(upload, request._request, length)
+            except uploads.InvalidImage as exc:
+                raise exceptions.ValidationError({"image": [str(exc)]})
+
+        return Response(serializers.ImageUploadSerializer(upload).data)
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path=r"image-uploads/(?P<upload_id>[0-9a-f-]{36})/finalize",
+        url_name="image-upload-finalize"
+    )
+    def image_upload_finalize(self, request, pk=None, upload_id=None):
+        """
+        Validate a complete resumable upload and use it as recipe image
+        """
+        recipe = self.get_object()
+        upload = self.get_image_upload(recipe, upload_id)
+        try:
+            stored_name = uploads.finish_upload(
+                upload,
+                sha256=request.data.get("sha256")
+            )
+        except uploads.InvalidImage as exc:
+            raise exceptions.ValidationError({"image": [str(exc)]})
+        return self.set_image(recipe, stored_name)
+
+    def get_image_upload(self, recipe, upload_id, lock=False):
+        queryset = recipe.image_uploads.all()
+        if lock:
+            queryset = queryset.select_for_update()
+        try:
+            return queryset.get(pk=upload_id)
+        except models.ImageUpload.DoesNotExist:
+            raise exceptions.NotFound()
+
+    @action(methods=["GET"], detail=True, url_path="image")
+    def image(self, request, pk=None):
+        """
+        Return the recipe image processing status and variants
+        """
+        serializer = serializers.RecipeImageSerializer(
+            self.get_object(),
+            context=self.get_serializer_context()
         )
+        return Response(serializer.data)
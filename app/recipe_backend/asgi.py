@@ -5,12 +5,70 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
+
+Serve it with an ASGI server, e.g.:
+
+    uvicorn --lifespan off recipe_backend.asgi:application
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.handlers import asgi
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe_backend.settings')
+os.environ.setdefault('RECIPE_ASYNC_VIEWS', '1')
+# Sync code runs in a thread of its own per request, see application,
+# a connection kept by that thread would never be reused
+os.environ.setdefault('DB_POOL', '1')
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """
+    Django 3.1 iterates streaming responses on the event loop, where the
+    queries of a generator such as the recipe export are refused. Fetch
+    each part in the request's sync thread instead, as Django 4.2 does.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers += [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_part(parts, None)
+            if part is None:
+                break
+            for chunk, _last in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+django_application = ASGIHandler()
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    # Django 3.1 runs the sync code of every request, sync views and
+    # middleware, in one shared thread; give each request its own
+    async with ThreadSensitiveContext():
+        return await django_application(scope, receive, send)
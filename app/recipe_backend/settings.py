@@ -39,12 +39,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
+    'core.apps.CoreConfig',
     'user',
-    'recipe'
+    'recipe.apps.RecipeConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestInstrumentationMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,17 +80,180 @@ WSGI_APPLICATION = 'recipe_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# Connections are kept DB_CONN_MAX_AGE seconds by the thread that opened
+# them and checked before the first query of each request. Servers that
+# do not reuse their threads, like the ASGI one, rather take DB_POOL=1:
+# connections go back to a pool of the process after each request, up to
+# DB_POOL_MAX_SIZE, and requests wait DB_POOL_TIMEOUT seconds for one.
+DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.postgresql',
         'HOST': os.environ.get("DB_HOST"),
         'NAME': os.environ.get("DB_NAME"),
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PASS"),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(
+            os.environ.get('DB_CONN_MAX_AGE', 60)
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1'
+        ),
+        'OPTIONS': {
+            'pool': {
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'max_lifetime': float(
+                    os.environ.get('DB_POOL_MAX_LIFETIME', 3600)
+                ),
+                'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+            },
+        } if DB_POOL else {},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'recipe-backend'),
+    },
+    # Login throttle history, shared by every worker process so a limit
+    # is not multiplied by their number. The database table is created
+    # by `manage.py createcachetable`.
+    'throttle': {
+        'BACKEND': os.environ.get(
+            'THROTTLE_CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.environ.get(
+            'THROTTLE_CACHE_LOCATION', 'login_throttle_cache'
+        ),
+    },
+}
+
+# Tag and ingredient lists are only cached by default in a cache shared
+# by the worker processes, e.g. CACHE_BACKEND=
+# django.core.cache.backends.memcached.PyLibMCCache. With LocMemCache
+# every worker would keep, and mostly miss, a copy of its own.
+RECIPE_LIST_CACHE = os.environ.get(
+    'RECIPE_LIST_CACHE',
+    '0' if CACHES['default']['BACKEND'].endswith('.LocMemCache') else '1'
+) == '1'
+
+# Seconds a cached tag/ingredient list is kept, entries are also
+# invalidated by collection version bumps on every write.
+RECIPE_LIST_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_LIST_CACHE_TIMEOUT', 300)
+)
+
+
+# In-process token authentication cache, see core.authentication
+TOKEN_CACHE_MAXSIZE = int(os.environ.get('TOKEN_CACHE_MAXSIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))
+
+
+# Request instrumentation, see core.middleware. A REQUEST_SAMPLE_RATE share
+# of requests get their queries counted, timed and fingerprinted; requests
+# over SLOW_REQUEST_MS are logged with their slowest queries.
+REQUEST_SAMPLE_RATE = float(os.environ.get('REQUEST_SAMPLE_RATE', 0.05))
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_TOP_QUERIES = 5
+DUPLICATE_QUERY_THRESHOLD = int(
+    os.environ.get('DUPLICATE_QUERY_THRESHOLD', 5)
+)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') == '1'
+
+
+# Metrics served at /metrics, see core.metrics. With several worker
+# processes set METRICS_DIR to a directory shared by them and emptied when
+# the server starts, each worker writes its samples there at most every
+# METRICS_FLUSH_INTERVAL seconds. Scrapers must send METRICS_TOKEN as an
+# "Authorization: Bearer" header, without a token the metrics are refused
+# unless METRICS_PUBLIC=1 opens them to anyone.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 10))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+
+
+# Serve the recipe, tag and ingredient lists and image uploads from async
+# views, see recipe.async_views. recipe_backend.asgi turns it on.
+RECIPE_ASYNC_VIEWS = os.environ.get('RECIPE_ASYNC_VIEWS', '0') == '1'
+
+
+# Largest number of recipes accepted by the bulk endpoint
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 1000))
+
+# Recipes read per database round trip when streaming an export
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 500)
+)
+
+
+# Largest number of change log entries returned by one sync request
+RECIPE_SYNC_BATCH_SIZE = int(os.environ.get('RECIPE_SYNC_BATCH_SIZE', 500))
+
+
+# Recipe image processing, see recipe.images. Jobs run in a pool of
+# IMAGE_WORKERS threads per process, or inline when IMAGE_JOBS_ASYNC is off.
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+IMAGE_JOBS_ASYNC = os.environ.get('IMAGE_JOBS_ASYNC', '1') == '1'
+
+# Limits enforced while recipe images are streamed in, see recipe.uploads
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.environ.get('RECIPE_IMAGE_MAX_DIMENSION', 10000)
+)
+# Unreferenced recipe images younger than this many seconds are left for
+# the collect_images command
+RECIPE_IMAGE_GC_GRACE = int(os.environ.get('RECIPE_IMAGE_GC_GRACE', 3600))
+
+
+# Token requests allowed per client address and per account email, checked
+# before any password is hashed, see user.throttles. The client address is
+# REMOTE_ADDR, behind NUM_PROXIES reverse proxies the address they append
+# to X-Forwarded-For; addresses clients send themselves are never trusted.
+REST_FRAMEWORK = {
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('LOGIN_THROTTLE_IP_RATE', '60/min'),
+        'login_email': os.environ.get('LOGIN_THROTTLE_EMAIL_RATE', '10/min'),
+    },
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/3.0/topics/auth/passwords/
+# New passwords are hashed with PASSWORD_HASHER: argon2, bcrypt or pbkdf2.
+# The other hashers stay enabled so stored hashes keep verifying, they are
+# rehashed with the preferred one on the next successful login.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+_PASSWORD_HASHERS = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS.pop(PASSWORD_HASHER)] + [
+    *_PASSWORD_HASHERS.values(),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19456))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -131,4 +296,10 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/app/media'
 STATIC_ROOT = 'vol/app/static'
 
+# Media is served by core.media.serve. Set MEDIA_ACCEL_REDIRECT to an
+# internal nginx location mapped to MEDIA_ROOT to hand file bodies over
+# to nginx; MEDIA_MAX_AGE applies to files not named after their hash.
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT')
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+
 AUTH_USER_MODEL = 'core.user'
\ No newline at end of file
@@ -0,0 +1,27 @@
+import shutil
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner, default_test_processes
+
+
+class ParallelTestRunner(DiscoverRunner):
+    """
+    Run the tests in one process per core unless ``--parallel`` asks for
+    a number of processes. ``--parallel 1`` or DJANGO_TEST_PROCESSES=1
+    run them in this process, e.g. to use a debugger.
+    """
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        # Tells an explicit --parallel 1 apart from no option at all
+        parser.set_defaults(parallel=None)
+
+    def __init__(self, parallel=None, **kwargs):
+        if parallel is None:
+            parallel = default_test_processes()
+        super().__init__(parallel=parallel, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
@@ -0,0 +1,45 @@
+"""
+Settings for running the test suite without any service or network:
+
+    python manage.py test --settings=recipe_backend.test_settings
+
+Tests use an in-memory SQLite database per test process, the MD5 hasher
+and run in one process per core, see recipe_backend.test_runner.
+PostgreSQL-only tests are skipped, run them against the docker-compose
+database with the default settings.
+"""
+import tempfile
+
+from recipe_backend.settings import *  # noqa
+
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-backend-tests',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-backend-tests-throttle',
+    },
+}
+
+# Hashing a password must not cost more than the test using it
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Tests sampling requests or logging slow ones override these, the other
+# requests must not log warnings at random
+REQUEST_SAMPLE_RATE = 0
+SLOW_REQUEST_MS = 60000
+
+# Removed by the test runner once the suite finished
+MEDIA_ROOT = tempfile.mkdtemp(prefix='recipe-backend-media-')
+
+TEST_RUNNER = 'recipe_backend.test_runner.ParallelTestRunner'
@@ -5,6 +5,9 @@ It exposes the WSGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/wsgi/
+
+Run with several worker processes, set METRICS_DIR so /metrics reports the
+samples of every worker rather than of the one serving the scrape.
 """
 
 import os
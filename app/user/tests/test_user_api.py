@@ -1,9 +1,16 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.conf import settings
+from django.core.cache import caches
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import Change, Ingredient, Recipe, Tag
+
 
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token")
@@ -14,11 +21,18 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+
 class PublicUsersApiTest(TestCase):
     """
     Tests the users API (PUBLIC)
     """
     def setUp(self):
+        caches["throttle"].clear()
         self.client = APIClient()
 
     def test_create_valid_user_success(self):
@@ -205,3 +219,178 @@ class PrivateUserApiTests(TestCase):
                 }
             )
         self.assertEqual(user_found.count(), 0)
+
+    def test_delete_user_with_recipes(self):
+        """
+        Test deleting a user also deletes their recipes, tags and
+        ingredients without logging changes for them
+        """
+        recipe = Recipe.objects.create(
+            user=self.user, title="Pie", time_minutes=5, price=1
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Salt")
+        )
+
+        res = self.client.delete(PROFILE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertFalse(Change.objects.exists())
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK,
+        DEFAULT_THROTTLE_RATES=dict(
+            {"login_ip": None, "login_email": None},
+            **rates
+        )
+    ))
+
+
+class TokenApiTests(TestCase):
+    """
+    Test throttling, token reuse and password upgrades of token requests
+    """
+
+    def setUp(self):
+        caches["throttle"].clear()
+        self.payload = {
+            "email": "nazrul@localmachine.com",
+            "password": "test12345",
+        }
+        self.user = create_user(**self.payload)
+        self.client = APIClient()
+
+    @throttle_rates(login_email="2/min")
+    def test_throttle_per_email(self):
+        """
+        Test attempts on one account are rejected before hashing
+        """
+        with mock.patch(
+            "user.serializers.authenticate",
+            return_value=None
+        ) as authenticate:
+            for _ in range(2):
+                res = self.client.post(TOKEN_URL, self.payload)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+            res = self.client.post(
+                TOKEN_URL,
+                dict(self.payload, email="NAZRUL@localmachine.com")
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", res)
+        self.assertEqual(authenticate.call_count, 2)
+
+        res = self.client.post(
+            TOKEN_URL,
+            dict(self.payload, email="test@localmachine.com")
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @throttle_rates(login_ip="2/min")
+    def test_throttle_per_address(self):
+        """
+        Test attempts from one address are limited across accounts
+        """
+        for number in range(2):
+            res = self.client.post(
+                TOKEN_URL,
+                dict(self.payload, email=f"{number}@localmachine.com")
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        res = self.client.post(
+            TOKEN_URL, self.payload, REMOTE_ADDR="10.0.0.2"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @throttle_rates(login_ip="2/min")
+    def test_throttle_ignores_forwarded_for(self):
+        """
+        Test clients cannot pick their address with X-Forwarded-For
+        """
+        for number in range(3):
+            res = self.client.post(
+                TOKEN_URL,
+                dict(self.payload, email=f"{number}@localmachine.com"),
+                HTTP_X_FORWARDED_FOR=f"10.0.1.{number}"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_reuse_presented_token(self):
+        """
+        Test a client sending its valid token gets it back unhashed
+        """
+        token = self.client.post(TOKEN_URL, self.payload).data["token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+        with mock.patch("user.serializers.authenticate") as authenticate:
+            res = self.client.post(
+                TOKEN_URL,
+                dict(self.payload, password="wrong")
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["token"], token)
+        authenticate.assert_not_called()
+
+        other = dict(self.payload, email="test@localmachine.com")
+        create_user(**other)
+        res = self.client.post(TOKEN_URL, dict(other, password="wrong"))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stale_token_ignored(self):
+        """
+        Test logging in with an invalid token header still works
+        """
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("token", res.data)
+
+    @override_settings(PASSWORD_HASHERS=[
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    ])
+    def test_password_rehashed_on_login(self):
+        """
+        Test a password stored with an older hasher is upgraded on login
+        """
+        self.user.password = make_password(
+            self.payload["password"],
+            hasher="pbkdf2_sha256"
+        )
+        self.user.save()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("md5$"))
+        self.assertTrue(self.user.check_password(self.payload["password"]))
+
+    @skipUnless(argon2, "argon2-cffi is not installed")
+    @override_settings(PASSWORD_HASHERS=["core.hashers.Argon2PasswordHasher"])
+    def test_argon2_costs_from_settings(self):
+        """
+        Test hashes made with other Argon2 costs are marked for upgrade
+        """
+        hasher = get_hasher()
+        encoded = hasher.encode("test12345", hasher.salt())
+        self.assertFalse(hasher.must_update(encoded))
+
+        with mock.patch.object(hasher, "memory_cost", 512):
+            encoded = hasher.encode("test12345", hasher.salt())
+        self.assertTrue(hasher.must_update(encoded))
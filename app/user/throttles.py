@@ -0,0 +1,47 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    """
+    Limit token requests before the credentials are checked, so
+    rejected attempts never reach the password hasher
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "LOGIN_THROTTLE_CACHE", "throttle")]
+
+    def get_rate(self):
+        # Read per request so the rates follow settings overrides
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+
+class LoginIPThrottle(LoginRateThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+class LoginEmailThrottle(LoginRateThrottle):
+    """
+    Limit the attempts on one account whatever address they come from
+    """
+    scope = "login_email"
+
+    def get_cache_key(self, request, view):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email.strip():
+            return None
+        ident = hashlib.sha256(
+            email.strip().lower().encode("utf-8")
+        ).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}